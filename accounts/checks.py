@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+CACHED_SESSION_ENGINES = ['django.contrib.sessions.backends.cache', 'django.contrib.sessions.backends.cached_db']
+
+
+@register()
+def per_process_cache_check(app_configs, **kwargs):
+    if settings.CACHES['default']['BACKEND'] not in settings.PER_PROCESS_CACHES:
+        return []
+    errors = []
+    if settings.SESSION_ENGINE in CACHED_SESSION_ENGINES:
+        errors.append(
+            Error(
+                f'{settings.SESSION_ENGINE} needs a cache shared by all workers.',
+                hint='Set DJANGO_CACHE_BACKEND to a shared cache or use django.contrib.sessions.backends.db.',
+                id='accounts.E001',
+            )
+        )
+    if 'accounts.backends.CachedModelBackend' in settings.AUTHENTICATION_BACKENDS:
+        errors.append(
+            Error(
+                'CachedModelBackend needs a cache shared by all workers.',
+                hint='Set DJANGO_CACHE_BACKEND to a shared cache or use ModelBackend.',
+                id='accounts.E002',
+            )
+        )
+    return errors
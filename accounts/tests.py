@@ -1,3 +1,54 @@
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from planner.management.commands.bench_queries import BASELINE_SETTINGS, measure
+
+from .checks import per_process_cache_check
+
+CACHED_SETTINGS = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+    'AUTHENTICATION_BACKENDS': ['accounts.backends.CachedModelBackend'],
+}
+PLAIN_STATIC = {**settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class CachedSessionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cached', password='pass12345')
+
+    def test_cached_sessions_and_user_save_queries(self):
+        paths = [reverse('trip_list'), reverse('packing_items')]
+        with override_settings(**BASELINE_SETTINGS):
+            baseline = measure(self.user, paths, 2)
+        with override_settings(**CACHED_SETTINGS):
+            cached = measure(self.user, paths, 2)
+        for path in paths:
+            self.assertGreaterEqual(baseline[path] - cached[path], 2, path)
+
+    @override_settings(**CACHED_SETTINGS)
+    def test_password_change_ends_other_sessions(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('packing_items')).status_code, 200)
+        self.user.set_password('another12345')
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('packing_items')).status_code, 302)
+
+
+class PerProcessCacheCheckTests(TestCase):
+    def test_default_settings_pass(self):
+        self.assertEqual(per_process_cache_check(None), [])
+
+    @override_settings(**CACHED_SETTINGS)
+    def test_cached_sessions_need_a_shared_cache(self):
+        ids = [error.id for error in per_process_cache_check(None)]
+        self.assertEqual(ids, ['accounts.E001', 'accounts.E002'])
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp'}},
+        **CACHED_SETTINGS,
+    )
+    def test_shared_cache_allows_cached_sessions(self):
+        self.assertEqual(per_process_cache_check(None), [])
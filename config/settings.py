@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.forms',
 
     'planner',
     'accounts',
@@ -48,6 +49,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'config.staticfiles.PrecompressedStaticMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,6 +76,9 @@ TEMPLATES = [
     },
 ]
 
+# Lets widget templates live in the project templates/ directory.
+FORM_RENDERER = 'django.forms.renderers.TemplatesSetting'
+
 WSGI_APPLICATION = 'config.wsgi.application'
 
 
@@ -88,6 +93,38 @@ DATABASES = {
 }
 
 
+# Set DJANGO_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache and
+# DJANGO_CACHE_LOCATION=/path/to/dir so that several workers share cache and
+# invalidation (the default in-memory cache is per process).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', ''),
+    }
+}
+
+# Sessions and the authenticated user are cached only when the cache is shared:
+# with a per-process cache a logout or password change in one worker would not
+# reach the sessions and users cached by the others (accounts.checks refuses
+# that combination).
+PER_PROCESS_CACHES = [
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+]
+SHARED_CACHE = CACHES['default']['BACKEND'] not in PER_PROCESS_CACHES
+SESSION_ENGINE = os.getenv(
+    'DJANGO_SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db' if SHARED_CACHE else 'django.contrib.sessions.backends.db',
+)
+
+# With a shared cache the authenticated user is cached for this many seconds
+# (accounts.backends); saves and deletes of the user drop the entry right away.
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.CachedModelBackend' if SHARED_CACHE else 'django.contrib.auth.backends.ModelBackend'
+]
+ACCOUNTS_USER_CACHE_TIMEOUT = 60 * 5
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -133,6 +170,15 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'config.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -141,3 +187,30 @@ LOGIN_REDIRECT_URL = 'trip_list'
 LOGOUT_REDIRECT_URL = 'trip_list'
 
 CSRF_TRUSTED_ORIGINS = [o.strip() for o in os.getenv('DJANGO_CSRF_TRUSTED_ORIGINS','').split(',') if o.strip()]
+
+# Cold start: checked by `python manage.py bench_startup`. Code that needs one
+# of the forbidden modules imports it inside the function that uses it.
+STARTUP_IMPORT_BUDGET_MS = float(os.getenv('DJANGO_STARTUP_IMPORT_BUDGET_MS', '600'))
+STARTUP_FORBIDDEN_IMPORTS = ['numpy', 'requests']
+
+# Full-page cache for anonymous trip_list/trip_detail. Entries are invalidated
+# on writes; the timeout only bounds how stale the embedded weather can get.
+PLANNER_PAGE_CACHE_TIMEOUT = 60 * 10
+
+# Background jobs (planner.jobs), run by `run_worker` (or `run_worker --burst`
+# from cron). Eager mode is for development: a job enqueued without a delay
+# runs inline after commit, in the request that queued it; delayed jobs,
+# retries and pruning still need the worker.
+PLANNER_JOBS_EAGER = os.getenv('DJANGO_JOBS_EAGER', 'False').lower() in ('1','true','yes')
+PLANNER_JOBS_RETRY_BASE = 30
+PLANNER_JOBS_RETRY_MAX = 60 * 60
+PLANNER_JOBS_LOCK_TIMEOUT = 60 * 15
+PLANNER_JOBS_KEEP_DAYS = 7
+PLANNER_COST_INDEX_REFRESH_DELAY = 60
+
+# Trips outside the forecast window show daily normals over this many past
+# years (planner.climate.get_climate).
+PLANNER_CLIMATE_YEARS = 10
+
+# `archive_trips` moves trips that ended more than this many days ago.
+PLANNER_ARCHIVE_AFTER_DAYS = int(os.getenv('DJANGO_ARCHIVE_AFTER_DAYS', str(365 * 2)))
@@ -0,0 +1,118 @@
+"""
+Static asset pipeline: hashed names via the manifest, gzip/brotli variants
+written at ``collectstatic`` time and a middleware that serves them with
+far-future cache headers.
+"""
+
+import gzip
+import mimetypes
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli variants are skipped, gzip is always written
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.xml', '.html')
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=300'
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for hashed_name in set(self.hashed_files.values()):
+            self._write_compressed(hashed_name)
+
+    def _write_compressed(self, name: str) -> None:
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return
+        path = Path(self.path(name))
+        raw = path.read_bytes()
+        if len(raw) < MIN_COMPRESS_SIZE:
+            return
+
+        gz = gzip.compress(raw, compresslevel=9, mtime=0)
+        if len(gz) < len(raw):
+            path.with_name(path.name + '.gz').write_bytes(gz)
+
+        if brotli is not None:
+            br = brotli.compress(raw, quality=11)
+            if len(br) < len(raw):
+                path.with_name(path.name + '.br').write_bytes(br)
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(','):
+        token, _, params = part.partition(';')
+        token = token.strip().lower()
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if token and q > 0:
+            accepted.add(token)
+    return accepted
+
+
+class PrecompressedStaticMiddleware:
+    """Serve collected static files, preferring the .br/.gz variant."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        self.root = str(settings.STATIC_ROOT)
+        self._immutable_names = None
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            response = self.serve(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def is_hashed(self, name: str) -> bool:
+        if self._immutable_names is None:
+            hashed_files = getattr(staticfiles_storage, 'hashed_files', {})
+            self._immutable_names = frozenset(hashed_files.values())
+        return name in self._immutable_names
+
+    def serve(self, request, name: str):
+        try:
+            path = Path(safe_join(self.root, name))
+        except ValueError:
+            return None
+        if not path.is_file():
+            return None
+
+        content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        served, encoding = path, None
+        accepted = _accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            variant = path.with_name(path.name + suffix)
+            if candidate in accepted and variant.is_file():
+                served, encoding = variant, candidate
+                break
+
+        response = FileResponse(served.open('rb'), content_type=content_type, filename=path.name)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Cache-Control'] = (
+            IMMUTABLE_CACHE_CONTROL if self.is_hashed(name) else DEFAULT_CACHE_CONTROL
+        )
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
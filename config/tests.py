@@ -0,0 +1,65 @@
+import gzip
+import tempfile
+from pathlib import Path
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from .staticfiles import DEFAULT_CACHE_CONTROL, IMMUTABLE_CACHE_CONTROL, _accepted_encodings
+
+
+class PrecompressedStaticTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        source, root = Path(tmp.name, 'src'), Path(tmp.name, 'root')
+        source.mkdir()
+        self.script = 'const greeting = "привет";\n' * 40
+        (source / 'app.js').write_text(self.script)
+        (source / 'tiny.css').write_text('body{}')
+
+        # Only the files above, not the admin assets.
+        settings = override_settings(
+            STATICFILES_DIRS=[source],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STATIC_ROOT=root,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.root = root
+        self.hashed = staticfiles_storage.stored_name('app.js')
+
+    def get(self, name, encoding=''):
+        response = self.client.get(f'/static/{name}', HTTP_ACCEPT_ENCODING=encoding)
+        return response, b''.join(response.streaming_content)
+
+    def test_collectstatic_writes_compressed_variants(self):
+        self.assertNotEqual(self.hashed, 'app.js')
+        self.assertTrue((self.root / f'{self.hashed}.gz').is_file())
+        self.assertTrue((self.root / f'{self.hashed}.br').is_file())
+        # Too small to be worth compressing.
+        self.assertFalse((self.root / f'{staticfiles_storage.stored_name("tiny.css")}.gz').exists())
+
+    def test_hashed_files_are_served_precompressed_and_immutable(self):
+        response, body = self.get(self.hashed, 'gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(body).decode(), self.script)
+
+        response, _ = self.get(self.hashed, 'gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+
+    def test_plain_names_and_plain_clients(self):
+        response, body = self.get(self.hashed)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(body.decode(), self.script)
+
+        response, _ = self.get('app.js', 'gzip')
+        self.assertEqual(response['Cache-Control'], DEFAULT_CACHE_CONTROL)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(_accepted_encodings('gzip;q=0.5, br;q=0, Deflate'), {'gzip', 'deflate'})
+        self.assertEqual(_accepted_encodings(''), set())
@@ -0,0 +1,34 @@
+"""
+Optional warm-up for freshly started WSGI workers.
+
+Enabled with ``DJANGO_WSGI_WARMUP=True``: the URLconf (and with it every view
+module), the templates used by the views and the database connection are
+loaded before the worker accepts its first request.
+"""
+
+WARMUP_TEMPLATES = [
+    'base.html',
+    'accounts/login.html',
+    'accounts/signup.html',
+    'planner/trip_list.html',
+    'planner/trip_detail.html',
+    'planner/dashboard.html',
+    'planner/form.html',
+    'planner/confirm_delete.html',
+    'planner/packing_items.html',
+]
+
+
+def warm_up() -> None:
+    from django.db import connections
+    from django.template.loader import get_template
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    resolver.reverse_dict  # populates the resolver and imports all URLconfs
+
+    for name in WARMUP_TEMPLATES:
+        get_template(name)
+
+    for conn in connections.all(initialized_only=False):
+        conn.ensure_connection()
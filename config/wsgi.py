@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+if os.getenv('DJANGO_WSGI_WARMUP', 'False').lower() in ('1', 'true', 'yes'):
+    from config.warmup import warm_up
+
+    warm_up()
@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .analytics import mark_cost_index_stale
+from .caching import bump_version
+from .models import Activity, Trip
+from .rollups import schedule_rollup_refresh
+from .sync import record_changes
+
+
+GRID_FIELDS = ['title', 'date', 'cost', 'currency', 'notes']
+
+
+@transaction.atomic
+def save_activity_grid(trip: Trip, forms) -> int:
+    """Persist the changed rows of a valid ActivityGridFormSet with bulk queries."""
+    # bulk_update sends no signals: what activity_changed and
+    # activity_tags_changed would do is applied once for the whole grid.
+    # New rows cannot go through bulk_update; the grid only edits existing ones.
+    changed = [form for form in forms if form.instance.pk is not None and form.has_changed()]
+    if not changed:
+        return 0
+
+    now = timezone.now()
+    dates = set()
+    add_links = []
+    remove_links = Q()
+    for form in changed:
+        activity = form.instance
+        activity.updated_at = now
+        dates.update({form.initial.get('date'), activity.date})
+        before = set(form.initial.get('tags') or [])
+        after = set(form.cleaned_data.get('tags') or [])
+        if before - after:
+            remove_links |= Q(activity_id=activity.pk, tag_id__in=before - after)
+        add_links.extend((activity.pk, tag_id) for tag_id in after - before)
+
+    Activity.objects.bulk_update([form.instance for form in changed], GRID_FIELDS + ['updated_at'])
+    ActivityTag = Activity.tags.through
+    if remove_links:
+        ActivityTag.objects.filter(remove_links).delete()
+    if add_links:
+        ActivityTag.objects.bulk_create(
+            [ActivityTag(activity_id=activity_id, tag_id=tag_id) for activity_id, tag_id in add_links],
+            ignore_conflicts=True,
+        )
+
+    bump_version('trip', trip.pk)
+    mark_cost_index_stale(trip_ids=[trip.pk])
+    schedule_rollup_refresh(trip.owner_id, dates - {None})
+    record_changes('activity', trip.owner_id, [(form.instance.pk, now) for form in changed])
+    return len(changed)
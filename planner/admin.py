@@ -1,43 +1,170 @@
 from django.contrib import admin
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
 
-from .models import Activity, Destination, PackingItem, Tag, Trip, TripPackingItem
+from .analytics import refresh_cost_index
+from .jobs import enqueue, retry_jobs
+from .models import (
+    Activity,
+    ArchivedTrip,
+    Destination,
+    ExchangeRate,
+    Job,
+    PackingItem,
+    Tag,
+    Trip,
+    TripPackingItem,
+)
+
+# Below this many rows an exact COUNT is cheap enough to run every time.
+EXACT_COUNT_LIMIT = 10000
+ADMIN_COUNT_TIMEOUT = 60 * 5
+
+
+def estimated_count(model) -> int:
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+            row = cursor.fetchone()
+        # reltuples is -1 until the table has been analyzed.
+        if row and row[0] > EXACT_COUNT_LIMIT:
+            return row[0]
+    return cache.get_or_set(f'admin:count:{table}', model._default_manager.count, ADMIN_COUNT_TIMEOUT)
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        # Filtered changelists go through indexed lookups and keep the exact
+        # count; only the unfiltered full-table COUNT is estimated.
+        if self.object_list.query.where:
+            return super().count
+        return estimated_count(self.object_list.model)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Destination)
 class DestinationAdmin(admin.ModelAdmin):
     list_display = ('name', 'country')
     search_fields = ('name', 'country')
+    actions = ['refresh_cost_index_action']
+
+    @admin.action(description='Пересчитать индекс расходов')
+    def refresh_cost_index_action(self, request, queryset):
+        count = refresh_cost_index(list(queryset.values_list('id', flat=True)))
+        self.message_user(request, f'Индекс расходов пересчитан для {count} направлений.')
 
 
 @admin.register(Trip)
-class TripAdmin(admin.ModelAdmin):
+class TripAdmin(LargeTableAdmin):
     list_display = ('title', 'owner', 'destination', 'start_date', 'end_date', 'budget', 'is_public')
     list_filter = ('is_public', 'destination__country')
+    list_select_related = ('owner', 'destination')
     search_fields = ('title', 'owner__username', 'destination__name')
+    autocomplete_fields = ('owner', 'destination')
+    actions = ['archive_action', 'backfill_rollups_action']
+
+    @admin.action(description='Перенести в архив')
+    def archive_action(self, request, queryset):
+        trip_ids = list(queryset.values_list('id', flat=True))
+        enqueue('archive.trips', {'trip_ids': trip_ids})
+        self.message_user(request, f'Поездок поставлено в архивацию: {len(trip_ids)}.')
+
+    @admin.action(description='Пересчитать сводки расходов владельцев')
+    def backfill_rollups_action(self, request, queryset):
+        owner_ids = sorted(set(queryset.values_list('owner_id', flat=True)))
+        enqueue('rollups.backfill', {'owner_ids': owner_ids})
+        self.message_user(request, f'Пересчёт сводок запущен для пользователей: {len(owner_ids)}.')
 
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'owner')
+    list_select_related = ('owner',)
     search_fields = ('name', 'owner__username')
+    autocomplete_fields = ('owner',)
 
 
 @admin.register(Activity)
-class ActivityAdmin(admin.ModelAdmin):
+class ActivityAdmin(LargeTableAdmin):
     list_display = ('title', 'trip', 'date', 'cost')
     list_filter = ('date',)
+    list_select_related = ('trip',)
     search_fields = ('title', 'trip__title')
+    autocomplete_fields = ('trip', 'tags')
+    actions = ['backfill_rollups_action']
+
+    @admin.action(description='Пересчитать сводки расходов владельцев')
+    def backfill_rollups_action(self, request, queryset):
+        owner_ids = sorted(set(queryset.values_list('trip__owner_id', flat=True)))
+        enqueue('rollups.backfill', {'owner_ids': owner_ids})
+        self.message_user(request, f'Пересчёт сводок запущен для пользователей: {len(owner_ids)}.')
 
 
 @admin.register(PackingItem)
 class PackingItemAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'owner')
     list_filter = ('category',)
+    list_select_related = ('owner',)
     search_fields = ('name', 'category', 'owner__username')
+    autocomplete_fields = ('owner',)
 
 
 @admin.register(TripPackingItem)
-class TripPackingItemAdmin(admin.ModelAdmin):
+class TripPackingItemAdmin(LargeTableAdmin):
     list_display = ('trip', 'item', 'quantity', 'is_packed')
     list_filter = ('is_packed',)
+    list_select_related = ('trip', 'item')
     search_fields = ('trip__title', 'item__name')
+    autocomplete_fields = ('trip', 'item')
+    # The model orders by item__name, which needs a join and a sort over the
+    # whole table; the newest links first is enough for browsing.
+    ordering = ('-id',)
+
+
+@admin.register(ArchivedTrip)
+class ArchivedTripAdmin(LargeTableAdmin):
+    list_display = ('title', 'owner', 'destination', 'start_date', 'end_date', 'activities_count', 'archived_at')
+    list_select_related = ('owner', 'destination')
+    search_fields = ('title', 'owner__username')
+    raw_id_fields = ('owner', 'destination')
+    exclude = ('data',)
+    actions = ['restore_action']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Восстановить из архива')
+    def restore_action(self, request, queryset):
+        archived_ids = list(queryset.values_list('id', flat=True))
+        enqueue('archive.restore', {'archived_ids': archived_ids})
+        self.message_user(request, f'Поездок поставлено в восстановление: {len(archived_ids)}.')
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ('currency', 'date', 'rate')
+    list_filter = ('currency',)
+    date_hierarchy = 'date'
+
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('name', 'dedupe_key')
+    readonly_fields = ('locked_by', 'locked_at', 'last_error', 'created_at', 'finished_at')
+    ordering = ('-id',)
+    actions = ['retry_action']
+
+    @admin.action(description='Повторить')
+    def retry_action(self, request, queryset):
+        count = retry_jobs(queryset)
+        self.message_user(request, f'Задач снова в очереди: {count}.')
@@ -0,0 +1,262 @@
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .caching import trip_version
+from .currency import convert_amount, rate_table, rates_version
+from .jobs import enqueue
+from .models import BASE_CURRENCY, Activity, Destination, DestinationCostIndex, Trip
+
+TAG_MIX_SIZE = 6
+UNTAGGED = 'Без тега'
+
+PROJECTION_MIN_HISTORY = 3
+PROJECTION_HISTORY_TIMEOUT = 60 * 60 * 6
+
+
+def _money(value) -> Decimal:
+    return Decimal(str(round(float(value), 2)))
+
+
+def compute_cost_index(destination_ids=None) -> dict[int, dict]:
+    """Daily spend percentiles (in BASE_CURRENCY) and tag mix per destination over public trips."""
+    import numpy as np
+
+    trips = Trip.objects.filter(is_public=True)
+    activities = Activity.objects.filter(trip__is_public=True)
+    tag_links = Activity.tags.through.objects.filter(activity__trip__is_public=True)
+    if destination_ids is not None:
+        trips = trips.filter(destination_id__in=destination_ids)
+        activities = activities.filter(trip__destination_id__in=destination_ids)
+        tag_links = tag_links.filter(activity__trip__destination_id__in=destination_ids)
+
+    trip_rows = list(trips.order_by('id').values_list('id', 'destination_id', 'start_date', 'end_date'))
+    if not trip_rows:
+        return {}
+    trip_ids = np.fromiter((r[0] for r in trip_rows), dtype=np.int64, count=len(trip_rows))
+    trip_dest = np.fromiter((r[1] for r in trip_rows), dtype=np.int64, count=len(trip_rows))
+    trip_days = np.fromiter(
+        ((r[3] - r[2]).days + 1 for r in trip_rows), dtype=np.float64, count=len(trip_rows)
+    )
+
+    rates = rate_table()
+    act = list(activities.values_list('trip_id', 'cost', 'currency', 'date'))
+    act_trip = np.fromiter((r[0] for r in act), dtype=np.int64, count=len(act))
+    act_cost = rates.convert([r[1] for r in act], [r[2] for r in act], [r[3] for r in act], BASE_CURRENCY)
+    idx = np.searchsorted(trip_ids, act_trip)
+    totals = np.bincount(idx, weights=act_cost, minlength=len(trip_ids))
+    counts = np.bincount(idx, minlength=len(trip_ids))
+
+    # Trips without any activity have no recorded spending yet; leave them out.
+    has_data = counts > 0
+    daily = totals[has_data] / np.maximum(trip_days[has_data], 1)
+    dest = trip_dest[has_data]
+
+    summaries = {}
+    order = np.argsort(dest, kind='stable')
+    dest_sorted, daily_sorted = dest[order], daily[order]
+    uniq, starts = np.unique(dest_sorted, return_index=True)
+    for dest_id, group in zip(uniq, np.split(daily_sorted, starts[1:])):
+        p25, p50, p75 = np.percentile(group, [25, 50, 75])
+        summaries[int(dest_id)] = {
+            'trips_count': int(group.size),
+            'daily_p25': _money(p25),
+            'daily_median': _money(p50),
+            'daily_p75': _money(p75),
+            'tag_mix': {},
+        }
+
+    links = [
+        (dest_id, name.casefold(), cost, currency, day)
+        for dest_id, name, cost, currency, day in tag_links.values_list(
+            'activity__trip__destination_id', 'tag__name', 'activity__cost', 'activity__currency', 'activity__date'
+        )
+    ]
+    links += [
+        (dest_id, UNTAGGED, cost, currency, day)
+        for dest_id, cost, currency, day in activities.filter(tags__isnull=True).values_list(
+            'trip__destination_id', 'cost', 'currency', 'date'
+        )
+    ]
+    if links:
+        link_cost = rates.convert(
+            [r[2] for r in links], [r[3] for r in links], [r[4] for r in links], BASE_CURRENCY
+        )
+        dests, dest_idx = np.unique(
+            np.fromiter((r[0] for r in links), dtype=np.int64, count=len(links)), return_inverse=True
+        )
+        names, tag_idx = np.unique(np.array([r[1] for r in links]), return_inverse=True)
+        matrix = np.zeros((len(dests), len(names)))
+        np.add.at(matrix, (dest_idx, tag_idx), link_cost)
+        row_totals = matrix.sum(axis=1, keepdims=True)
+        shares = np.divide(matrix, row_totals, out=np.zeros_like(matrix), where=row_totals > 0)
+        for row, dest_id in enumerate(dests):
+            summary = summaries.get(int(dest_id))
+            if summary is None:
+                continue
+            top = np.argsort(-shares[row])[:TAG_MIX_SIZE]
+            summary['tag_mix'] = {
+                str(names[i]): round(float(shares[row, i]) * 100, 1) for i in top if shares[row, i] > 0
+            }
+    return summaries
+
+
+def refresh_cost_index(destination_ids=None) -> int:
+    if destination_ids is None:
+        targets = list(Destination.objects.values_list('id', flat=True))
+    else:
+        targets = list(destination_ids)
+    if not targets:
+        return 0
+
+    summaries = compute_cost_index(None if destination_ids is None else targets)
+    empty = {
+        'trips_count': 0,
+        'daily_p25': Decimal('0'),
+        'daily_median': Decimal('0'),
+        'daily_p75': Decimal('0'),
+        'tag_mix': {},
+    }
+    with transaction.atomic():
+        for dest_id in targets:
+            DestinationCostIndex.objects.update_or_create(
+                destination_id=dest_id,
+                defaults={**summaries.get(dest_id, empty), 'is_stale': False},
+            )
+    return len(targets)
+
+
+def stale_cost_index_destinations() -> list[int]:
+    return list(
+        Destination.objects.filter(Q(cost_index__isnull=True) | Q(cost_index__is_stale=True))
+        .values_list('id', flat=True)
+    )
+
+
+def mark_cost_index_stale(destination_ids=None, trip_ids=None) -> None:
+    rows = DestinationCostIndex.objects.filter(is_stale=False)
+    if destination_ids is not None:
+        rows = rows.filter(destination_id__in=destination_ids)
+    if trip_ids is not None:
+        rows = rows.filter(
+            destination_id__in=Trip.objects.filter(pk__in=trip_ids, is_public=True).values('destination_id')
+        )
+    if rows.update(is_stale=True) or destination_ids:
+        # Delayed so a burst of edits is folded into one recomputation.
+        enqueue('cost_index.refresh', dedupe_key='cost_index.refresh', delay=settings.PLANNER_COST_INDEX_REFRESH_DELAY)
+
+
+def compare_with_cost_index(trip: Trip, total_cost) -> dict | None:
+    """`total_cost` is in the trip currency; the comparison is made in BASE_CURRENCY."""
+    index = DestinationCostIndex.objects.filter(destination_id=trip.destination_id, trips_count__gt=0).first()
+    if index is None:
+        return None
+    days = max((trip.end_date - trip.start_date).days + 1, 1)
+    total_cost = convert_amount(total_cost, trip.currency, trip.start_date)
+    daily = _money(float(total_cost or 0) / days)
+    diff_pct = None
+    if index.daily_median > 0:
+        diff_pct = round((float(daily) / float(index.daily_median) - 1) * 100, 1)
+    return {'index': index, 'daily': daily, 'diff_pct': diff_pct}
+
+
+def _history_ratios(owner_id: int, fraction: float, today: date):
+    """p10/p50/p90 of final_total / spent_by(fraction) over the owner's finished trips."""
+    fraction = round(fraction, 2)
+    key = f'spend_history:{owner_id}:{today.isoformat()}:{fraction}:{rates_version()}'
+    cached = cache.get(key)
+    if cached is not None:
+        return cached or None
+
+    import numpy as np
+
+    trips = list(
+        Trip.objects.filter(owner_id=owner_id, end_date__lt=today)
+        .order_by('id')
+        .values_list('id', 'start_date', 'end_date')
+    )
+    result = ()
+    if len(trips) >= PROJECTION_MIN_HISTORY:
+        trip_ids = np.array([t[0] for t in trips], dtype=np.int64)
+        trip_start = np.array([t[1] for t in trips], dtype='datetime64[D]')
+        trip_days = (np.array([t[2] for t in trips], dtype='datetime64[D]') - trip_start).astype(np.int64) + 1
+
+        acts = list(
+            Activity.objects.filter(trip__owner_id=owner_id, trip__end_date__lt=today).values_list(
+                'trip_id', 'date', 'cost', 'currency'
+            )
+        )
+        act_trip = np.array([a[0] for a in acts], dtype=np.int64)
+        act_date = np.array([a[1] for a in acts], dtype='datetime64[D]')
+        act_cost = rate_table().convert(
+            [a[2] for a in acts], [a[3] for a in acts], [a[1] for a in acts], BASE_CURRENCY
+        )
+
+        idx = np.searchsorted(trip_ids, act_trip)
+        position = ((act_date - trip_start[idx]).astype(np.int64) + 1) / trip_days[idx]
+        totals = np.bincount(idx, weights=act_cost, minlength=len(trip_ids))
+        partial = np.bincount(idx, weights=act_cost * (position <= fraction), minlength=len(trip_ids))
+        usable = partial > 0
+        if usable.sum() >= PROJECTION_MIN_HISTORY:
+            ratios = totals[usable] / partial[usable]
+            result = tuple(float(x) for x in np.percentile(ratios, [10, 50, 90]))
+
+    cache.set(key, result, PROJECTION_HISTORY_TIMEOUT)
+    return result or None
+
+
+def spend_projection(trip: Trip, by_day, today: date | None = None) -> dict | None:
+    """Burn rate and projected end-of-trip spend (in the trip currency) for a trip in progress."""
+    today = today or timezone.localdate()
+    days_total = (trip.end_date - trip.start_date).days + 1
+    elapsed = (today - trip.start_date).days + 1
+    if elapsed < 1 or elapsed > days_total:
+        return None
+
+    key = f'projection:{trip.pk}:{trip_version(trip.pk)}:{rates_version()}:{today.isoformat()}'
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    import numpy as np
+
+    daily = np.zeros(elapsed)
+    for row in by_day:
+        offset = (row['date'] - trip.start_date).days
+        if 0 <= offset < elapsed:
+            daily[offset] += float(row['total'] or 0)
+
+    spent = float(daily.sum())
+    burn_rate = spent / elapsed
+    remaining_days = days_total - elapsed
+
+    history = _history_ratios(trip.owner_id, elapsed / days_total, today) if spent > 0 else None
+    if history:
+        low, mid, high = (spent * r for r in history)
+        method = 'history'
+    else:
+        spread = float(daily.std(ddof=1)) if elapsed > 1 else burn_rate
+        mid = spent + burn_rate * remaining_days
+        margin = 1.96 * spread * np.sqrt(remaining_days)
+        low, high = max(spent, mid - margin), mid + margin
+        method = 'trend'
+
+    budget = float(trip.budget or 0)
+    result = {
+        'spent': _money(spent),
+        'burn_rate': _money(burn_rate),
+        'days_elapsed': elapsed,
+        'days_total': days_total,
+        'projected': _money(mid),
+        'low': _money(low),
+        'high': _money(high),
+        'method': method,
+        'overrun': _money(mid - budget) if budget > 0 and mid > budget else None,
+    }
+    cache.set(key, result, 60 * 60 * 24)
+    return result
@@ -0,0 +1,356 @@
+import json
+import zlib
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .currency import convert_amount, money, rate_table
+from .models import (
+    BASE_CURRENCY,
+    Activity,
+    ArchivedTrip,
+    ArchiveSummary,
+    Destination,
+    PackingItem,
+    Tag,
+    Trip,
+    TripPackingItem,
+)
+from .packing import record_trip_packing
+from .rollups import add_archived_spending, schedule_rollup_refresh
+from .sync import record_changes
+
+
+ARCHIVE_BATCH = 100
+
+
+def archive_cutoff(days: int) -> date:
+    return timezone.localdate() - timedelta(days=days)
+
+
+def _pack(payload: dict) -> bytes:
+    return zlib.compress(json.dumps(payload, separators=(',', ':')).encode(), 9)
+
+
+def unpack(archived: ArchivedTrip) -> dict:
+    return json.loads(zlib.decompress(bytes(archived.data)))
+
+
+def _trip_payloads(trips: list[Trip]) -> list[dict]:
+    """Archive payloads for a batch of trips, read with three queries whatever its size."""
+    trip_ids = [trip.pk for trip in trips]
+    tag_names = {}
+    activity_tags = {}
+    for activity_id, tag_id, name in Activity.tags.through.objects.filter(activity__trip_id__in=trip_ids).values_list(
+        'activity_id', 'tag_id', 'tag__name'
+    ):
+        activity_tags.setdefault(activity_id, []).append(tag_id)
+        tag_names[tag_id] = name
+    activities = {}
+    for row in Activity.objects.filter(trip_id__in=trip_ids).order_by('pk').values(
+        'trip_id', 'id', 'title', 'date', 'cost', 'currency', 'notes', 'latitude', 'longitude'
+    ):
+        trip_id = row.pop('trip_id')
+        activities.setdefault(trip_id, []).append({**row, 'tags': activity_tags.get(row['id'], [])})
+    packing = {}
+    for row in TripPackingItem.objects.filter(trip_id__in=trip_ids).order_by('pk').values(
+        'trip_id', 'id', 'item_id', 'quantity', 'is_packed', 'note'
+    ):
+        packing.setdefault(row.pop('trip_id'), []).append(row)
+
+    payloads = []
+    for trip in trips:
+        trip_activities = activities.get(trip.pk, [])
+        used_tags = {tag_id for activity in trip_activities for tag_id in activity['tags']}
+        payloads.append(
+            {
+                'trip': {
+                    'id': trip.pk,
+                    'title': trip.title,
+                    'destination_id': trip.destination_id,
+                    'start_date': trip.start_date,
+                    'end_date': trip.end_date,
+                    'budget': trip.budget,
+                    'currency': trip.currency,
+                    'is_public': trip.is_public,
+                    'created_at': trip.created_at,
+                },
+                'activities': trip_activities,
+                'packing': packing.get(trip.pk, []),
+                'tag_names': {str(tag_id): tag_names[tag_id] for tag_id in used_tags},
+            }
+        )
+    return payloads
+
+
+def _add_base_amounts(payload: dict) -> None:
+    # Converted once at archive time and stored, so that restoring takes out
+    # exactly what archiving added even if the rates were reloaded meanwhile.
+    trip = payload['trip']
+    activities = payload['activities']
+    trip['base_budget'] = str(convert_amount(trip['budget'], trip['currency'], parse_date(trip['start_date'])))
+    costs = rate_table().convert(
+        [a['cost'] for a in activities],
+        [a['currency'] for a in activities],
+        [parse_date(a['date']) for a in activities],
+        BASE_CURRENCY,
+    )
+    for activity, cost in zip(activities, costs.tolist()):
+        activity['base_cost'] = str(money(cost))
+
+
+def _spending(payload: dict) -> list[tuple[date, Decimal, list[int]]]:
+    return [
+        (parse_date(a['date']), Decimal(a.get('base_cost', a['cost'])), a['tags'])
+        for a in payload['activities']
+    ]
+
+
+def _update_summary(owner_id: int, payloads: list[dict], sign: int) -> None:
+    summary, _ = ArchiveSummary.objects.select_for_update().get_or_create(owner_id=owner_id)
+    for payload in payloads:
+        trip = payload['trip']
+        budget = Decimal(trip.get('base_budget', trip['budget']))
+        spent = sum((Decimal(a.get('base_cost', a['cost'])) for a in payload['activities']), Decimal('0'))
+
+        summary.trips_total += sign
+        summary.public_total += sign * int(trip['is_public'])
+        summary.total_budget += sign * budget
+        summary.activities_total += sign * len(payload['activities'])
+        summary.total_spent += sign * spent
+
+        key = str(trip['destination_id'])
+        trips, dest_budget = summary.destinations.get(key, [0, '0'])
+        summary.destinations[key] = [trips + sign, str(Decimal(dest_budget) + sign * budget)]
+        if summary.destinations[key][0] <= 0:
+            del summary.destinations[key]
+
+        # Same grouping as the dashboard query over tags__name: an activity
+        # counts once per tag, untagged activities go under "".
+        for activity in payload['activities']:
+            cost = Decimal(activity.get('base_cost', activity['cost']))
+            for name in [payload['tag_names'][str(t)] for t in activity['tags']] or ['']:
+                total, uses = summary.tags.get(name, ['0', 0])
+                summary.tags[name] = [str(Decimal(total) + sign * cost), uses + sign]
+                if summary.tags[name][1] <= 0:
+                    del summary.tags[name]
+    summary.save()
+
+
+def _by_owner(owner_ids, payloads) -> dict[int, list[dict]]:
+    grouped = {}
+    for owner_id, payload in zip(owner_ids, payloads):
+        grouped.setdefault(owner_id, []).append(payload)
+    return grouped
+
+
+def _chunks(items, size: int):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+@transaction.atomic
+def archive_batch(trips: list[Trip]) -> list[ArchivedTrip]:
+    """Archive a batch of trips with a fixed number of queries for the payloads and bookkeeping."""
+    if not trips:
+        return []
+    # Round-trip through JSON so the bookkeeping below sees exactly what
+    # restore_batch will read back.
+    payloads = json.loads(json.dumps(_trip_payloads(trips), cls=DjangoJSONEncoder))
+    for payload in payloads:
+        _add_base_amounts(payload)
+    archived = ArchivedTrip.objects.bulk_create(
+        [
+            ArchivedTrip(
+                owner_id=trip.owner_id,
+                trip_id=trip.pk,
+                title=trip.title,
+                destination_id=trip.destination_id,
+                start_date=trip.start_date,
+                end_date=trip.end_date,
+                activities_count=len(payload['activities']),
+                data=_pack(payload),
+            )
+            for trip, payload in zip(trips, payloads)
+        ]
+    )
+    for owner_id, owned in _by_owner([trip.owner_id for trip in trips], payloads).items():
+        _update_summary(owner_id, owned, 1)
+        add_archived_spending(owner_id, [row for payload in owned for row in _spending(payload)])
+    Trip.objects.filter(pk__in=[trip.pk for trip in trips]).delete()
+    return archived
+
+
+def archive_trip(trip: Trip) -> ArchivedTrip:
+    return archive_batch([trip])[0]
+
+
+def archive_trips(cutoff: date, owner_id: int | None = None, limit: int | None = None) -> int:
+    """Archive trips that ended before `cutoff`, one transaction per ARCHIVE_BATCH trips."""
+    trips = Trip.objects.filter(end_date__lt=cutoff).order_by('end_date', 'pk')
+    if owner_id is not None:
+        trips = trips.filter(owner_id=owner_id)
+    ids = trips.values_list('pk', flat=True)
+    return archive_trips_by_id(ids[:limit] if limit else ids)
+
+
+def archive_trips_by_id(trip_ids) -> int:
+    count = 0
+    for chunk in _chunks(trip_ids, ARCHIVE_BATCH):
+        count += len(archive_batch(list(Trip.objects.filter(pk__in=chunk).order_by('pk'))))
+    return count
+
+
+@transaction.atomic
+def restore_batch(rows: list[ArchivedTrip]) -> list[Trip]:
+    if not rows:
+        return []
+    payloads = [unpack(archived) for archived in rows]
+    owners = [archived.owner_id for archived in rows]
+
+    # Original ids are kept so links and offline clients keep pointing at the
+    # same objects; they are never reused while the row sits in the archive.
+    # Trips are saved one by one for their post_save bookkeeping (facets,
+    # cache versions, sync log); everything under them is bulk-inserted.
+    trips = []
+    for owner_id, payload in zip(owners, payloads):
+        data = payload['trip']
+        trip = Trip(
+            pk=data['id'],
+            owner_id=owner_id,
+            title=data['title'],
+            destination_id=data['destination_id'],
+            start_date=parse_date(data['start_date']),
+            end_date=parse_date(data['end_date']),
+            budget=Decimal(data['budget']),
+            currency=data.get('currency', BASE_CURRENCY),
+            is_public=data['is_public'],
+        )
+        trip.save(force_insert=True)
+        trip.created_at = parse_datetime(data['created_at'])
+        trips.append(trip)
+    Trip.objects.bulk_update(trips, ['created_at'])
+
+    owner_of = {trip.pk: trip.owner_id for trip in trips}
+    activities = Activity.objects.bulk_create(
+        [
+            Activity(
+                pk=a['id'],
+                trip=trip,
+                title=a['title'],
+                date=parse_date(a['date']),
+                cost=Decimal(a['cost']),
+                currency=a.get('currency', BASE_CURRENCY),
+                notes=a['notes'],
+                latitude=a.get('latitude'),
+                longitude=a.get('longitude'),
+            )
+            for trip, payload in zip(trips, payloads)
+            for a in payload['activities']
+        ]
+    )
+    # Tags and items deleted while the trip was archived are left out.
+    tag_ids = {t for payload in payloads for a in payload['activities'] for t in a['tags']}
+    live_tags = set(Tag.objects.filter(pk__in=tag_ids).values_list('pk', 'owner_id'))
+    ActivityTag = Activity.tags.through
+    ActivityTag.objects.bulk_create(
+        [
+            ActivityTag(activity_id=a['id'], tag_id=tag_id)
+            for trip, payload in zip(trips, payloads)
+            for a in payload['activities']
+            for tag_id in a['tags']
+            if (tag_id, trip.owner_id) in live_tags
+        ]
+    )
+    item_ids = {link['item_id'] for payload in payloads for link in payload['packing']}
+    live_items = set(PackingItem.objects.filter(pk__in=item_ids).values_list('pk', 'owner_id'))
+    links = TripPackingItem.objects.bulk_create(
+        [
+            TripPackingItem(
+                pk=link['id'],
+                trip=trip,
+                item_id=link['item_id'],
+                quantity=link['quantity'],
+                is_packed=link['is_packed'],
+                note=link['note'],
+            )
+            for trip, payload in zip(trips, payloads)
+            for link in payload['packing']
+            if (link['item_id'], trip.owner_id) in live_items
+        ]
+    )
+
+    for owner_id, owned in _by_owner(owners, payloads).items():
+        _update_summary(owner_id, owned, -1)
+        add_archived_spending(owner_id, [row for payload in owned for row in _spending(payload)], -1)
+        owned_activities = [a for a in activities if owner_of[a.trip_id] == owner_id]
+        owned_links = [link for link in links if owner_of[link.trip_id] == owner_id]
+        schedule_rollup_refresh(owner_id, {a.date for a in owned_activities})
+        record_changes('activity', owner_id, [(a.pk, a.updated_at) for a in owned_activities])
+        record_changes('packing_link', owner_id, [(link.pk, link.updated_at) for link in owned_links])
+    for trip in trips:
+        record_trip_packing(trip.pk)
+    ArchivedTrip.objects.filter(pk__in=[archived.pk for archived in rows]).delete()
+    return trips
+
+
+def restore_trip(archived: ArchivedTrip) -> Trip:
+    return restore_batch([archived])[0]
+
+
+def restore_trips(archived) -> int:
+    """Restore an ArchivedTrip queryset, one transaction per ARCHIVE_BATCH trips."""
+    count = 0
+    for chunk in _chunks(archived.order_by('pk').values_list('pk', flat=True), ARCHIVE_BATCH):
+        count += len(restore_batch(list(ArchivedTrip.objects.filter(pk__in=chunk).order_by('pk'))))
+    return count
+
+
+def merge_archive_into_dashboard(owner_id: int, trip_stats: dict, activity_stats: dict, destinations, tags):
+    """Add archived totals to the dashboard aggregates; returns (top_destinations, top_tags)."""
+    summary = ArchiveSummary.objects.filter(owner_id=owner_id, trips_total__gt=0).first()
+    destinations = list(destinations)
+    tags = list(tags)
+    if summary is not None:
+        trip_stats['trips_total'] += summary.trips_total
+        trip_stats['public_total'] += summary.public_total
+        trip_stats['private_total'] += summary.trips_total - summary.public_total
+        trip_stats['total_budget'] = (trip_stats['total_budget'] or 0) + summary.total_budget
+        trip_stats['avg_budget'] = trip_stats['total_budget'] / trip_stats['trips_total']
+        activity_stats['activities_total'] += summary.activities_total
+        activity_stats['total_spent'] = (activity_stats['total_spent'] or 0) + summary.total_spent
+        if activity_stats['activities_total']:
+            activity_stats['avg_activity_cost'] = activity_stats['total_spent'] / activity_stats['activities_total']
+
+        by_destination = {row['destination_id']: row for row in destinations}
+        missing = [int(k) for k in summary.destinations if int(k) not in by_destination]
+        for dest in Destination.objects.filter(pk__in=missing).values('id', 'name', 'country'):
+            by_destination[dest['id']] = {
+                'destination_id': dest['id'],
+                'destination__name': dest['name'],
+                'destination__country': dest['country'],
+                'trips_count': 0,
+                'budget_sum': Decimal('0'),
+            }
+        for key, (trips, budget) in summary.destinations.items():
+            row = by_destination.get(int(key))
+            if row is not None:
+                row['trips_count'] += trips
+                row['budget_sum'] = (row['budget_sum'] or 0) + Decimal(budget)
+        destinations = list(by_destination.values())
+
+        by_tag = {row['tags__name'] or '': row for row in tags}
+        for name, (total, uses) in summary.tags.items():
+            row = by_tag.setdefault(name, {'tags__name': name or None, 'total': Decimal('0'), 'uses': 0})
+            row['total'] = (row['total'] or 0) + Decimal(total)
+            row['uses'] += uses
+        tags = list(by_tag.values())
+
+    destinations.sort(key=lambda r: (-r['trips_count'], -(r['budget_sum'] or 0)))
+    tags.sort(key=lambda r: -(r['total'] or 0))
+    return destinations[:5], tags[:5]
@@ -0,0 +1,74 @@
+import bisect
+import threading
+
+from .caching import get_version
+from .models import Destination
+
+INDEX_SCOPE = 'destinations'
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.casefold().split())
+
+
+class DestinationIndex:
+    """Sorted prefix index over destination name, country and "name, country"."""
+
+    def __init__(self, version: int, rows):
+        self.version = version
+        self.labels = {}
+        entries = []
+        for pk, name, country in rows:
+            label = f'{name}, {country}' if country else name
+            self.labels[pk] = label
+            entries.append((_normalize(name), label, pk))
+            entries.append((_normalize(label), label, pk))
+            if country:
+                entries.append((_normalize(country), label, pk))
+        entries.sort()
+        self._keys = [key for key, _, _ in entries]
+        self._entries = entries
+
+    def __len__(self):
+        return len(self.labels)
+
+    def label(self, pk) -> str:
+        try:
+            return self.labels.get(int(pk), '')
+        except (TypeError, ValueError):
+            return ''
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        prefix = _normalize(query)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        start = bisect.bisect_left(self._keys, prefix)
+        for key, label, pk in self._entries[start:]:
+            if not key.startswith(prefix):
+                break
+            if pk in seen:
+                continue
+            seen.add(pk)
+            results.append({'id': pk, 'label': label})
+            if len(results) >= limit:
+                break
+        return results
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_destination_index() -> DestinationIndex:
+    global _index
+    version = get_version(INDEX_SCOPE)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _lock:
+        if _index is None or _index.version != version:
+            rows = Destination.objects.values_list('id', 'name', 'country').iterator(chunk_size=5000)
+            _index = DestinationIndex(version, rows)
+        return _index
@@ -0,0 +1,120 @@
+import hashlib
+import time
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _version_key(scope: str, key=None) -> str:
+    if key is None:
+        return f'ver:{scope}'
+    return f'ver:{scope}:{key}'
+
+
+def _initial_version() -> int:
+    # Starting from the clock instead of 1 means an evicted counter can never
+    # come back with a value that an old cache entry was stored under.
+    return int(time.time() * 1000)
+
+
+def get_version(scope: str, key=None) -> int:
+    vkey = _version_key(scope, key)
+    version = cache.get(vkey)
+    if version is None:
+        version = _initial_version()
+        cache.add(vkey, version, None)
+        version = cache.get(vkey, version)
+    return version
+
+
+def get_versions(scope: str, keys) -> dict:
+    keys = list(keys)
+    found = cache.get_many([_version_key(scope, key) for key in keys])
+    return {
+        key: found.get(_version_key(scope, key)) or get_version(scope, key)
+        for key in keys
+    }
+
+
+def bump_version(scope: str, key=None) -> None:
+    vkey = _version_key(scope, key)
+    try:
+        cache.incr(vkey)
+    except ValueError:
+        cache.set(vkey, _initial_version(), None)
+
+
+def bump_versions(scope: str, keys) -> None:
+    for key in set(keys):
+        bump_version(scope, key)
+
+
+def trip_version(trip_id: int) -> int:
+    return get_version('trip', trip_id)
+
+
+@lru_cache(maxsize=4096)
+def trip_owner_id(trip_id: int) -> int | None:
+    # A trip never changes owner and ids are not reused, so this is safe to
+    # keep for the lifetime of the process.
+    from .models import Trip
+
+    return Trip.objects.filter(pk=trip_id).values_list('owner_id', flat=True).first()
+
+
+def _normalize_page(raw) -> str:
+    raw = (raw or '').strip()
+    if raw.isdigit() and int(raw) > 0:
+        return str(int(raw))
+    return '1'
+
+
+def normalize_list_params(params) -> dict:
+    sort = (params.get('sort') or 'new').strip()
+    if sort not in ('new', 'budget', 'start'):
+        sort = 'new'
+    dest = (params.get('dest') or '').strip()
+    return {
+        'q': (params.get('q') or '').strip(),
+        'sort': sort,
+        'dest': dest if dest.isdigit() else '',
+        'page': _normalize_page(params.get('page')),
+    }
+
+
+def trip_list_page_key(request) -> str:
+    params = normalize_list_params(request.GET)
+    digest = hashlib.sha1(repr(sorted(params.items())).encode()).hexdigest()
+    return f"page:trip_list:{get_version('trip_list')}:{digest}"
+
+
+def trip_detail_page_key(request, pk: int) -> str:
+    # Totals on the page depend on the exchange rates as well.
+    from .currency import rates_version
+
+    return f'page:trip_detail:{pk}:{trip_version(pk)}:{rates_version()}'
+
+
+def cache_anonymous_page(key_func):
+    """Cache the full response for anonymous GET requests."""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            key = key_func(request, *args, **kwargs)
+            response = cache.get(key)
+            if response is not None:
+                return response
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                cache.set(key, response, settings.PLANNER_PAGE_CACHE_TIMEOUT)
+            return response
+
+        return wrapper
+
+    return decorator
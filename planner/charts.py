@@ -0,0 +1,75 @@
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from .caching import trip_version
+from .currency import grouped_totals, rates_version
+from .models import Trip
+from .rollups import period_start
+
+BUCKETS = ['day', 'week', 'month']
+MAX_POINTS = 60
+CHART_TIMEOUT = 60 * 60 * 24
+
+
+def _label(bucket: str, day) -> str:
+    if bucket == 'month':
+        return day.strftime('%Y-%m')
+    return day.isoformat()
+
+
+def _bucketize(by_day: list[dict], bucket: str) -> OrderedDict:
+    points = OrderedDict()
+    for row in by_day:
+        day = row['date'] if bucket == 'day' else period_start(bucket, row['date'])
+        key = _label(bucket, day)
+        points[key] = points.get(key, 0.0) + float(row['total'] or 0)
+    return points
+
+
+def trip_chart_etag(trip: Trip, bucket: str) -> str:
+    return f'"chart-{trip.pk}-{trip_version(trip.pk)}-{rates_version()}-{bucket}"'
+
+
+def trip_chart_data(trip: Trip, bucket: str = 'auto') -> dict:
+    if bucket not in BUCKETS:
+        bucket = 'auto'
+    key = f'chart:{trip.pk}:{trip_version(trip.pk)}:{rates_version()}:{bucket}'
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    activities = trip.activities.all()
+    by_day = [
+        {'date': day, 'total': total}
+        for (day,), (total, _) in sorted(
+            grouped_totals(activities, 'cost', keys=('date',), target=trip.currency).items()
+        )
+    ]
+
+    # Start from the requested (or finest) bucket and coarsen until the series
+    # fits into MAX_POINTS, so long trips stay readable.
+    start = 0 if bucket == 'auto' else BUCKETS.index(bucket)
+    for used in BUCKETS[start:]:
+        points = _bucketize(by_day, used)
+        if len(points) <= MAX_POINTS:
+            break
+
+    by_tag = sorted(
+        (
+            {'tags__name': name, 'total': total}
+            for (name,), (total, _) in grouped_totals(
+                activities, 'cost', keys=('tags__name',), target=trip.currency
+            ).items()
+        ),
+        key=lambda x: -x['total'],
+    )
+    data = {
+        'bucket': used,
+        'labels': list(points.keys()),
+        'totals': [round(v, 2) for v in points.values()],
+        'tags': [x['tags__name'] or 'Без тега' for x in by_tag],
+        'tag_totals': [float(x['total'] or 0) for x in by_tag],
+    }
+    cache.set(key, data, CHART_TIMEOUT)
+    return data
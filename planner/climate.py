@@ -0,0 +1,156 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from .jobs import enqueue
+from .models import ClimateNormal
+from .services import WeatherResult
+
+FORECAST_DAYS = 7
+# Degrees; about the resolution of the reanalysis behind the archive API.
+CLIMATE_GRID = Decimal('0.25')
+CLIMATE_MAX_DAYS = 31
+WET_DAY_MM = 1.0
+
+
+def outside_forecast(start: date, end: date, today: date | None = None) -> bool:
+    today = today or timezone.localdate()
+    return start >= today + timedelta(days=FORECAST_DAYS) or end < today
+
+
+def climate_cell(latitude: float, longitude: float) -> tuple[Decimal, Decimal]:
+    return tuple(
+        (Decimal(str(value)) / CLIMATE_GRID).quantize(Decimal('1')) * CLIMATE_GRID for value in (latitude, longitude)
+    )
+
+
+def _climate_result(cell, days: list[date]) -> WeatherResult | None:
+    normals = {
+        (n.month, n.day): n
+        for n in ClimateNormal.objects.filter(
+            latitude=cell[0], longitude=cell[1], month__in={d.month for d in days}
+        )
+    }
+    if not normals:
+        return None
+    daily = {
+        'time': [],
+        'temperature_2m_max': [],
+        'temperature_2m_min': [],
+        'precipitation_probability_max': [],
+    }
+    for day in days:
+        normal = normals.get((day.month, day.day)) or normals.get((day.month, day.day - 1))
+        if normal is None:
+            continue
+        daily['time'].append(day.isoformat())
+        daily['temperature_2m_max'].append(normal.temperature_max)
+        daily['temperature_2m_min'].append(normal.temperature_min)
+        daily['precipitation_probability_max'].append(normal.wet_days_pct)
+    years = max(n.years for n in normals.values())
+    return WeatherResult(
+        ok=True,
+        summary=f'Климатическая норма на даты поездки: средние значения за {years} лет.',
+        data={'daily': daily},
+    )
+
+
+def get_climate(
+    latitude: float, longitude: float, start: date, end: date, destination_id: int | None = None
+) -> WeatherResult:
+    """Daily normals for the trip dates, from the local table once it has been filled."""
+    if latitude is None or longitude is None:
+        return WeatherResult(ok=False, summary='Нет координат у направления.', data={})
+
+    cell = climate_cell(latitude, longitude)
+    days = [start + timedelta(days=i) for i in range(min((end - start).days + 1, CLIMATE_MAX_DAYS))]
+    result = _climate_result(cell, days)
+    if result is not None:
+        return result
+
+    # Years of archive data per cell: always left to the worker, even in
+    # eager mode, so the page never waits for the archive API.
+    enqueue(
+        'climate.fetch',
+        {'latitude': float(cell[0]), 'longitude': float(cell[1]), 'destination_id': destination_id},
+        dedupe_key=f'climate:{cell[0]}:{cell[1]}',
+        max_attempts=3,
+        eager=False,
+    )
+    return WeatherResult(ok=False, summary='Климатическая норма загружается, обновите страницу через минуту.', data={})
+
+
+def climate_normals(daily: dict) -> dict[tuple[int, int], dict]:
+    """Per (month, day) means of archive `daily` series spanning several years."""
+    import numpy as np
+
+    times = daily.get('time') or []
+    if not times:
+        return {}
+    keys = np.array([int(t[5:7]) * 100 + int(t[8:10]) for t in times])
+    uniq, idx = np.unique(keys, return_inverse=True)
+
+    def mean(name):
+        values = np.array(daily.get(name) or [None] * len(times), dtype=np.float64)
+        valid = ~np.isnan(values)
+        sums = np.bincount(idx, weights=np.where(valid, values, 0), minlength=len(uniq))
+        counts = np.bincount(idx, weights=valid, minlength=len(uniq))
+        return np.divide(sums, counts, out=np.full(len(uniq), np.nan), where=counts > 0), counts
+
+    tmax, years = mean('temperature_2m_max')
+    tmin, _ = mean('temperature_2m_min')
+    precipitation, _ = mean('precipitation_sum')
+    rain = np.array(daily.get('precipitation_sum') or [None] * len(times), dtype=np.float64)
+    wet = np.bincount(idx, weights=np.nan_to_num(rain) >= WET_DAY_MM, minlength=len(uniq))
+    measured = np.bincount(idx, weights=~np.isnan(rain), minlength=len(uniq))
+    wet_pct = np.divide(wet * 100, measured, out=np.zeros(len(uniq)), where=measured > 0)
+
+    def value(x):
+        return None if np.isnan(x) else round(float(x), 1)
+
+    return {
+        (int(key) // 100, int(key) % 100): {
+            'temperature_max': value(tmax[i]),
+            'temperature_min': value(tmin[i]),
+            'precipitation': value(precipitation[i]) or 0,
+            'wet_days_pct': round(float(wet_pct[i]), 1),
+            'years': int(years[i]),
+        }
+        for i, key in enumerate(uniq)
+    }
+
+
+def fetch_climate_normals(latitude: float, longitude: float) -> WeatherResult:
+    """Fetch whole past years for a grid cell once and store normals for every calendar day."""
+    last = date(timezone.localdate().year - 1, 12, 31)
+    params = {
+        'latitude': latitude,
+        'longitude': longitude,
+        'start_date': date(last.year - settings.PLANNER_CLIMATE_YEARS + 1, 1, 1).isoformat(),
+        'end_date': last.isoformat(),
+        'daily': 'temperature_2m_max,temperature_2m_min,precipitation_sum',
+        'timezone': 'auto',
+    }
+    import requests
+
+    try:
+        resp = requests.get('https://archive-api.open-meteo.com/v1/archive', params=params, timeout=30)
+        resp.raise_for_status()
+        normals = climate_normals(resp.json().get('daily') or {})
+    except Exception:
+        return WeatherResult(ok=False, summary='Архив погоды временно недоступен.', data={})
+    if not normals:
+        return WeatherResult(ok=False, summary='Архив погоды не вернул данных.', data={})
+
+    ClimateNormal.objects.bulk_create(
+        [
+            ClimateNormal(latitude=latitude, longitude=longitude, month=month, day=day, **values)
+            for (month, day), values in normals.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['latitude', 'longitude', 'month', 'day'],
+        update_fields=['temperature_max', 'temperature_min', 'precipitation', 'wet_days_pct', 'years', 'fetched_at'],
+    )
+    return WeatherResult(ok=True, summary='Климатическая норма загружена.', data={})
@@ -0,0 +1,63 @@
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from .models import Activity, Trip, TripPackingItem
+from .packing import record_trip_packing
+from .rollups import schedule_rollup_refresh
+from .sync import record_changes
+
+
+@transaction.atomic
+def clone_trip(trip: Trip, title: str | None = None, start_date: date | None = None) -> Trip:
+    shift = (start_date - trip.start_date) if start_date else timedelta(0)
+    clone = Trip.objects.create(
+        owner_id=trip.owner_id,
+        title=title or trip.title,
+        destination_id=trip.destination_id,
+        start_date=trip.start_date + shift,
+        end_date=trip.end_date + shift,
+        budget=trip.budget,
+        currency=trip.currency,
+        is_public=trip.is_public,
+    )
+
+    activities = list(trip.activities.order_by('pk'))
+    copies = Activity.objects.bulk_create(
+        [
+            Activity(
+                trip=clone,
+                title=a.title,
+                date=a.date + shift,
+                cost=a.cost,
+                currency=a.currency,
+                notes=a.notes,
+                latitude=a.latitude,
+                longitude=a.longitude,
+            )
+            for a in activities
+        ]
+    )
+    new_ids = {old.pk: new.pk for old, new in zip(activities, copies)}
+
+    ActivityTag = Activity.tags.through
+    ActivityTag.objects.bulk_create(
+        [
+            ActivityTag(activity_id=new_ids[activity_id], tag_id=tag_id)
+            for activity_id, tag_id in ActivityTag.objects.filter(activity__trip=trip).values_list(
+                'activity_id', 'tag_id'
+            )
+        ]
+    )
+
+    links = TripPackingItem.objects.bulk_create(
+        [
+            TripPackingItem(trip=clone, item_id=link.item_id, quantity=link.quantity, note=link.note)
+            for link in trip.packing_links.all()
+        ]
+    )
+    record_trip_packing(clone.pk)
+    schedule_rollup_refresh(clone.owner_id, {a.date for a in copies})
+    record_changes('activity', clone.owner_id, [(a.pk, a.updated_at) for a in copies])
+    record_changes('packing_link', clone.owner_id, [(link.pk, link.updated_at) for link in links])
+    return clone
@@ -0,0 +1,130 @@
+import time
+from decimal import Decimal
+
+from django.db.models import Count, Max, Sum
+
+from .models import BASE_CURRENCY, ExchangeRate
+
+# Seconds between checks of the rates stamp in the database. Rates are loaded
+# by a separate command process, so a cache-based version bump would not reach
+# the web workers unless the cache is shared.
+RATES_CHECK_INTERVAL = 30
+
+# Per process: the last stamp read, when it was read, and (stamp, RateTable).
+_stamp = (None, 0.0)
+_table = (None, None)
+
+
+def money(value) -> Decimal:
+    return Decimal(str(round(float(value), 2)))
+
+
+def rates_version() -> str:
+    """Stamp of the stored rates (row count and last change), re-read every RATES_CHECK_INTERVAL seconds."""
+    global _stamp
+    stamp, checked = _stamp
+    now = time.monotonic()
+    if stamp is None or now - checked >= RATES_CHECK_INTERVAL:
+        row = ExchangeRate.objects.aggregate(n=Count('id'), changed=Max('updated_at'))
+        changed = row['changed'].timestamp() if row['changed'] else 0
+        stamp = f"{row['n']}-{changed:.6f}"
+        _stamp = (stamp, now)
+    return stamp
+
+
+def rates_changed() -> None:
+    """Make this process re-read the stamp on its next use; other processes notice within the interval."""
+    global _stamp
+    _stamp = (None, 0.0)
+
+
+class RateTable:
+    """All exchange rates as sorted numpy arrays, one pair per currency."""
+
+    def __init__(self, rows):
+        import numpy as np
+
+        series = {}
+        for currency, day, rate in rows:
+            days, rates = series.setdefault(currency, ([], []))
+            days.append(day.toordinal())
+            rates.append(float(rate))
+        self._series = {
+            currency: (np.array(days, dtype=np.int64), np.array(rates, dtype=np.float64))
+            for currency, (days, rates) in series.items()
+        }
+
+    def rates(self, currencies, days):
+        """Rate to BASE_CURRENCY for each (currency, day) pair.
+
+        The latest rate on or before the day applies, or the earliest one for
+        days before the first rate; the base currency and currencies without
+        any rate count as 1.
+        """
+        import numpy as np
+
+        currencies = np.asarray(currencies, dtype=object)
+        ordinals = np.fromiter((day.toordinal() for day in days), dtype=np.int64, count=len(currencies))
+        out = np.ones(len(currencies))
+        for currency in set(currencies.tolist()):
+            series = self._series.get(currency)
+            if series is None or currency == BASE_CURRENCY:
+                continue
+            mask = currencies == currency
+            idx = np.searchsorted(series[0], ordinals[mask], side='right') - 1
+            out[mask] = series[1][np.maximum(idx, 0)]
+        return out
+
+    def convert(self, amounts, currencies, days, target: str):
+        """`amounts` in `currencies` on `days`, converted to `target` as a float array."""
+        import numpy as np
+
+        amounts = np.fromiter((float(a or 0) for a in amounts), dtype=np.float64)
+        if not len(amounts):
+            return amounts
+        days = list(days)
+        ratio = self.rates(currencies, days)
+        if target != BASE_CURRENCY:
+            ratio = ratio / self.rates([target] * len(days), days)
+        return amounts * ratio
+
+
+def rate_table() -> RateTable:
+    global _table
+    version = rates_version()
+    if _table[0] != version:
+        rows = ExchangeRate.objects.order_by('currency', 'date').values_list('currency', 'date', 'rate')
+        _table = (version, RateTable(rows))
+    return _table[1]
+
+
+def convert_amount(amount, currency: str, day, target: str = BASE_CURRENCY) -> Decimal:
+    if currency == target:
+        return Decimal(amount or 0)
+    return money(rate_table().convert([amount], [currency], [day], target)[0])
+
+
+def grouped_totals(
+    qs, amount: str, keys=(), target: str = BASE_CURRENCY, date_field: str = 'date', currency_field: str = 'currency'
+) -> dict[tuple, tuple[Decimal, int]]:
+    """Sum of `amount` in `target` and row count per `keys` tuple.
+
+    The database sums per (keys, currency, day); only those groups are
+    converted, in one vectorized batch.
+    """
+    fields = list(dict.fromkeys([*keys, currency_field, date_field]))
+    rows = list(qs.order_by().values(*fields).annotate(_total=Sum(amount), _n=Count('pk')))
+    if not rows:
+        return {}
+    converted = rate_table().convert(
+        [row['_total'] for row in rows],
+        [row[currency_field] for row in rows],
+        [row[date_field] for row in rows],
+        target,
+    )
+    totals = {}
+    for row, value in zip(rows, converted.tolist()):
+        key = tuple(row[k] for k in keys)
+        total, count = totals.get(key, (0.0, 0))
+        totals[key] = (total + value, count + row['_n'])
+    return {key: (money(total), count) for key, (total, count) in totals.items()}
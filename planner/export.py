@@ -0,0 +1,126 @@
+import csv
+import io
+import json
+import zipfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .archive import unpack
+from .models import Activity, ArchivedTrip, PackingItem, Trip, TripPackingItem
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only, unseekable sink; zipfile then emits data descriptors."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _chunked(qs, size: int = EXPORT_CHUNK_SIZE):
+    # Keyset pagination: each query is short and only one chunk of rows is
+    # held at a time, unlike OFFSET or a single huge cursor.
+    last_pk = 0
+    while True:
+        rows = list(qs.filter(pk__gt=last_pk).order_by('pk')[:size])
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1]['id'] if isinstance(rows[-1], dict) else rows[-1].pk
+
+
+def _activity_rows(user):
+    ActivityTag = Activity.tags.through
+    qs = Activity.objects.filter(trip__owner=user).values(
+        'id', 'trip_id', 'date', 'title', 'cost', 'currency', 'notes', 'latitude', 'longitude'
+    )
+    for rows in _chunked(qs):
+        tags = {}
+        for activity_id, name in ActivityTag.objects.filter(
+            activity_id__in=[r['id'] for r in rows]
+        ).values_list('activity_id', 'tag__name'):
+            tags.setdefault(activity_id, []).append(name)
+        yield [
+            [
+                r['id'], r['trip_id'], r['date'], r['title'], r['cost'], r['currency'], r['notes'],
+                r['latitude'], r['longitude'], ';'.join(sorted(tags.get(r['id'], []))),
+            ]
+            for r in rows
+        ]
+
+
+def _table_rows(qs, fields):
+    for rows in _chunked(qs.values(*fields)):
+        yield [[r[f] for f in fields] for r in rows]
+
+
+def _csv_entry(zf: zipfile.ZipFile, stream: _ZipStream, name: str, header, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    with zf.open(name, 'w', force_zip64=True) as entry:
+        writer.writerow(header)
+        for rows in chunks:
+            writer.writerows(rows)
+            entry.write(buffer.getvalue().encode())
+            buffer.seek(0)
+            buffer.truncate()
+            yield stream.drain()
+        entry.write(buffer.getvalue().encode())
+    yield stream.drain()
+
+
+def export_filename(user) -> str:
+    return f"tripplanner-{user.get_username()}-{timezone.localdate():%Y%m%d}.zip"
+
+
+def stream_account_export(user):
+    """Yield the bytes of a zip with all data of `user`, one chunk of rows at a time."""
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        trip_fields = [
+            'id', 'title', 'destination__name', 'destination__country', 'start_date', 'end_date', 'budget', 'currency',
+            'is_public',
+        ]
+        yield from _csv_entry(
+            zf, stream, 'trips.csv',
+            ['id', 'title', 'destination', 'country', 'start_date', 'end_date', 'budget', 'currency', 'is_public'],
+            _table_rows(Trip.objects.filter(owner=user), trip_fields),
+        )
+        yield from _csv_entry(
+            zf, stream, 'activities.csv',
+            ['id', 'trip_id', 'date', 'title', 'cost', 'currency', 'notes', 'latitude', 'longitude', 'tags'],
+            _activity_rows(user),
+        )
+        yield from _csv_entry(
+            zf, stream, 'packing_items.csv',
+            ['id', 'name', 'category'],
+            _table_rows(PackingItem.objects.filter(owner=user), ['id', 'name', 'category']),
+        )
+        link_fields = ['id', 'trip_id', 'item_id', 'item__name', 'quantity', 'is_packed', 'note']
+        yield from _csv_entry(
+            zf, stream, 'packing_links.csv',
+            ['id', 'trip_id', 'item_id', 'item', 'quantity', 'is_packed', 'note'],
+            _table_rows(TripPackingItem.objects.filter(trip__owner=user), link_fields),
+        )
+
+        # Archived trips are stored as JSON already; one line per trip.
+        with zf.open('archived_trips.jsonl', 'w', force_zip64=True) as entry:
+            for rows in _chunked(ArchivedTrip.objects.filter(owner=user).only('id', 'data')):
+                for archived in rows:
+                    entry.write(json.dumps(unpack(archived), cls=DjangoJSONEncoder).encode() + b'\n')
+                yield stream.drain()
+    yield stream.drain()
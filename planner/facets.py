@@ -0,0 +1,67 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+
+from .models import Destination, DestinationTripCount, Trip
+
+
+def facet_key(destination_id: int, owner_id: int, is_public: bool) -> tuple:
+    return (destination_id, None if is_public else owner_id)
+
+
+def adjust_facet(key: tuple, delta: int) -> None:
+    destination_id, owner_id = key
+    rows = DestinationTripCount.objects.filter(destination_id=destination_id, owner_id=owner_id)
+    # A count that drifted (e.g. rows edited by hand before a rebuild) must
+    # not go below zero: the column is unsigned.
+    if rows.update(trips_count=Greatest(F('trips_count') + delta, 0)) or delta <= 0:
+        return
+    try:
+        with transaction.atomic():
+            DestinationTripCount.objects.create(
+                destination_id=destination_id, owner_id=owner_id, trips_count=delta
+            )
+    except IntegrityError:
+        rows.update(trips_count=F('trips_count') + delta)
+
+
+def rebuild_destination_facets() -> int:
+    public = (
+        Trip.objects.filter(is_public=True)
+        .values('destination_id')
+        .annotate(n=Count('id'))
+    )
+    private = (
+        Trip.objects.filter(is_public=False)
+        .values('destination_id', 'owner_id')
+        .annotate(n=Count('id'))
+    )
+    rows = [
+        DestinationTripCount(destination_id=r['destination_id'], owner_id=None, trips_count=r['n'])
+        for r in public
+    ]
+    rows += [
+        DestinationTripCount(
+            destination_id=r['destination_id'], owner_id=r['owner_id'], trips_count=r['n']
+        )
+        for r in private
+    ]
+    with transaction.atomic():
+        DestinationTripCount.objects.all().delete()
+        DestinationTripCount.objects.bulk_create(rows)
+    return len(rows)
+
+
+def destination_facets_for_user(user) -> list[Destination]:
+    visible = Q(owner__isnull=True)
+    if user.is_authenticated:
+        visible |= Q(owner=user)
+    rows = DestinationTripCount.objects.filter(visible, trips_count__gt=0).select_related(
+        'destination'
+    )
+
+    by_destination = {}
+    for row in rows:
+        destination = by_destination.setdefault(row.destination_id, row.destination)
+        destination.trips_count = getattr(destination, 'trips_count', 0) + row.trips_count
+    return sorted(by_destination.values(), key=lambda d: (d.country, d.name))
@@ -1,6 +1,10 @@
 from django import forms
+from django.urls import reverse
+from django.utils.functional import cached_property
 
-from .models import Activity, PackingItem, Trip, TripPackingItem
+from .autocomplete import get_destination_index
+from .models import BASE_CURRENCY, Activity, Destination, PackingItem, Tag, Trip, TripPackingItem
+from .timeline import overlapping_trips
 
 
 def _apply_bootstrap(form: forms.Form) -> None:
@@ -16,32 +20,71 @@ def _apply_bootstrap(form: forms.Form) -> None:
         widget.attrs['class'] = (cls + ' ' + bootstrap).strip()
 
 
+class DestinationAutocompleteWidget(forms.TextInput):
+    template_name = 'planner/widgets/destination_autocomplete.html'
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['url'] = reverse('destination_autocomplete')
+        context['widget']['label'] = get_destination_index().label(value) if value else ''
+        return context
+
+
+def _allow_overlap_field():
+    return forms.BooleanField(
+        label='Разрешить пересечение с другими поездками',
+        required=False,
+        help_text='По умолчанию поездку нельзя сохранить, если её даты пересекаются с другой вашей поездкой.',
+    )
+
+
+def _check_overlaps(owner_id: int, start, end, exclude_pk=None) -> None:
+    overlaps = list(overlapping_trips(owner_id, start, end).exclude(pk=exclude_pk)[:3])
+    if overlaps:
+        titles = ', '.join(
+            f'«{trip.title}» ({trip.start_date:%d.%m.%Y}–{trip.end_date:%d.%m.%Y})' for trip in overlaps
+        )
+        raise forms.ValidationError(
+            f'Даты пересекаются с поездками: {titles}. '
+            'Измените даты или отметьте «Разрешить пересечение с другими поездками».'
+        )
+
+
 class TripForm(forms.ModelForm):
+    allow_overlap = _allow_overlap_field()
+
     class Meta:
         model = Trip
-        fields = ['title', 'destination', 'start_date', 'end_date', 'budget', 'is_public']
+        fields = ['title', 'destination', 'start_date', 'end_date', 'budget', 'currency', 'is_public']
         labels = {
             'title': 'Название поездки',
             'destination': 'Направление',
             'start_date': 'Дата начала',
             'end_date': 'Дата окончания',
             'budget': 'Бюджет',
+            'currency': 'Валюта',
             'is_public': 'Публичная поездка',
         }
         help_texts = {
+            'currency': 'В этой валюте считаются бюджет и итоги поездки.',
             'is_public': 'Если выключить, поездку увидите только вы.',
         }
         widgets = {
             'start_date': forms.DateInput(attrs={'type': 'date'}),
             'end_date': forms.DateInput(attrs={'type': 'date'}),
+            'destination': DestinationAutocompleteWidget(),
         }
 
     def __init__(self, *args, **kwargs):
+        self.owner = kwargs.pop('owner', None)
         super().__init__(*args, **kwargs)
+        if self.owner is None:
+            del self.fields['allow_overlap']
+        # Optional so that clients that do not know about currencies keep working.
+        self.fields['currency'].required = False
         _apply_bootstrap(self)
 
-        dest_qs = self.fields['destination'].queryset
-        if not dest_qs.exists():
+        if not Destination.objects.exists():
             self.fields['destination'].required = False
             self.fields['destination'].disabled = True
             self.fields['destination'].help_text = (
@@ -49,6 +92,9 @@ class TripForm(forms.ModelForm):
                 'затем создайте поездку.'
             )
 
+    def clean_currency(self):
+        return self.cleaned_data['currency'] or self.instance.currency
+
     def clean(self):
         cleaned = super().clean()
         start = cleaned.get('start_date')
@@ -62,19 +108,50 @@ class TripForm(forms.ModelForm):
             raise forms.ValidationError('Дата окончания должна быть после даты начала.')
         if budget is not None and budget < 0:
             raise forms.ValidationError('Бюджет не может быть отрицательным.')
+        dates_changed = not self.instance.pk or {'start_date', 'end_date'} & set(self.changed_data)
+        if self.owner is not None and start and end and dates_changed and not cleaned.get('allow_overlap'):
+            _check_overlaps(self.owner.pk, start, end, exclude_pk=self.instance.pk)
+        return cleaned
+
+
+class TripCloneForm(forms.Form):
+    title = forms.CharField(label='Название новой поездки', max_length=160)
+    start_date = forms.DateField(
+        label='Дата начала',
+        widget=forms.DateInput(attrs={'type': 'date'}),
+        help_text='Даты активностей сдвинутся вместе с поездкой.',
+    )
+    allow_overlap = _allow_overlap_field()
+
+    def __init__(self, *args, trip: Trip, **kwargs):
+        self.trip = trip
+        super().__init__(*args, **kwargs)
+        _apply_bootstrap(self)
+
+    def clean(self):
+        cleaned = super().clean()
+        start = cleaned.get('start_date')
+        if start and not cleaned.get('allow_overlap'):
+            _check_overlaps(self.trip.owner_id, start, start + (self.trip.end_date - self.trip.start_date))
         return cleaned
 
 
 class ActivityForm(forms.ModelForm):
     class Meta:
         model = Activity
-        fields = ['title', 'date', 'cost', 'notes', 'tags']
+        fields = ['title', 'date', 'cost', 'currency', 'notes', 'tags', 'latitude', 'longitude']
         labels = {
             'title': 'Название активности',
             'date': 'Дата',
             'cost': 'Стоимость',
+            'currency': 'Валюта',
             'notes': 'Заметки',
             'tags': 'Теги',
+            'latitude': 'Широта',
+            'longitude': 'Долгота',
+        }
+        help_texts = {
+            'longitude': 'Необязательно. С координатами активность попадёт в маршрут дня.',
         }
         widgets = {
             'date': forms.DateInput(attrs={'type': 'date'}),
@@ -87,8 +164,19 @@ class ActivityForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         if self.owner:
             self.fields['tags'].queryset = self.fields['tags'].queryset.filter(owner=self.owner)
+        self.fields['currency'].required = False
+        if not self.instance.pk and self.trip:
+            self.initial.setdefault('currency', self.trip.currency)
         _apply_bootstrap(self)
 
+    def clean_currency(self):
+        currency = self.cleaned_data['currency']
+        if currency:
+            return currency
+        if not self.instance.pk and self.trip:
+            return self.trip.currency
+        return self.instance.currency or BASE_CURRENCY
+
     def clean(self):
         cleaned = super().clean()
         date = cleaned.get('date')
@@ -98,9 +186,87 @@ class ActivityForm(forms.ModelForm):
         if self.trip and date:
             if date < self.trip.start_date or date > self.trip.end_date:
                 raise forms.ValidationError('Дата активности должна попадать в диапазон поездки.')
+        latitude = cleaned.get('latitude')
+        longitude = cleaned.get('longitude')
+        if (latitude is None) != (longitude is None):
+            raise forms.ValidationError('Укажите и широту, и долготу или оставьте оба поля пустыми.')
+        if latitude is not None and not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise forms.ValidationError('Координаты вне допустимого диапазона.')
         return cleaned
 
 
+class ActivityGridForm(ActivityForm):
+    """One row of the bulk editor; tag links are saved by save_activity_grid."""
+
+    def __init__(self, *args, tag_choices=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        # A plain choice field: the tag list is loaded once for the whole grid
+        # instead of one queryset per row.
+        self.fields['tags'] = forms.TypedMultipleChoiceField(
+            label='Теги',
+            choices=tag_choices,
+            coerce=int,
+            required=False,
+            widget=forms.SelectMultiple(attrs={'class': 'form-select form-select-sm', 'size': 2}),
+        )
+        if self.instance.pk:
+            self.initial['tags'] = [tag.pk for tag in self.instance.tags.all()]
+        for name in ('title', 'date', 'cost', 'notes'):
+            self.fields[name].widget.attrs['class'] += ' form-control-sm'
+        self.fields['currency'].widget.attrs['class'] += ' form-select-sm'
+        self.fields['notes'].widget.attrs['rows'] = 1
+
+
+class _LoadedRowField(forms.ModelChoiceField):
+    # The stock pk field of a model formset runs one SELECT per row; the rows
+    # are already loaded by the formset, so look the id up among them.
+    def __init__(self, rows: dict, **kwargs):
+        self.rows = rows
+        super().__init__(**kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self.rows[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+
+
+class BaseActivityGridFormSet(forms.BaseModelFormSet):
+    def __init__(self, *args, trip=None, owner=None, **kwargs):
+        tag_choices = list(Tag.objects.filter(owner=owner).values_list('id', 'name')) if owner else []
+        kwargs['form_kwargs'] = {'trip': trip, 'owner': owner, 'tag_choices': tag_choices}
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def _rows(self) -> dict:
+        return {row.pk: row for row in self.get_queryset()}
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        field = form.fields['id']
+        form.fields['id'] = _LoadedRowField(
+            self._rows,
+            queryset=field.queryset,
+            initial=field.initial,
+            required=False,
+            widget=field.widget,
+        )
+
+
+ActivityGridFormSet = forms.modelformset_factory(
+    Activity,
+    form=ActivityGridForm,
+    formset=BaseActivityGridFormSet,
+    fields=['title', 'date', 'cost', 'currency', 'notes', 'tags'],
+    extra=0,
+    # Only existing rows are edited here; forms beyond INITIAL_FORMS in a
+    # crafted POST are not built at all.
+    edit_only=True,
+)
+
+
 class PackingItemForm(forms.ModelForm):
     class Meta:
         model = PackingItem
@@ -121,6 +287,25 @@ class PackingItemForm(forms.ModelForm):
         return name
 
 
+class TagForm(forms.ModelForm):
+    class Meta:
+        model = Tag
+        fields = ['name']
+        labels = {
+            'name': 'Название',
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _apply_bootstrap(self)
+
+    def clean_name(self):
+        name = (self.cleaned_data.get('name') or '').strip()
+        if not name:
+            raise forms.ValidationError('Название обязательно.')
+        return name
+
+
 class TripPackingItemForm(forms.ModelForm):
     class Meta:
         model = TripPackingItem
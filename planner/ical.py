@@ -0,0 +1,153 @@
+import hashlib
+import secrets
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from .caching import get_versions, trip_version
+from .models import Activity, CalendarFeed, Trip
+
+ICAL_BLOCK_TIMEOUT = 60 * 60 * 24
+ICAL_CHUNK_SIZE = 200
+ICAL_UID_DOMAIN = 'tripplanner'
+
+
+def new_token() -> str:
+    return secrets.token_urlsafe(24)
+
+
+def get_feed(owner, trip: Trip | None = None) -> CalendarFeed:
+    feed = CalendarFeed.objects.filter(owner=owner, trip=trip).first()
+    if feed is not None:
+        return feed
+    try:
+        with transaction.atomic():
+            return CalendarFeed.objects.create(owner=owner, trip=trip, token=new_token())
+    except IntegrityError:
+        return CalendarFeed.objects.get(owner=owner, trip=trip)
+
+
+def _escape(text: str) -> str:
+    return (
+        str(text)
+        .replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+
+def _fold(line: str) -> str:
+    # RFC 5545: lines longer than 75 octets continue on the next line after
+    # CRLF and a space; never split a multi-byte character.
+    raw = line.encode()
+    if len(raw) <= 75:
+        return line + '\r\n'
+    parts, current, size = [], '', 0
+    for char in line:
+        width = len(char.encode())
+        if size + width > (75 if not parts else 74):
+            parts.append(current)
+            current, size = '', 0
+        current += char
+        size += width
+    parts.append(current)
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _event(
+    uid: str, stamp, start, end, summary: str, location: str = '', description: str = '', geo=None
+) -> str:
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}@{ICAL_UID_DOMAIN}',
+        f'DTSTAMP:{stamp:%Y%m%dT%H%M%SZ}',
+        f'DTSTART;VALUE=DATE:{start:%Y%m%d}',
+        f'DTEND;VALUE=DATE:{end + timedelta(days=1):%Y%m%d}',
+        f'SUMMARY:{_escape(summary)}',
+    ]
+    if location:
+        lines.append(f'LOCATION:{_escape(location)}')
+    if description:
+        lines.append(f'DESCRIPTION:{_escape(description)}')
+    if geo:
+        lines.append(f'GEO:{geo[0]};{geo[1]}')
+    lines.append('END:VEVENT')
+    return ''.join(_fold(line) for line in lines)
+
+
+def _render_blocks(trip_ids) -> dict[int, str]:
+    trips = Trip.objects.filter(pk__in=trip_ids).select_related('destination')
+    blocks = {}
+    for trip in trips:
+        blocks[trip.pk] = _event(
+            f'trip-{trip.pk}',
+            trip.updated_at,
+            trip.start_date,
+            trip.end_date,
+            trip.title,
+            str(trip.destination),
+            f'Бюджет: {trip.budget} {trip.currency}',
+        )
+    for activity in Activity.objects.filter(trip_id__in=blocks.keys()).order_by('trip_id', 'date', 'pk'):
+        description = f'Стоимость: {activity.cost} {activity.currency}'
+        if activity.notes:
+            description += f'\n{activity.notes}'
+        blocks[activity.trip_id] += _event(
+            f'activity-{activity.pk}', activity.updated_at, activity.date, activity.date, activity.title,
+            description=description,
+            geo=(activity.latitude, activity.longitude) if activity.latitude is not None else None,
+        )
+    return blocks
+
+
+def _block_key(trip_id: int, version: int) -> str:
+    return f'ics:trip:{trip_id}:{version}'
+
+
+def _trip_blocks(versions: dict[int, int]):
+    """Yield VEVENT text per trip: from the cache, rendering only missing or stale trips."""
+    keys = {trip_id: _block_key(trip_id, version) for trip_id, version in versions.items()}
+    cached = cache.get_many(keys.values())
+    missing = [trip_id for trip_id, key in keys.items() if key not in cached]
+    rendered = _render_blocks(missing) if missing else {}
+    if rendered:
+        cache.set_many({keys[trip_id]: block for trip_id, block in rendered.items()}, ICAL_BLOCK_TIMEOUT)
+    for trip_id, key in keys.items():
+        block = cached.get(key) or rendered.get(trip_id)
+        if block:
+            yield block
+
+
+def feed_trip_ids(feed: CalendarFeed) -> list[int]:
+    if feed.trip_id is not None:
+        return [feed.trip_id]
+    return list(Trip.objects.filter(owner_id=feed.owner_id).order_by('start_date', 'pk').values_list('id', flat=True))
+
+
+def feed_etag(feed: CalendarFeed, trip_ids: list[int]) -> str:
+    if feed.trip_id is not None:
+        state = f'{feed.pk}:{feed.trip_id}:{trip_version(feed.trip_id)}'
+    else:
+        versions = get_versions('trip', trip_ids)
+        state = f'{feed.pk}:' + ','.join(f'{trip_id}:{versions[trip_id]}' for trip_id in trip_ids)
+    return '"' + hashlib.sha1(state.encode()).hexdigest() + '"'
+
+
+def stream_feed(feed: CalendarFeed, trip_ids: list[int], name: str):
+    yield ''.join(
+        _fold(line)
+        for line in [
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            'PRODID:-//TripPlanner//RU',
+            'CALSCALE:GREGORIAN',
+            f'X-WR-CALNAME:{_escape(name)}',
+        ]
+    )
+    for start in range(0, len(trip_ids), ICAL_CHUNK_SIZE):
+        chunk = trip_ids[start:start + ICAL_CHUNK_SIZE]
+        yield ''.join(_trip_blocks(get_versions('trip', chunk)))
+    yield 'END:VCALENDAR\r\n'
@@ -0,0 +1,161 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+CLAIM_BATCH = 10
+
+# Handlers are registered with @job('name') and get the payload as keyword
+# arguments. Workers claim rows with a conditional UPDATE, so several of them
+# can share the table without a broker or row locks.
+_handlers = {}
+
+
+def job(name: str):
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def get_handler(name: str):
+    # Handlers live in planner.tasks; importing it here keeps enqueue cheap
+    # for request code that never runs jobs itself.
+    from . import tasks  # noqa: F401
+
+    return _handlers[name]
+
+
+def enqueue(
+    name: str,
+    payload: dict | None = None,
+    dedupe_key: str = '',
+    delay: float = 0,
+    max_attempts: int = 5,
+    eager: bool = True,
+) -> Job:
+    """Queue a job; a queued job with the same dedupe_key is reused instead.
+
+    Jobs that must never run inside a request, whatever PLANNER_JOBS_EAGER
+    says, pass eager=False.
+    """
+    queued = None
+    if dedupe_key:
+        queued = Job.objects.filter(status=Job.STATUS_QUEUED, dedupe_key=dedupe_key).first()
+    if queued is None:
+        try:
+            with transaction.atomic():
+                queued = Job.objects.create(
+                    name=name,
+                    payload=payload or {},
+                    dedupe_key=dedupe_key,
+                    max_attempts=max_attempts,
+                    run_at=timezone.now() + timedelta(seconds=delay),
+                )
+        except IntegrityError:
+            queued = Job.objects.get(status=Job.STATUS_QUEUED, dedupe_key=dedupe_key)
+
+    # Eager mode runs only this job, inline after commit, and only if it is
+    # due now; delayed jobs, retries and pruning are left to run_worker.
+    if settings.PLANNER_JOBS_EAGER and eager and not delay and queued.run_at <= timezone.now():
+        job_id = queued.pk
+        transaction.on_commit(lambda: _run_eager(job_id))
+    return queued
+
+
+def _claim(job_id: int, worker: str) -> bool:
+    return bool(
+        Job.objects.filter(pk=job_id, status=Job.STATUS_QUEUED).update(
+            status=Job.STATUS_RUNNING,
+            locked_by=worker,
+            locked_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+    )
+
+
+def _run_eager(job_id: int) -> None:
+    if _claim(job_id, 'eager'):
+        run_job(Job.objects.get(pk=job_id))
+
+
+def claim_job(worker: str, names=None) -> Job | None:
+    candidates = Job.objects.filter(status=Job.STATUS_QUEUED, run_at__lte=timezone.now())
+    if names:
+        candidates = candidates.filter(name__in=names)
+    for job_id in candidates.order_by('run_at', 'id').values_list('id', flat=True)[:CLAIM_BATCH]:
+        # Another worker may have taken the row since the SELECT; the status
+        # condition in the UPDATE makes the claim atomic.
+        if _claim(job_id, worker):
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def _requeue(queued: Job, run_at, error: str) -> None:
+    try:
+        with transaction.atomic():
+            Job.objects.filter(pk=queued.pk).update(
+                status=Job.STATUS_QUEUED, run_at=run_at, locked_by='', locked_at=None, last_error=error
+            )
+    except IntegrityError:
+        # The same work was queued again meanwhile; that job covers this one.
+        Job.objects.filter(pk=queued.pk).delete()
+
+
+def retry_delay(attempts: int) -> float:
+    return min(settings.PLANNER_JOBS_RETRY_BASE * 2 ** max(attempts - 1, 0), settings.PLANNER_JOBS_RETRY_MAX)
+
+
+def run_job(claimed: Job) -> bool:
+    try:
+        get_handler(claimed.name)(**claimed.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s failed (attempt %s/%s)', claimed, claimed.attempts, claimed.max_attempts)
+        if claimed.attempts < claimed.max_attempts:
+            _requeue(claimed, timezone.now() + timedelta(seconds=retry_delay(claimed.attempts)), error)
+        else:
+            Job.objects.filter(pk=claimed.pk).update(
+                status=Job.STATUS_FAILED, last_error=error, finished_at=timezone.now()
+            )
+        return False
+    Job.objects.filter(pk=claimed.pk).update(status=Job.STATUS_DONE, finished_at=timezone.now())
+    return True
+
+
+def retry_jobs(queryset) -> int:
+    """Queue failed or finished jobs again with a fresh attempt budget."""
+    count = 0
+    for retried in queryset.exclude(status__in=[Job.STATUS_QUEUED, Job.STATUS_RUNNING]):
+        Job.objects.filter(pk=retried.pk).update(attempts=0, finished_at=None)
+        _requeue(retried, timezone.now(), retried.last_error)
+        count += 1
+    return count
+
+
+def requeue_stale(timeout: float) -> int:
+    """Put back jobs whose worker died mid-run."""
+    stale = Job.objects.filter(status=Job.STATUS_RUNNING, locked_at__lt=timezone.now() - timedelta(seconds=timeout))
+    count = 0
+    for stuck in stale:
+        if stuck.attempts < stuck.max_attempts:
+            _requeue(stuck, timezone.now(), f'Worker {stuck.locked_by} did not finish the job.')
+        else:
+            Job.objects.filter(pk=stuck.pk).update(status=Job.STATUS_FAILED, finished_at=timezone.now())
+        count += 1
+    return count
+
+
+def prune_jobs(days: int) -> int:
+    deleted, _ = Job.objects.filter(
+        status__in=[Job.STATUS_DONE, Job.STATUS_FAILED], finished_at__lt=timezone.now() - timedelta(days=days)
+    ).delete()
+    return deleted
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from planner.archive import archive_cutoff, archive_trips
+
+
+class Command(BaseCommand):
+    help = 'Move trips that ended long ago, with their activities and packing, into the compressed archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.PLANNER_ARCHIVE_AFTER_DAYS,
+            help='Archive trips that ended more than this many days ago.',
+        )
+        parser.add_argument('--owner', type=int, help='Only archive trips of this user id.')
+        parser.add_argument('--limit', type=int, help='Archive at most this many trips.')
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['days'])
+        count = archive_trips(cutoff, owner_id=options['owner'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {count} trips that ended before {cutoff}.'))
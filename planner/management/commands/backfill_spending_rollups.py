@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from planner.rollups import backfill_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild monthly and weekly spending rollups from activities'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner', type=int, help='Only rebuild rollups of this user id.')
+
+    def handle(self, *args, **options):
+        owner = options.get('owner')
+        rows = backfill_rollups(None if owner is None else [owner])
+        self.stdout.write(self.style.SUCCESS(f'Spending rollups rebuilt: {rows} rows.'))
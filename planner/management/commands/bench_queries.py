@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from planner.models import Trip
+
+BASELINE_SETTINGS = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+}
+
+
+def default_paths(user) -> list[str]:
+    paths = [reverse('trip_list'), reverse('dashboard'), reverse('packing_items')]
+    trip_id = Trip.objects.filter(owner=user).order_by('pk').values_list('pk', flat=True).first()
+    if trip_id is not None:
+        paths.append(reverse('trip_detail', args=[trip_id]))
+    return paths
+
+
+def measure(user, paths: list[str], repeat: int) -> dict[str, int]:
+    """Queries per authenticated view of each path, after one warm-up request."""
+    client = Client()
+    client.force_login(user)
+    counts = {}
+    try:
+        for path in paths:
+            client.get(path)
+            best = None
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(path)
+                if response.status_code != 200:
+                    raise CommandError(f'{path} returned {response.status_code}')
+                best = len(queries) if best is None else min(best, len(queries))
+            counts[path] = best
+    finally:
+        client.logout()
+    return counts
+
+
+class Command(BaseCommand):
+    help = 'Count queries per authenticated page view against plain db sessions and ModelBackend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username; defaults to the owner of the most trips.')
+        parser.add_argument('--path', action='append', default=None, help='Path to request (repeatable).')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument(
+            '--min-saving', type=int, default=0, help='Fail unless every page saves at least this many queries.'
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+        else:
+            owner_id = (
+                Trip.objects.values('owner_id').order_by().annotate(n=Count('id')).order_by('-n')
+                .values_list('owner_id', flat=True).first()
+            )
+            user = User.objects.filter(pk=owner_id).first()
+        if user is None:
+            raise CommandError('No user to log in as; pass --user or run seed_demo.')
+
+        paths = options['path'] or default_paths(user)
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        with override_settings(ALLOWED_HOSTS=hosts, **BASELINE_SETTINGS):
+            baseline = measure(user, paths, options['repeat'])
+        with override_settings(ALLOWED_HOSTS=hosts):
+            current = measure(user, paths, options['repeat'])
+
+        self.stdout.write(f'User: {user.get_username()}; session engine: {settings.SESSION_ENGINE}')
+        self.stdout.write(f'  {"baseline":>8}  {"current":>8}  {"saved":>5}  path')
+        short = []
+        for path in paths:
+            saved = baseline[path] - current[path]
+            self.stdout.write(f'  {baseline[path]:8d}  {current[path]:8d}  {saved:5d}  {path}')
+            if saved < options['min_saving']:
+                short.append(path)
+        if short:
+            raise CommandError(f'Saved fewer than {options["min_saving"]} queries on: {", ".join(short)}')
@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+STARTUP_CODE = (
+    'import config.wsgi\n'
+    'from django.urls import get_resolver\n'
+    'get_resolver().reverse_dict\n'
+)
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        self_us, cumulative_us, raw_name = parts
+        depth = (len(raw_name) - len(raw_name.lstrip(' ')) - 1) // 2
+        rows.append((raw_name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Measure worker cold start with -X importtime and check it against the budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget-ms', type=float, default=settings.STARTUP_IMPORT_BUDGET_MS)
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument(
+            '--forbid',
+            action='append',
+            default=None,
+            help='Module that must not be imported at startup (repeatable).',
+        )
+
+    def handle(self, *args, **options):
+        forbidden = options['forbid'] or list(settings.STARTUP_FORBIDDEN_IMPORTS)
+
+        env = os.environ.copy()
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+        env.pop('DJANGO_WSGI_WARMUP', None)
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_CODE],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise CommandError(f'Startup failed:\n{proc.stderr[-2000:]}')
+
+        rows = parse_importtime(proc.stderr)
+        total_ms = sum(cumulative for _, _, cumulative, depth in rows if depth == 0) / 1000
+
+        self.stdout.write(f'Imported modules: {len(rows)}')
+        self.stdout.write(f'Total import time: {total_ms:.1f} ms (budget {options["budget_ms"]:.0f} ms)')
+        self.stdout.write('Slowest modules (self time):')
+        for name, self_us, cumulative_us, _ in sorted(rows, key=lambda r: r[1], reverse=True)[: options['top']]:
+            self.stdout.write(f'  {self_us / 1000:8.1f} ms  {cumulative_us / 1000:8.1f} ms  {name}')
+
+        imported = {name for name, *_ in rows}
+        leaked = [m for m in forbidden if m in imported]
+        if leaked:
+            raise CommandError(f'Imported at startup, should be deferred: {", ".join(leaked)}')
+        if total_ms > options['budget_ms']:
+            raise CommandError(f'Startup import time {total_ms:.1f} ms exceeds budget {options["budget_ms"]:.0f} ms')
+
+        self.stdout.write(self.style.SUCCESS('Startup within budget.'))
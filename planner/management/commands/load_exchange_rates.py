@@ -0,0 +1,61 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from planner.analytics import mark_cost_index_stale
+from planner.currency import rates_changed
+from planner.jobs import enqueue
+from planner.models import BASE_CURRENCY, Activity, ExchangeRate
+
+
+def read_rates(path: str) -> list[ExchangeRate]:
+    rates = []
+    with open(path, newline='', encoding='utf-8') as fh:
+        for line, row in enumerate(csv.DictReader(fh), start=2):
+            try:
+                day = parse_date(row['date'].strip())
+                currency = row['currency'].strip().upper()
+                rate = Decimal(row['rate'].strip())
+            except (KeyError, AttributeError, ValueError, InvalidOperation):
+                raise CommandError(f'{path}:{line}: expected date,currency,rate')
+            if day is None or len(currency) != 3 or rate <= 0:
+                raise CommandError(f'{path}:{line}: bad value in {row}')
+            if currency != BASE_CURRENCY:
+                rates.append(ExchangeRate(currency=currency, date=day, rate=rate))
+    return rates
+
+
+class Command(BaseCommand):
+    help = f'Load dated exchange rates (CSV: date,currency,rate = value of 1 unit in {BASE_CURRENCY})'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--replace', action='store_true', help='Delete all stored rates first.')
+
+    def handle(self, *args, **options):
+        rates = read_rates(options['path'])
+        with transaction.atomic():
+            if options['replace']:
+                ExchangeRate.objects.all().delete()
+            ExchangeRate.objects.bulk_create(
+                rates,
+                update_conflicts=True,
+                unique_fields=['currency', 'date'],
+                update_fields=['rate', 'updated_at'],
+                batch_size=2000,
+            )
+            transaction.on_commit(rates_changed)
+
+        # Stored totals in the base currency were computed with the old rates.
+        owner_ids = sorted(
+            set(Activity.objects.exclude(currency=BASE_CURRENCY).values_list('trip__owner_id', flat=True))
+        )
+        if owner_ids:
+            enqueue('rollups.backfill', {'owner_ids': owner_ids})
+        mark_cost_index_stale()
+        self.stdout.write(
+            self.style.SUCCESS(f'Loaded {len(rates)} rates; spending rollups queued for {len(owner_ids)} users.')
+        )
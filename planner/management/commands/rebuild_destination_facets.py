@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from planner.facets import rebuild_destination_facets
+
+
+class Command(BaseCommand):
+    help = 'Recount public/private trips per destination for the trip_list filter'
+
+    def handle(self, *args, **options):
+        rows = rebuild_destination_facets()
+        self.stdout.write(self.style.SUCCESS(f'Destination facets rebuilt: {rows} rows.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from planner.packing import rebuild_packing_cooccurrence
+
+
+class Command(BaseCommand):
+    help = 'Recompute the packing item co-occurrence matrix used for suggestions'
+
+    def handle(self, *args, **options):
+        pairs = rebuild_packing_cooccurrence()
+        self.stdout.write(self.style.SUCCESS(f'Packing co-occurrence rebuilt: {pairs} pairs.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from planner.analytics import refresh_cost_index, stale_cost_index_destinations
+
+
+class Command(BaseCommand):
+    help = 'Recompute typical daily spend per destination from public trips'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every destination, not only stale ones.')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            count = refresh_cost_index()
+        else:
+            count = refresh_cost_index(stale_cost_index_destinations())
+        self.stdout.write(self.style.SUCCESS(f'Cost index refreshed for {count} destinations.'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from planner.archive import restore_trips
+from planner.models import ArchivedTrip
+
+
+class Command(BaseCommand):
+    help = 'Bring archived trips back into the regular tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('trip_ids', nargs='*', type=int, help='Original ids of the trips to restore.')
+        parser.add_argument('--owner', type=int, help='Restore every archived trip of this user id.')
+
+    def handle(self, *args, **options):
+        archived = ArchivedTrip.objects.all()
+        if options['trip_ids']:
+            archived = archived.filter(trip_id__in=options['trip_ids'])
+        elif options['owner'] is not None:
+            archived = archived.filter(owner_id=options['owner'])
+        else:
+            raise CommandError('Pass trip ids or --owner.')
+        count = restore_trips(archived)
+        self.stdout.write(self.style.SUCCESS(f'Restored {count} trips.'))
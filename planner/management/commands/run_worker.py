@@ -0,0 +1,45 @@
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+
+from planner.jobs import claim_job, prune_jobs, requeue_stale, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs; several workers can run side by side'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty.')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when there is nothing to do.')
+        parser.add_argument('--job', action='append', dest='names', default=[], help='Only run jobs with this name (repeatable).')
+
+    def handle(self, *args, **options):
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        pruned = prune_jobs(settings.PLANNER_JOBS_KEEP_DAYS)
+        self.stdout.write(f'Worker {worker} started, pruned {pruned} finished jobs.')
+        done = failed = 0
+        try:
+            requeue_stale(settings.PLANNER_JOBS_LOCK_TIMEOUT)
+            while True:
+                try:
+                    claimed = claim_job(worker, options['names'])
+                except OperationalError:
+                    # SQLite reports "database is locked" while another worker writes.
+                    claimed = None
+                if claimed is None:
+                    if options['burst']:
+                        break
+                    requeue_stale(settings.PLANNER_JOBS_LOCK_TIMEOUT)
+                    time.sleep(options['sleep'])
+                    continue
+                if run_job(claimed):
+                    done += 1
+                else:
+                    failed += 1
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Jobs done: {done}, failed: {failed}.'))
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.7 on 2026-10-19 08:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_counts(apps, schema_editor):
+    Trip = apps.get_model('planner', 'Trip')
+    DestinationTripCount = apps.get_model('planner', 'DestinationTripCount')
+
+    rows = [
+        DestinationTripCount(destination_id=r['destination_id'], owner_id=None, trips_count=r['n'])
+        for r in Trip.objects.filter(is_public=True).values('destination_id').annotate(n=models.Count('id'))
+    ]
+    rows += [
+        DestinationTripCount(destination_id=r['destination_id'], owner_id=r['owner_id'], trips_count=r['n'])
+        for r in Trip.objects.filter(is_public=False)
+        .values('destination_id', 'owner_id')
+        .annotate(n=models.Count('id'))
+    ]
+    DestinationTripCount.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DestinationTripCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trips_count', models.PositiveIntegerField(default=0)),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trip_counts', to='planner.destination')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='destination_trip_counts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='destinationtripcount',
+            constraint=models.UniqueConstraint(condition=models.Q(('owner__isnull', True)), fields=('destination',), name='uniq_destination_public_count'),
+        ),
+        migrations.AddConstraint(
+            model_name='destinationtripcount',
+            constraint=models.UniqueConstraint(condition=models.Q(('owner__isnull', False)), fields=('destination', 'owner'), name='uniq_destination_owner_count'),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
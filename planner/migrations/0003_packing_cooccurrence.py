@@ -0,0 +1,46 @@
+# Generated by Django 5.0.7 on 2026-10-19 08:30
+
+from collections import Counter
+from itertools import product
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_cooccurrence(apps, schema_editor):
+    TripPackingItem = apps.get_model('planner', 'TripPackingItem')
+    PackingCooccurrence = apps.get_model('planner', 'PackingCooccurrence')
+
+    items_by_trip = {}
+    for trip_id, item_id in TripPackingItem.objects.values_list('trip_id', 'item_id'):
+        items_by_trip.setdefault(trip_id, []).append(item_id)
+    counts = Counter()
+    for items in items_by_trip.values():
+        counts.update(product(items, items))
+    PackingCooccurrence.objects.bulk_create(
+        [PackingCooccurrence(item_id=a, other_id=b, trips_count=n) for (a, b), n in counts.items()],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0002_destination_trip_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackingCooccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trips_count', models.PositiveIntegerField(default=0)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cooccurrences', to='planner.packingitem')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='planner.packingitem')),
+            ],
+            options={
+                'unique_together': {('item', 'other')},
+            },
+        ),
+        migrations.RunPython(backfill_cooccurrence, migrations.RunPython.noop),
+    ]
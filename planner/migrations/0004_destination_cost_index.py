@@ -0,0 +1,27 @@
+# Generated by Django 5.0.7 on 2026-10-19 08:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0003_packing_cooccurrence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DestinationCostIndex',
+            fields=[
+                ('destination', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='cost_index', serialize=False, to='planner.destination')),
+                ('trips_count', models.PositiveIntegerField(default=0)),
+                ('daily_p25', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('daily_median', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('daily_p75', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('tag_mix', models.JSONField(blank=True, default=dict)),
+                ('is_stale', models.BooleanField(db_index=True, default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.0.7 on 2026-10-19 08:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_changes(apps, schema_editor):
+    SyncChange = apps.get_model('planner', 'SyncChange')
+    sources = [
+        ('trip', apps.get_model('planner', 'Trip'), 'owner_id'),
+        ('tag', apps.get_model('planner', 'Tag'), 'owner_id'),
+        ('packing_item', apps.get_model('planner', 'PackingItem'), 'owner_id'),
+        ('activity', apps.get_model('planner', 'Activity'), 'trip__owner_id'),
+        ('packing_link', apps.get_model('planner', 'TripPackingItem'), 'trip__owner_id'),
+    ]
+    for kind, model, owner_field in sources:
+        SyncChange.objects.bulk_create(
+            [
+                SyncChange(kind=kind, object_id=pk, owner_id=owner_id, updated_at=updated_at)
+                for pk, owner_id, updated_at in model.objects.values_list('id', owner_field, 'updated_at')
+            ],
+            batch_size=2000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0005_spending_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='packingitem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='trippackingitem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('trip', 'Поездка'), ('activity', 'Активность'), ('tag', 'Тег'), ('packing_item', 'Вещь'), ('packing_link', 'Вещь в поездке')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('updated_at', models.DateTimeField()),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'updated_at', 'id'], name='planner_syn_owner_i_8e35af_idx')],
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(backfill_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.7 on 2026-10-19 08:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0008_trip_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['date', 'title'], name='planner_act_date_59db05_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['created_at'], name='planner_tri_created_6ba717_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['is_public', 'created_at'], name='planner_tri_is_publ_ae1e87_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-19 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0010_calendar_feeds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=5, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=5, max_digits=8, null=True),
+        ),
+    ]
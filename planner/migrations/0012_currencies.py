@@ -0,0 +1,39 @@
+# Generated by Django 5.0.7 on 2026-10-19 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0011_activity_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3)),
+                ('date', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=8, max_digits=18)),
+            ],
+            options={
+                'ordering': ['currency', 'date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='currency',
+            field=models.CharField(choices=[('USD', 'USD — доллар США'), ('EUR', 'EUR — евро'), ('RUB', 'RUB — российский рубль'), ('GBP', 'GBP — фунт стерлингов'), ('CNY', 'CNY — юань'), ('JPY', 'JPY — иена'), ('TRY', 'TRY — турецкая лира'), ('GEL', 'GEL — грузинский лари'), ('AMD', 'AMD — армянский драм'), ('KZT', 'KZT — тенге'), ('AED', 'AED — дирхам ОАЭ'), ('THB', 'THB — бат')], default='USD', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='currency',
+            field=models.CharField(choices=[('USD', 'USD — доллар США'), ('EUR', 'EUR — евро'), ('RUB', 'RUB — российский рубль'), ('GBP', 'GBP — фунт стерлингов'), ('CNY', 'CNY — юань'), ('JPY', 'JPY — иена'), ('TRY', 'TRY — турецкая лира'), ('GEL', 'GEL — грузинский лари'), ('AMD', 'AMD — армянский драм'), ('KZT', 'KZT — тенге'), ('AED', 'AED — дирхам ОАЭ'), ('THB', 'THB — бат')], default='USD', max_length=3),
+        ),
+        migrations.AddConstraint(
+            model_name='exchangerate',
+            constraint=models.UniqueConstraint(fields=('currency', 'date'), name='uniq_exchange_rate'),
+        ),
+    ]
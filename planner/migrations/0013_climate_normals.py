@@ -0,0 +1,33 @@
+# Generated by Django 5.0.7 on 2026-10-19 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0012_currencies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClimateNormal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('longitude', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('month', models.PositiveSmallIntegerField()),
+                ('day', models.PositiveSmallIntegerField()),
+                ('temperature_max', models.FloatField(null=True)),
+                ('temperature_min', models.FloatField(null=True)),
+                ('precipitation', models.FloatField(default=0)),
+                ('wet_days_pct', models.FloatField(default=0)),
+                ('years', models.PositiveSmallIntegerField(default=0)),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='climatenormal',
+            constraint=models.UniqueConstraint(fields=('latitude', 'longitude', 'month', 'day'), name='uniq_climate_normal'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.7 on 2026-10-19 09:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0013_climate_normals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['owner', 'start_date', 'end_date'], name='planner_tri_owner_i_a9b2bb_idx'),
+        ),
+    ]
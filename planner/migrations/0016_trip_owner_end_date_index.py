@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-19 09:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0015_exchange_rate_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='trip',
+            name='planner_tri_owner_i_a9b2bb_idx',
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['owner', 'end_date', 'start_date'], name='planner_tri_owner_i_5ccae0_idx'),
+        ),
+    ]
@@ -1,6 +1,24 @@
 from django.conf import settings
 from django.db import models
 
+# Amounts are stored in the currency of their row; ExchangeRate rates and the
+# dashboard totals are expressed in BASE_CURRENCY.
+BASE_CURRENCY = 'USD'
+CURRENCY_CHOICES = [
+    ('USD', 'USD — доллар США'),
+    ('EUR', 'EUR — евро'),
+    ('RUB', 'RUB — российский рубль'),
+    ('GBP', 'GBP — фунт стерлингов'),
+    ('CNY', 'CNY — юань'),
+    ('JPY', 'JPY — иена'),
+    ('TRY', 'TRY — турецкая лира'),
+    ('GEL', 'GEL — грузинский лари'),
+    ('AMD', 'AMD — армянский драм'),
+    ('KZT', 'KZT — тенге'),
+    ('AED', 'AED — дирхам ОАЭ'),
+    ('THB', 'THB — бат'),
+]
+
 
 class Destination(models.Model):
     name = models.CharField(max_length=120)
@@ -22,11 +40,18 @@ class Trip(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     budget = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default=BASE_CURRENCY)
     is_public = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['is_public', 'created_at']),
+            models.Index(fields=['owner', 'end_date', 'start_date']),
+        ]
 
     def __str__(self):
         return self.title
@@ -35,6 +60,7 @@ class Trip(models.Model):
 class Tag(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='tags')
     name = models.CharField(max_length=40)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = [('owner', 'name')]
@@ -49,11 +75,16 @@ class Activity(models.Model):
     title = models.CharField(max_length=160)
     date = models.DateField()
     cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default=BASE_CURRENCY)
     notes = models.TextField(blank=True)
     tags = models.ManyToManyField(Tag, blank=True, related_name='activities')
+    latitude = models.DecimalField(max_digits=8, decimal_places=5, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=8, decimal_places=5, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['date', 'title']
+        indexes = [models.Index(fields=['date', 'title'])]
 
     def __str__(self):
         return self.title
@@ -63,6 +94,7 @@ class PackingItem(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='packing_items')
     name = models.CharField(max_length=120)
     category = models.CharField(max_length=80, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = [('owner', 'name')]
@@ -78,6 +110,7 @@ class TripPackingItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     is_packed = models.BooleanField(default=False)
     note = models.CharField(max_length=200, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = [('trip', 'item')]
@@ -85,3 +118,265 @@ class TripPackingItem(models.Model):
 
     def __str__(self):
         return f"{self.trip}: {self.item}"
+
+
+# Facet counts for the trip_list destination filter: public trips when owner
+# is empty, otherwise the private trips of that owner. Kept up to date by
+# planner.signals.
+class DestinationTripCount(models.Model):
+    destination = models.ForeignKey(Destination, on_delete=models.CASCADE, related_name='trip_counts')
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='destination_trip_counts',
+    )
+    trips_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['destination'],
+                condition=models.Q(owner__isnull=True),
+                name='uniq_destination_public_count',
+            ),
+            models.UniqueConstraint(
+                fields=['destination', 'owner'],
+                condition=models.Q(owner__isnull=False),
+                name='uniq_destination_owner_count',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.destination}: {self.trips_count}"
+
+
+# Sparse item x item matrix: in how many trips both items were packed. The
+# diagonal (item == other) holds how many trips the item was packed for.
+class PackingCooccurrence(models.Model):
+    item = models.ForeignKey(PackingItem, on_delete=models.CASCADE, related_name='cooccurrences')
+    other = models.ForeignKey(PackingItem, on_delete=models.CASCADE, related_name='+')
+    trips_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [('item', 'other')]
+
+    def __str__(self):
+        return f"{self.item} + {self.other}: {self.trips_count}"
+
+
+# Typical spending for a destination across all public trips, refreshed by
+# `python manage.py refresh_cost_index` (stale rows are flagged by signals).
+class DestinationCostIndex(models.Model):
+    destination = models.OneToOneField(
+        Destination, on_delete=models.CASCADE, primary_key=True, related_name='cost_index'
+    )
+    trips_count = models.PositiveIntegerField(default=0)
+    daily_p25 = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    daily_median = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    daily_p75 = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    tag_mix = models.JSONField(default=dict, blank=True)
+    is_stale = models.BooleanField(default=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.destination}: {self.daily_median}/день"
+
+
+# Value of one unit of `currency` in BASE_CURRENCY on `date`; a rate applies
+# until the next dated row. Loaded with `python manage.py load_exchange_rates`.
+class ExchangeRate(models.Model):
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=18, decimal_places=8)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['currency', 'date']
+        constraints = [models.UniqueConstraint(fields=['currency', 'date'], name='uniq_exchange_rate')]
+
+    def __str__(self):
+        return f"{self.currency} {self.date}: {self.rate}"
+
+
+# Long-term daily means for one cell of the climate grid (see
+# planner.climate.climate_cell), computed from the Open-Meteo archive.
+# Climatology does not change, so rows are fetched once and kept.
+class ClimateNormal(models.Model):
+    latitude = models.DecimalField(max_digits=6, decimal_places=2)
+    longitude = models.DecimalField(max_digits=6, decimal_places=2)
+    month = models.PositiveSmallIntegerField()
+    day = models.PositiveSmallIntegerField()
+    temperature_max = models.FloatField(null=True)
+    temperature_min = models.FloatField(null=True)
+    precipitation = models.FloatField(default=0)
+    wet_days_pct = models.FloatField(default=0)
+    years = models.PositiveSmallIntegerField(default=0)
+    fetched_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['latitude', 'longitude', 'month', 'day'], name='uniq_climate_normal')
+        ]
+
+    def __str__(self):
+        return f"{self.latitude}, {self.longitude} {self.day:02d}.{self.month:02d}"
+
+
+# Spending per owner and calendar period; tag is empty for the row that covers
+# all activities of the period. Maintained by planner.rollups.
+class SpendingRollup(models.Model):
+    PERIOD_MONTH = 'month'
+    PERIOD_WEEK = 'week'
+    PERIOD_CHOICES = [(PERIOD_MONTH, 'Месяц'), (PERIOD_WEEK, 'Неделя')]
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='spending_rollups')
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, null=True, blank=True, related_name='spending_rollups')
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    activities_count = models.PositiveIntegerField(default=0)
+    # Contribution of archived trips; kept across recomputations of the period.
+    archived_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    archived_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['period_start']
+        indexes = [models.Index(fields=['owner', 'period', 'tag', 'period_start'])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['owner', 'period', 'period_start'],
+                condition=models.Q(tag__isnull=True),
+                name='uniq_rollup_all_tags',
+            ),
+            models.UniqueConstraint(
+                fields=['owner', 'period', 'period_start', 'tag'],
+                condition=models.Q(tag__isnull=False),
+                name='uniq_rollup_tag',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.owner} {self.period} {self.period_start}: {self.total}"
+
+
+# Change log for offline clients: one row per synced object, moved forward on
+# every save. Rows with is_deleted are tombstones of deleted objects.
+class SyncChange(models.Model):
+    KIND_CHOICES = [
+        ('trip', 'Поездка'),
+        ('activity', 'Активность'),
+        ('tag', 'Тег'),
+        ('packing_item', 'Вещь'),
+        ('packing_link', 'Вещь в поездке'),
+    ]
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sync_changes')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    updated_at = models.DateTimeField()
+    is_deleted = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = [('kind', 'object_id')]
+        indexes = [models.Index(fields=['owner', 'updated_at', 'id'])]
+
+    def __str__(self):
+        return f"{self.kind}#{self.object_id} @ {self.updated_at}"
+
+
+# Background job queue used by `run_worker`; see planner.jobs.
+class Job(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Готово'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    dedupe_key = models.CharField(max_length=200, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_at'])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedupe_key'],
+                condition=models.Q(status='queued') & ~models.Q(dedupe_key=''),
+                name='uniq_queued_job_dedupe_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name}#{self.pk} ({self.status})"
+
+
+# Trip moved out of the hot tables by planner.archive: `data` is the
+# zlib-compressed JSON of the trip, its activities and packing links.
+class ArchivedTrip(models.Model):
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_trips')
+    trip_id = models.BigIntegerField(unique=True)
+    title = models.CharField(max_length=160)
+    destination = models.ForeignKey(Destination, on_delete=models.PROTECT, related_name='archived_trips')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    activities_count = models.PositiveIntegerField(default=0)
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-start_date']
+        indexes = [models.Index(fields=['owner', 'start_date'])]
+
+    def __str__(self):
+        return self.title
+
+
+# What the archived trips of an owner add to the dashboard totals.
+class ArchiveSummary(models.Model):
+    owner = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='archive_summary'
+    )
+    trips_total = models.PositiveIntegerField(default=0)
+    public_total = models.PositiveIntegerField(default=0)
+    total_budget = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    activities_total = models.PositiveIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # {destination_id: [trips, budget]} and {tag name or "": [total, uses]}
+    destinations = models.JSONField(default=dict, blank=True)
+    tags = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return f"{self.owner}: {self.trips_total} в архиве"
+
+
+# Secret-token iCalendar subscription: all trips of the owner, or one trip.
+class CalendarFeed(models.Model):
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='calendar_feeds')
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, null=True, blank=True, related_name='calendar_feeds')
+    token = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner'], condition=models.Q(trip__isnull=True), name='uniq_owner_feed'),
+            models.UniqueConstraint(fields=['owner', 'trip'], name='uniq_trip_feed'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner}: {self.trip or 'все поездки'}"
@@ -0,0 +1,118 @@
+from collections import Counter
+from itertools import product
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import PackingCooccurrence, PackingItem, Trip, TripPackingItem
+
+
+def _apply_pairs(pairs: set[tuple[int, int]], delta: int) -> None:
+    if not pairs:
+        return
+    items = {a for a, _ in pairs} | {b for _, b in pairs}
+    existing = {
+        (item_id, other_id): pk
+        for pk, item_id, other_id in PackingCooccurrence.objects.filter(
+            item_id__in=items, other_id__in=items
+        ).values_list('id', 'item_id', 'other_id')
+        if (item_id, other_id) in pairs
+    }
+    if existing:
+        PackingCooccurrence.objects.filter(pk__in=existing.values()).update(
+            trips_count=F('trips_count') + delta
+        )
+    if delta > 0:
+        PackingCooccurrence.objects.bulk_create(
+            [
+                PackingCooccurrence(item_id=a, other_id=b, trips_count=delta)
+                for a, b in pairs - existing.keys()
+            ],
+            ignore_conflicts=True,
+        )
+    elif existing:
+        PackingCooccurrence.objects.filter(pk__in=existing.values(), trips_count__lte=0).delete()
+
+
+def _trip_items(trip_id: int) -> set[int]:
+    return set(TripPackingItem.objects.filter(trip_id=trip_id).values_list('item_id', flat=True))
+
+
+def _link_pairs(trip_id: int, item_id: int) -> set[tuple[int, int]]:
+    others = _trip_items(trip_id) - {item_id}
+    pairs = {(item_id, item_id)}
+    pairs |= {(item_id, o) for o in others} | {(o, item_id) for o in others}
+    return pairs
+
+
+def record_link_added(trip_id: int, item_id: int) -> None:
+    _apply_pairs(_link_pairs(trip_id, item_id), 1)
+
+
+def record_link_removed(trip_id: int, item_id: int) -> None:
+    # Called before the link row is deleted; _link_pairs excludes it anyway.
+    _apply_pairs(_link_pairs(trip_id, item_id), -1)
+
+
+def record_trip_packing(trip_id: int, delta: int = 1) -> None:
+    items = _trip_items(trip_id)
+    _apply_pairs(set(product(items, items)), delta)
+
+
+def rebuild_packing_cooccurrence() -> int:
+    counts = Counter()
+    items_by_trip = {}
+    for trip_id, item_id in TripPackingItem.objects.values_list('trip_id', 'item_id').iterator(
+        chunk_size=5000
+    ):
+        items_by_trip.setdefault(trip_id, []).append(item_id)
+    for items in items_by_trip.values():
+        counts.update(product(items, items))
+
+    with transaction.atomic():
+        PackingCooccurrence.objects.all().delete()
+        PackingCooccurrence.objects.bulk_create(
+            [PackingCooccurrence(item_id=a, other_id=b, trips_count=n) for (a, b), n in counts.items()],
+            batch_size=2000,
+        )
+    return len(counts)
+
+
+def suggest_packing_items(trip: Trip, limit: int = 8, include_public: bool = False) -> list[PackingItem]:
+    current = _trip_items(trip.pk)
+    rows = PackingCooccurrence.objects.filter(item__owner_id=trip.owner_id)
+    if current:
+        # score(candidate) = sum of co-occurrence with every item already in the trip
+        rows = rows.filter(item_id__in=current).exclude(other_id__in=current)
+    else:
+        rows = rows.filter(item_id=F('other_id'))
+    scores = dict(
+        rows.values('other_id')
+        .annotate(score=Sum('trips_count'))
+        .order_by('-score', 'other_id')
+        .values_list('other_id', 'score')[:limit]
+    )
+
+    if include_public:
+        popular = (
+            TripPackingItem.objects.filter(trip__destination_id=trip.destination_id, trip__is_public=True)
+            .exclude(trip__owner_id=trip.owner_id)
+            .values('item__name')
+            .annotate(n=Count('trip_id'))
+            .order_by('-n')[:50]
+        )
+        by_name = {row['item__name'].casefold(): row['n'] for row in popular}
+        if by_name:
+            own = PackingItem.objects.filter(owner_id=trip.owner_id).exclude(pk__in=current)
+            for pk, name in own.values_list('id', 'name'):
+                if name.casefold() in by_name:
+                    scores[pk] = scores.get(pk, 0) + by_name[name.casefold()]
+
+    ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+    items = PackingItem.objects.in_bulk([pk for pk, _ in ranked])
+    suggestions = []
+    for pk, score in ranked:
+        if pk in items:
+            items[pk].score = score
+            suggestions.append(items[pk])
+    return suggestions
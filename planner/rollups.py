@@ -0,0 +1,201 @@
+import threading
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .currency import grouped_totals
+from .models import Activity, SpendingRollup
+
+_local = threading.local()
+
+
+def period_start(period: str, day: date) -> date:
+    if period == SpendingRollup.PERIOD_MONTH:
+        return day.replace(day=1)
+    return day - timedelta(days=day.weekday())
+
+
+def period_end(period: str, start: date) -> date:
+    if period == SpendingRollup.PERIOD_MONTH:
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=7)
+
+
+def schedule_rollup_refresh(owner_id: int, dates) -> None:
+    """Recompute the periods touched by `dates` once the transaction commits."""
+    if owner_id is None:
+        return
+    pending = _local.__dict__.setdefault('buckets', set())
+    for day in dates:
+        for period in (SpendingRollup.PERIOD_MONTH, SpendingRollup.PERIOD_WEEK):
+            pending.add((owner_id, period, period_start(period, day)))
+    transaction.on_commit(_flush)
+
+
+def _flush() -> None:
+    buckets = _local.__dict__.pop('buckets', None)
+    if buckets:
+        refresh_buckets(buckets)
+
+
+def _bucket_rows(owner_id: int, period: str, start: date) -> list[SpendingRollup]:
+    activities = Activity.objects.filter(
+        trip__owner_id=owner_id, date__gte=start, date__lt=period_end(period, start)
+    )
+    rows = []
+    # Totals are in BASE_CURRENCY so that trips in different currencies add up.
+    overall = grouped_totals(activities, 'cost').get(())
+    if overall:
+        rows.append(
+            SpendingRollup(
+                owner_id=owner_id,
+                period=period,
+                period_start=start,
+                total=overall[0],
+                activities_count=overall[1],
+            )
+        )
+        for (tag_id,), (total, count) in grouped_totals(
+            activities.filter(tags__isnull=False), 'cost', keys=('tags',)
+        ).items():
+            rows.append(
+                SpendingRollup(
+                    owner_id=owner_id,
+                    period=period,
+                    period_start=start,
+                    tag_id=tag_id,
+                    total=total,
+                    activities_count=count,
+                )
+            )
+    return rows
+
+
+def _archived_parts(rollups) -> dict:
+    return {
+        (row.owner_id, row.period, row.period_start, row.tag_id): row
+        for row in rollups.filter(archived_count__gt=0).only(
+            'owner_id', 'period', 'period_start', 'tag_id', 'archived_total', 'archived_count'
+        )
+    }
+
+
+def _with_archived(rows: list[SpendingRollup], archived: dict) -> list[SpendingRollup]:
+    # Recomputed rows only cover live activities; carry over what archived
+    # trips contributed, including periods that have no live activity left.
+    archived = dict(archived)
+    for row in rows:
+        part = archived.pop((row.owner_id, row.period, row.period_start, row.tag_id), None)
+        if part is not None:
+            row.archived_total = part.archived_total
+            row.archived_count = part.archived_count
+    for (owner_id, period, start, tag_id), part in archived.items():
+        rows.append(
+            SpendingRollup(
+                owner_id=owner_id,
+                period=period,
+                period_start=start,
+                tag_id=tag_id,
+                archived_total=part.archived_total,
+                archived_count=part.archived_count,
+            )
+        )
+    return rows
+
+
+def refresh_buckets(buckets) -> None:
+    with transaction.atomic():
+        for owner_id, period, start in sorted(buckets):
+            bucket = SpendingRollup.objects.filter(owner_id=owner_id, period=period, period_start=start)
+            archived = _archived_parts(bucket)
+            bucket.delete()
+            SpendingRollup.objects.bulk_create(_with_archived(_bucket_rows(owner_id, period, start), archived))
+
+
+def add_archived_spending(owner_id: int, activities, sign: int = 1) -> None:
+    """Move (date, cost in BASE_CURRENCY, tag_ids) of archived activities in or out of the archived columns."""
+    parts = {}
+    for day, cost, tag_ids in activities:
+        for period in (SpendingRollup.PERIOD_MONTH, SpendingRollup.PERIOD_WEEK):
+            start = period_start(period, day)
+            for tag_id in [None, *tag_ids]:
+                total, count = parts.get((period, start, tag_id), (0, 0))
+                parts[(period, start, tag_id)] = (total + cost, count + 1)
+
+    with transaction.atomic():
+        for (period, start, tag_id), (total, count) in parts.items():
+            updated = SpendingRollup.objects.filter(
+                owner_id=owner_id, period=period, period_start=start, tag_id=tag_id
+            ).update(
+                archived_total=F('archived_total') + sign * total,
+                archived_count=F('archived_count') + sign * count,
+            )
+            if not updated and sign > 0:
+                SpendingRollup.objects.create(
+                    owner_id=owner_id,
+                    period=period,
+                    period_start=start,
+                    tag_id=tag_id,
+                    archived_total=total,
+                    archived_count=count,
+                )
+        SpendingRollup.objects.filter(owner_id=owner_id, activities_count=0, archived_count=0).delete()
+
+
+def backfill_rollups(owner_ids: list[int] | None = None) -> int:
+    activities = Activity.objects.all()
+    rollups = SpendingRollup.objects.all()
+    if owner_ids is not None:
+        activities = activities.filter(trip__owner_id__in=owner_ids)
+        rollups = rollups.filter(owner_id__in=owner_ids)
+
+    rows = []
+    for period, trunc in (
+        (SpendingRollup.PERIOD_MONTH, TruncMonth('date')),
+        (SpendingRollup.PERIOD_WEEK, TruncWeek('date')),
+    ):
+        grouped = activities.annotate(bucket=trunc)
+        for (owner, bucket), (total, count) in grouped_totals(
+            grouped, 'cost', keys=('trip__owner_id', 'bucket')
+        ).items():
+            rows.append(
+                SpendingRollup(
+                    owner_id=owner,
+                    period=period,
+                    period_start=bucket,
+                    total=total,
+                    activities_count=count,
+                )
+            )
+        for (owner, bucket, tag_id), (total, count) in grouped_totals(
+            grouped.filter(tags__isnull=False), 'cost', keys=('trip__owner_id', 'bucket', 'tags')
+        ).items():
+            rows.append(
+                SpendingRollup(
+                    owner_id=owner,
+                    period=period,
+                    period_start=bucket,
+                    tag_id=tag_id,
+                    total=total,
+                    activities_count=count,
+                )
+            )
+
+    with transaction.atomic():
+        archived = _archived_parts(rollups)
+        rollups.delete()
+        SpendingRollup.objects.bulk_create(_with_archived(rows, archived), batch_size=2000)
+    return len(rows)
+
+
+def spending_series(owner_id: int, period: str, tag_id: int | None = None) -> dict:
+    rows = SpendingRollup.objects.filter(owner_id=owner_id, period=period, tag_id=tag_id).order_by(
+        'period_start'
+    )
+    labels, totals = [], []
+    for start, total, archived_total in rows.values_list('period_start', 'total', 'archived_total'):
+        labels.append(start.strftime('%Y-%m') if period == SpendingRollup.PERIOD_MONTH else start.isoformat())
+        totals.append(float(total + archived_total))
+    return {'period': period, 'tag': tag_id, 'labels': labels, 'totals': totals}
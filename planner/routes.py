@@ -0,0 +1,147 @@
+import hashlib
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from .models import Trip
+
+EARTH_RADIUS_KM = 6371.0
+WALKING_SPEED_KMH = 4.5
+TWO_OPT_MAX_PASSES = 50
+ROUTE_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def haversine_matrix(points):
+    """Pairwise great-circle distances in km for a list of (lat, lon)."""
+    import numpy as np
+
+    coords = np.radians(np.asarray(points, dtype=np.float64))
+    lat = coords[:, 0][:, None]
+    lon = coords[:, 1][:, None]
+    dlat = lat - lat.T
+    dlon = lon - lon.T
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat) * np.cos(lat.T) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _nearest_neighbour(dist):
+    import numpy as np
+
+    n = len(dist)
+    order = [0]
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, dist[order[-1]])
+        nxt = int(np.argmin(row))
+        order.append(nxt)
+        visited[nxt] = True
+    return np.array(order)
+
+
+def _two_opt(order, dist):
+    # Open path with a fixed start: reversing order[i..j] replaces edges
+    # (i-1, i) and (j, j+1) with (i-1, j) and (i, j+1); there is no edge after
+    # the last stop. All j for a given i are scored at once.
+    import numpy as np
+
+    n = len(order)
+    for _ in range(TWO_OPT_MAX_PASSES):
+        improved = False
+        for i in range(1, n - 1):
+            prev, first = order[i - 1], order[i]
+            js = np.arange(i + 1, n)
+            ends = order[js]
+            delta = dist[prev, ends] - dist[prev, first]
+            after = order[js[:-1] + 1]
+            delta[:-1] += dist[first, after] - dist[ends[:-1], after]
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                j = js[best]
+                order[i:j + 1] = order[i:j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return order
+
+
+def order_stops(dist) -> list[int]:
+    """Visiting order for a distance matrix; point 0 is the fixed start."""
+    if len(dist) <= 2:
+        return list(range(len(dist)))
+    return [int(i) for i in _two_opt(_nearest_neighbour(dist), dist)]
+
+
+def _route_key(start, stops) -> str:
+    state = repr((start, [(s['id'], s['latitude'], s['longitude']) for s in stops]))
+    return 'route:' + hashlib.sha1(state.encode()).hexdigest()
+
+
+def _plan(start, stops: list[dict]) -> dict:
+    # Keyed on the day's located stops themselves, so only edits that move,
+    # add or remove a stop on this day cause a recomputation.
+    key = _route_key(start, stops)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    offset = 1 if start else 0
+    points = ([start] if start else []) + [(s['latitude'], s['longitude']) for s in stops]
+    order, legs = [], []
+    if points:
+        dist = haversine_matrix(points)
+        order = order_stops(dist)
+        legs = [float(dist[a, b]) for a, b in zip(order, order[1:])]
+    if not start and stops:
+        legs.insert(0, 0.0)
+    total = sum(legs)
+    order = [i - offset for i in order if i >= offset]
+    plan = {
+        'order': [stops[i]['id'] for i in order],
+        'legs': legs,
+        'total_km': total,
+        'minutes': round(total / WALKING_SPEED_KMH * 60),
+    }
+    cache.set(key, plan, ROUTE_CACHE_TIMEOUT)
+    return plan
+
+
+def _start_point(trip: Trip):
+    destination = trip.destination
+    if destination.latitude is None or destination.longitude is None:
+        return None
+    return (float(destination.latitude), float(destination.longitude))
+
+
+def plan_trip_days(trip: Trip, day=None) -> list[dict]:
+    """Route per day for `trip` (or only `day`): ordered stops plus stops without coordinates."""
+    activities = trip.activities.order_by('date', 'pk')
+    if day is not None:
+        activities = activities.filter(date=day)
+    by_day = defaultdict(list)
+    for activity in activities:
+        by_day[activity.date].append(activity)
+
+    start = _start_point(trip)
+    days = []
+    for date, items in sorted(by_day.items()):
+        located = [a for a in items if a.latitude is not None and a.longitude is not None]
+        stops = [
+            {'id': a.pk, 'latitude': float(a.latitude), 'longitude': float(a.longitude)} for a in located
+        ]
+        plan = _plan(start, stops)
+        by_id = {a.pk: a for a in located}
+        days.append(
+            {
+                'date': date,
+                'stops': [
+                    {'activity': by_id[pk], 'leg_km': leg}
+                    for pk, leg in zip(plan['order'], plan['legs'])
+                ],
+                'total_km': plan['total_km'],
+                'minutes': plan['minutes'],
+                'unlocated': [a for a in items if a.latitude is None or a.longitude is None],
+            }
+        )
+    return days
+
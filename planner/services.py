@@ -2,7 +2,6 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 
-import requests
 from django.core.cache import cache
 
 
@@ -13,15 +12,36 @@ class WeatherResult:
     data: dict
 
 
-def get_forecast(latitude: float, longitude: float) -> WeatherResult:
+def _forecast_cache_key(latitude: float, longitude: float) -> str:
+    return f"wx:{latitude}:{longitude}"
+
+
+def get_forecast(latitude: float, longitude: float, destination_id: int | None = None) -> WeatherResult:
     if latitude is None or longitude is None:
         return WeatherResult(ok=False, summary='Нет координат у направления.', data={})
 
-    cache_key = f"wx:{latitude}:{longitude}"
+    cache_key = _forecast_cache_key(latitude, longitude)
     cached = cache.get(cache_key)
     if cached:
         return WeatherResult(ok=True, summary='Прогноз взят из кэша.', data=cached)
 
+    # The HTTP call runs in a worker; in eager mode it has already finished
+    # by the time enqueue returns.
+    from .jobs import enqueue
+
+    enqueue(
+        'weather.fetch',
+        {'latitude': latitude, 'longitude': longitude, 'destination_id': destination_id},
+        dedupe_key=cache_key,
+        max_attempts=3,
+    )
+    cached = cache.get(cache_key)
+    if cached:
+        return WeatherResult(ok=True, summary='Прогноз загружен с Open-Meteo.', data=cached)
+    return WeatherResult(ok=False, summary='Прогноз загружается, обновите страницу через минуту.', data={})
+
+
+def fetch_forecast(latitude: float, longitude: float) -> WeatherResult:
     url = 'https://api.open-meteo.com/v1/forecast'
     params = {
         'latitude': latitude,
@@ -30,6 +50,10 @@ def get_forecast(latitude: float, longitude: float) -> WeatherResult:
         'daily': 'temperature_2m_max,temperature_2m_min,precipitation_probability_max',
         'timezone': 'auto',
     }
+    # Imported lazily: requests is only needed on a cache miss and is one of
+    # the heaviest imports on a cold worker.
+    import requests
+
     try:
         resp = requests.get(url, params=params, timeout=10)
         resp.raise_for_status()
@@ -37,5 +61,5 @@ def get_forecast(latitude: float, longitude: float) -> WeatherResult:
     except Exception:
         return WeatherResult(ok=False, summary='Сервис погоды временно недоступен.', data={})
 
-    cache.set(cache_key, data, 60 * 20)
+    cache.set(_forecast_cache_key(latitude, longitude), data, 60 * 20)
     return WeatherResult(ok=True, summary='Прогноз загружен с Open-Meteo.', data=data)
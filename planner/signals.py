@@ -0,0 +1,228 @@
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .analytics import mark_cost_index_stale
+from .caching import bump_version, bump_versions, trip_owner_id
+from .currency import rates_changed
+from .facets import adjust_facet, facet_key
+from .packing import record_link_added, record_link_removed, record_trip_packing
+from .rollups import schedule_rollup_refresh
+from .sync import KINDS, record_changes
+from .models import Activity, Destination, ExchangeRate, PackingItem, Tag, Trip, TripPackingItem
+
+
+def _bump_trips(trip_ids) -> None:
+    bump_versions('trip', trip_ids)
+
+
+@receiver(pre_save, sender=Trip)
+def remember_trip_state(sender, instance, **kwargs):
+    instance._previous_state = None
+    if instance.pk:
+        instance._previous_state = (
+            Trip.objects.filter(pk=instance.pk)
+            .values('is_public', 'destination_id', 'owner_id')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Trip)
+def trip_saved(sender, instance, **kwargs):
+    bump_version('trip', instance.pk)
+    previous = getattr(instance, '_previous_state', None)
+    if instance.is_public or (previous and previous['is_public']):
+        bump_version('trip_list')
+
+    if instance.is_public or (previous and previous['is_public']):
+        stale = {instance.destination_id}
+        if previous:
+            stale.add(previous['destination_id'])
+        mark_cost_index_stale(destination_ids=stale)
+
+    new_key = facet_key(instance.destination_id, instance.owner_id, instance.is_public)
+    old_key = None
+    if previous:
+        old_key = facet_key(previous['destination_id'], previous['owner_id'], previous['is_public'])
+    if old_key != new_key:
+        if old_key:
+            adjust_facet(old_key, -1)
+        adjust_facet(new_key, 1)
+
+
+@receiver(post_delete, sender=Trip)
+def trip_deleted(sender, instance, **kwargs):
+    bump_version('trip', instance.pk)
+    if instance.is_public:
+        bump_version('trip_list')
+    adjust_facet(facet_key(instance.destination_id, instance.owner_id, instance.is_public), -1)
+    if instance.is_public:
+        mark_cost_index_stale(destination_ids=[instance.destination_id])
+
+
+@receiver(pre_delete, sender=Trip)
+def trip_children_deleted(sender, instance, **kwargs):
+    # Links and activities deleted together with their trip are accounted for
+    # here in one go (see packing_link_deleted and activity_changed).
+    record_trip_packing(instance.pk, -1)
+    schedule_rollup_refresh(
+        instance.owner_id,
+        instance.activities.order_by().values_list('date', flat=True).distinct(),
+    )
+
+
+@receiver(post_save, sender=TripPackingItem)
+def packing_link_saved(sender, instance, created, **kwargs):
+    if created:
+        record_link_added(instance.trip_id, instance.item_id)
+
+
+@receiver(pre_delete, sender=TripPackingItem)
+def packing_link_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, TripPackingItem):
+        record_link_removed(instance.trip_id, instance.item_id)
+
+
+@receiver(post_save, sender=Activity)
+@receiver(post_delete, sender=Activity)
+@receiver(post_save, sender=TripPackingItem)
+@receiver(post_delete, sender=TripPackingItem)
+def trip_child_changed(sender, instance, **kwargs):
+    bump_version('trip', instance.trip_id)
+
+
+@receiver(pre_save, sender=Activity)
+def remember_activity_date(sender, instance, **kwargs):
+    instance._previous_date = None
+    if instance.pk:
+        instance._previous_date = (
+            Activity.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Activity)
+@receiver(post_delete, sender=Activity)
+def activity_changed(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Trip):
+        return  # covered by trip_deleted / trip_children_deleted
+    mark_cost_index_stale(trip_ids=[instance.trip_id])
+    dates = {instance.date}
+    if getattr(instance, '_previous_date', None):
+        dates.add(instance._previous_date)
+    schedule_rollup_refresh(trip_owner_id(instance.trip_id), dates)
+
+
+@receiver(m2m_changed, sender=Activity.tags.through)
+def activity_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # post_clear gets no pk_set and the links are gone by then.
+        instance._cleared_activity_ids = list(instance.activities.values_list('id', flat=True))
+        return
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        trip_ids = [instance.trip_id]
+        schedule_rollup_refresh(trip_owner_id(instance.trip_id), [instance.date])
+    else:
+        if action == 'post_clear':
+            pk_set = instance.__dict__.pop('_cleared_activity_ids', [])
+        activities = Activity.objects.filter(pk__in=pk_set or [])
+        rows = list(activities.values_list('trip_id', 'date'))
+        trip_ids = {trip_id for trip_id, _ in rows}
+        schedule_rollup_refresh(instance.owner_id, {day for _, day in rows})
+    _bump_trips(trip_ids)
+    mark_cost_index_stale(trip_ids=trip_ids)
+    if not reverse:
+        record_changes('activity', trip_owner_id(instance.trip_id), [(instance.pk, timezone.now())])
+    elif rows:
+        record_changes(
+            'activity',
+            instance.owner_id,
+            [(pk, timezone.now()) for pk in activities.values_list('id', flat=True)],
+        )
+
+
+@receiver(post_save, sender=Destination)
+@receiver(post_delete, sender=Destination)
+def destination_changed(sender, instance, **kwargs):
+    _bump_trips(Trip.objects.filter(destination=instance).values_list('id', flat=True))
+    bump_version('trip_list')
+    bump_version('destinations')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    _bump_trips(Trip.objects.filter(activities__tags=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=PackingItem)
+@receiver(pre_delete, sender=PackingItem)
+def packing_item_changed(sender, instance, **kwargs):
+    _bump_trips(Trip.objects.filter(packing_links__item=instance).values_list('id', flat=True))
+
+
+# Single rows edited in the admin; load_exchange_rates refreshes the stamp itself.
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def exchange_rate_changed(sender, instance, **kwargs):
+    rates_changed()
+
+
+def _sync_owner_id(instance):
+    if hasattr(instance, 'owner_id'):
+        return instance.owner_id
+    return trip_owner_id(instance.trip_id)
+
+
+def _deleted_with_parent(sender, origin) -> bool:
+    if isinstance(origin, QuerySet):
+        return origin.model is not sender
+    return origin is not None and not isinstance(origin, sender)
+
+
+def sync_object_saved(sender, instance, **kwargs):
+    record_changes(KINDS[sender], _sync_owner_id(instance), [(instance.pk, instance.updated_at)])
+
+
+def sync_object_deleted(sender, instance, origin=None, **kwargs):
+    # Children removed with a parent get their tombstones in bulk from the
+    # pre_delete receivers below, or none at all when the whole account goes.
+    if _deleted_with_parent(sender, origin):
+        return
+    record_changes(KINDS[sender], _sync_owner_id(instance), [(instance.pk, timezone.now())], is_deleted=True)
+
+
+@receiver(pre_delete, sender=Trip)
+def sync_trip_children_deleted(sender, instance, origin=None, **kwargs):
+    if _deleted_with_parent(sender, origin):
+        return
+    now = timezone.now()
+    for kind, children in (('activity', instance.activities), ('packing_link', instance.packing_links)):
+        rows = [(pk, now) for pk in children.values_list('id', flat=True)]
+        record_changes(kind, instance.owner_id, rows, is_deleted=True)
+
+
+@receiver(pre_delete, sender=PackingItem)
+def sync_packing_item_deleted(sender, instance, origin=None, **kwargs):
+    if _deleted_with_parent(sender, origin):
+        return
+    now = timezone.now()
+    rows = [(pk, now) for pk in instance.trip_links.values_list('id', flat=True)]
+    record_changes('packing_link', instance.owner_id, rows, is_deleted=True)
+
+
+@receiver(pre_delete, sender=Tag)
+def sync_tag_deleted(sender, instance, origin=None, **kwargs):
+    # The tag's activities stay but lose it, so clients need them again.
+    if _deleted_with_parent(sender, origin):
+        return
+    now = timezone.now()
+    rows = [(pk, now) for pk in instance.activities.values_list('id', flat=True)]
+    record_changes('activity', instance.owner_id, rows)
+
+
+for _model in KINDS:
+    post_save.connect(sync_object_saved, sender=_model, dispatch_uid=f'sync_saved_{_model.__name__}')
+    post_delete.connect(sync_object_deleted, sender=_model, dispatch_uid=f'sync_deleted_{_model.__name__}')
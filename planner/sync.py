@@ -0,0 +1,220 @@
+import base64
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .forms import ActivityForm, PackingItemForm, TagForm, TripForm, TripPackingItemForm
+from .models import Activity, PackingItem, SyncChange, Tag, Trip, TripPackingItem
+
+SYNC_PAGE_SIZE = 500
+
+MODELS = {
+    'trip': Trip,
+    'activity': Activity,
+    'tag': Tag,
+    'packing_item': PackingItem,
+    'packing_link': TripPackingItem,
+}
+KINDS = {model: kind for kind, model in MODELS.items()}
+
+FIELDS = {
+    'trip': ['id', 'title', 'destination_id', 'start_date', 'end_date', 'budget', 'currency', 'is_public', 'updated_at'],
+    'activity': ['id', 'trip_id', 'title', 'date', 'cost', 'currency', 'notes', 'latitude', 'longitude', 'updated_at'],
+    'tag': ['id', 'name', 'updated_at'],
+    'packing_item': ['id', 'name', 'category', 'updated_at'],
+    'packing_link': ['id', 'trip_id', 'item_id', 'quantity', 'is_packed', 'note', 'updated_at'],
+}
+
+
+def record_changes(kind: str, owner_id: int, rows, is_deleted: bool = False) -> None:
+    """Upsert change-log rows; `rows` is an iterable of (object_id, updated_at)."""
+    if owner_id is None:
+        return
+    SyncChange.objects.bulk_create(
+        [
+            SyncChange(
+                owner_id=owner_id,
+                kind=kind,
+                object_id=object_id,
+                updated_at=updated_at or timezone.now(),
+                is_deleted=is_deleted,
+            )
+            for object_id, updated_at in rows
+        ],
+        update_conflicts=True,
+        unique_fields=['kind', 'object_id'],
+        update_fields=['owner', 'updated_at', 'is_deleted'],
+    )
+
+
+def encode_cursor(updated_at: datetime, change_id: int) -> str:
+    raw = f'{updated_at.isoformat()}|{change_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str | None):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        stamp, change_id = raw.rsplit('|', 1)
+        updated_at = parse_datetime(stamp)
+        if updated_at is None:
+            raise ValueError(cursor)
+        return updated_at, int(change_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError('Некорректный курсор синхронизации.') from exc
+
+
+def _serialize(kind: str, ids: list[int]) -> dict[int, dict]:
+    rows = {row['id']: row for row in MODELS[kind].objects.filter(pk__in=ids).values(*FIELDS[kind])}
+    if kind == 'activity' and rows:
+        for row in rows.values():
+            row['tags'] = []
+        links = Activity.tags.through.objects.filter(activity_id__in=rows.keys())
+        for activity_id, tag_id in links.values_list('activity_id', 'tag_id'):
+            rows[activity_id]['tags'].append(tag_id)
+    return rows
+
+
+def changes_since(user, cursor=None, limit: int = SYNC_PAGE_SIZE) -> dict:
+    log = SyncChange.objects.filter(owner=user)
+    if cursor:
+        updated_at, change_id = cursor
+        log = log.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=change_id))
+    entries = list(
+        log.order_by('updated_at', 'id').values_list('id', 'kind', 'object_id', 'updated_at', 'is_deleted')[
+            : limit + 1
+        ]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    changed = {kind: [] for kind in MODELS}
+    deleted = {kind: [] for kind in MODELS}
+    live_ids = {kind: [] for kind in MODELS}
+    for _, kind, object_id, _, is_deleted in entries:
+        if is_deleted:
+            deleted[kind].append(object_id)
+        else:
+            live_ids[kind].append(object_id)
+    for kind, ids in live_ids.items():
+        if not ids:
+            continue
+        rows = _serialize(kind, ids)
+        for object_id in ids:
+            if object_id in rows:
+                changed[kind].append(rows[object_id])
+            else:
+                # Removed together with its parent (e.g. activities of a deleted trip).
+                deleted[kind].append(object_id)
+
+    next_cursor = encode_cursor(entries[-1][3], entries[-1][0]) if entries else None
+    if next_cursor is None and cursor:
+        next_cursor = encode_cursor(*cursor)
+    return {'cursor': next_cursor, 'has_more': has_more, 'changes': changed, 'deleted': deleted}
+
+
+class SyncError(Exception):
+    def __init__(self, index: int, status: int, errors):
+        super().__init__(errors)
+        self.index = index
+        self.status = status
+        self.errors = errors
+
+
+def _owned(kind: str, user):
+    if kind in ('activity', 'packing_link'):
+        return MODELS[kind].objects.filter(trip__owner=user)
+    return MODELS[kind].objects.filter(owner=user)
+
+
+# Fields that may refer to objects created earlier in the same push by their
+# client_id; other values, such as titles and notes, are taken as they are.
+REFERENCE_FIELDS = ['trip', 'item', 'tags']
+
+
+def _resolve(value, ids: dict):
+    if isinstance(value, str) and value in ids:
+        return ids[value]
+    if isinstance(value, list):
+        return [_resolve(v, ids) for v in value]
+    return value
+
+
+def _apply_change(user, index: int, change: dict, ids: dict) -> None:
+    kind = change.get('kind')
+    if kind not in MODELS:
+        raise SyncError(index, 400, {'kind': ['Неизвестный тип объекта.']})
+    data = {
+        key: _resolve(value, ids) if key in REFERENCE_FIELDS else value
+        for key, value in (change.get('data') or {}).items()
+    }
+
+    instance = None
+    if change.get('id') is not None:
+        instance = _owned(kind, user).filter(pk=change['id']).first()
+        if instance is None:
+            raise SyncError(index, 404, {'id': ['Объект не найден.']})
+        base = parse_datetime(str(change.get('base_updated_at') or ''))
+        if base and instance.updated_at > base:
+            raise SyncError(index, 409, {'id': ['Объект изменён на сервере после последней синхронизации.']})
+
+    if change.get('op') == 'delete':
+        if instance is None:
+            raise SyncError(index, 400, {'id': ['Для удаления нужен id.']})
+        instance.delete()
+        return
+
+    trip = None
+    if kind in ('activity', 'packing_link'):
+        trip_id = data.get('trip') or (instance.trip_id if instance else None)
+        trip = Trip.objects.filter(pk=trip_id, owner=user).first() if trip_id else None
+        if trip is None:
+            raise SyncError(index, 400, {'trip': ['Поездка не найдена.']})
+
+    if kind == 'trip':
+        # Unlike the web form, which rejects overlapping dates until the
+        # override is ticked, pushes accept them by default: one rejected
+        # change would fail the whole offline batch. Clients that want the
+        # check send allow_overlap=false.
+        data.setdefault('allow_overlap', True)
+        form = TripForm(data, instance=instance, owner=user)
+    elif kind == 'activity':
+        form = ActivityForm(data, instance=instance, trip=trip, owner=user)
+    elif kind == 'tag':
+        form = TagForm(data, instance=instance)
+    elif kind == 'packing_item':
+        form = PackingItemForm(data, instance=instance)
+    else:
+        form = TripPackingItemForm(data, instance=instance, owner=user)
+    if not form.is_valid():
+        raise SyncError(index, 400, form.errors)
+
+    obj = form.save(commit=False)
+    if trip is not None:
+        obj.trip = trip
+    elif instance is None:
+        obj.owner = user
+    try:
+        with transaction.atomic():
+            obj.save()
+            form.save_m2m()
+    except IntegrityError:
+        raise SyncError(index, 409, {'__all__': ['Такой объект уже существует.']})
+    if change.get('client_id'):
+        ids[change['client_id']] = obj.pk
+
+
+def apply_push(user, changes: list[dict]) -> dict:
+    """Apply a batch of offline edits atomically; returns client_id -> id."""
+    ids = {}
+    with transaction.atomic():
+        for index, change in enumerate(changes):
+            if not isinstance(change, dict):
+                raise SyncError(index, 400, {'change': ['Ожидается объект.']})
+            _apply_change(user, index, change, ids)
+    return ids
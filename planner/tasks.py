@@ -0,0 +1,48 @@
+from .analytics import refresh_cost_index, stale_cost_index_destinations
+from .archive import archive_trips_by_id, restore_trips
+from .caching import bump_versions
+from .jobs import job
+from .models import ArchivedTrip, Trip
+from .rollups import backfill_rollups
+from .climate import fetch_climate_normals
+from .services import fetch_forecast
+
+
+@job('weather.fetch')
+def fetch_weather(latitude, longitude, destination_id=None):
+    result = fetch_forecast(latitude, longitude)
+    if not result.ok:
+        raise RuntimeError(result.summary)
+    if destination_id is not None:
+        # Cached pages of these trips still say the forecast is loading.
+        bump_versions('trip', Trip.objects.filter(destination_id=destination_id).values_list('id', flat=True))
+
+
+@job('climate.fetch')
+def fetch_climate(latitude, longitude, destination_id=None):
+    result = fetch_climate_normals(latitude, longitude)
+    if not result.ok:
+        raise RuntimeError(result.summary)
+    if destination_id is not None:
+        bump_versions('trip', Trip.objects.filter(destination_id=destination_id).values_list('id', flat=True))
+
+
+@job('cost_index.refresh')
+def refresh_stale_cost_index():
+    refresh_cost_index(stale_cost_index_destinations())
+
+
+@job('rollups.backfill')
+def backfill_owner_rollups(owner_ids):
+    # One grouped pass over all the owners rather than one per owner.
+    backfill_rollups(owner_ids)
+
+
+@job('archive.trips')
+def archive_selected_trips(trip_ids):
+    archive_trips_by_id(trip_ids)
+
+
+@job('archive.restore')
+def restore_selected_trips(archived_ids):
+    restore_trips(ArchivedTrip.objects.filter(pk__in=archived_ids))
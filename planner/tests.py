@@ -1,3 +1,1008 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .analytics import compute_cost_index, spend_projection
+from .archive import archive_batch, archive_trip, restore_trip
+from .autocomplete import get_destination_index
+from .caching import trip_detail_page_key, trip_version
+from .climate import climate_normals, get_climate, outside_forecast
+from .currency import convert_amount, grouped_totals
+from .cloning import clone_trip
+from .facets import destination_facets_for_user
+from .forms import TripCloneForm, TripForm
+from .ical import get_feed
+from .jobs import claim_job, enqueue, job, prune_jobs, run_job
+from .models import (
+    Activity,
+    ArchivedTrip,
+    ArchiveSummary,
+    Destination,
+    DestinationTripCount,
+    ExchangeRate,
+    Job,
+    PackingCooccurrence,
+    PackingItem,
+    SpendingRollup,
+    Tag,
+    Trip,
+    TripPackingItem,
+)
+from .packing import rebuild_packing_cooccurrence, suggest_packing_items
+from .rollups import backfill_rollups, spending_series
+from .routes import _two_opt, haversine_matrix, order_stops
+from .timeline import build_timeline, overlapping_trips
+
+# Tests run with DEBUG off and no collectstatic, so pages are rendered
+# without the manifest.
+PLAIN_STATIC = {**settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+
+
+def make_trip(owner, **kwargs):
+    destination = Destination.objects.get_or_create(name='Тбилиси', country='Грузия')[0]
+    fields = {
+        'title': 'Грузия',
+        'destination': destination,
+        'start_date': date(2030, 5, 1),
+        'end_date': date(2030, 5, 7),
+        'budget': Decimal('1000'),
+    }
+    fields.update(kwargs)
+    return Trip.objects.create(owner=owner, **fields)
+
+
+class StartupImportTests(SimpleTestCase):
+    def test_url_conf_leaves_heavy_modules_unimported(self):
+        # A fresh interpreter, so modules imported by other tests do not count.
+        env = os.environ.copy()
+        env['DJANGO_SETTINGS_MODULE'] = 'config.settings'
+        env.pop('DJANGO_WSGI_WARMUP', None)
+        code = (
+            'import sys, django; django.setup(); import config.urls; '
+            f'print(",".join(m for m in {list(settings.STARTUP_FORBIDDEN_IMPORTS)!r} if m in sys.modules))'
+        )
+        proc = subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+        )
+        self.assertEqual(proc.returncode, 0, proc.stderr[-2000:])
+        self.assertEqual(proc.stdout.strip(), '')
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class ActivityGridTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('grid', password='pass12345')
+        self.client.force_login(self.user)
+        self.trip = make_trip(self.user)
+        self.tag = Tag.objects.create(owner=self.user, name='еда')
+        self.first = Activity.objects.create(trip=self.trip, title='Музей', date=date(2030, 5, 2), cost=10)
+        self.second = Activity.objects.create(trip=self.trip, title='Ужин', date=date(2030, 5, 3), cost=30)
+        self.second.tags.add(self.tag)
+        self.url = reverse('activity_bulk_edit', args=[self.trip.pk])
+
+    def row(self, index, activity, **changes):
+        values = {
+            'id': activity.pk,
+            'title': activity.title,
+            'date': activity.date.isoformat(),
+            'cost': str(activity.cost),
+            'currency': activity.currency,
+            'notes': activity.notes,
+        }
+        values.update(changes)
+        data = {f'form-{index}-{key}': value for key, value in values.items() if key != 'tags'}
+        data[f'form-{index}-tags'] = changes.get('tags', [tag.pk for tag in activity.tags.all()])
+        return data
+
+    def post(self, rows, total=None):
+        data = {
+            'form-TOTAL_FORMS': str(total if total is not None else len(rows)),
+            'form-INITIAL_FORMS': '2',
+            'form-MIN_NUM_FORMS': '0',
+            'form-MAX_NUM_FORMS': '1000',
+        }
+        for row in rows:
+            data.update(row)
+        return self.client.post(self.url, data)
+
+    def test_saves_changed_rows_and_tags(self):
+        response = self.post(
+            [
+                self.row(0, self.first, cost='15.50', tags=[self.tag.pk]),
+                self.row(1, self.second, tags=[]),
+            ]
+        )
+        self.assertRedirects(response, reverse('trip_detail', args=[self.trip.pk]), fetch_redirect_response=False)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.cost, Decimal('15.50'))
+        self.assertEqual(list(self.first.tags.all()), [self.tag])
+        self.assertFalse(self.second.tags.exists())
+
+    def test_extra_rows_are_ignored(self):
+        extra = {
+            'form-2-id': '',
+            'form-2-title': 'Новая',
+            'form-2-date': '2030-05-04',
+            'form-2-cost': '5',
+            'form-2-currency': 'USD',
+            'form-2-notes': '',
+        }
+        response = self.post([self.row(0, self.first, title='Галерея'), self.row(1, self.second), extra], total=3)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.trip.activities.count(), 2)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.title, 'Галерея')
+
+    def test_invalid_row_is_not_saved(self):
+        response = self.post([self.row(0, self.first, date='2030-06-01'), self.row(1, self.second, title='Обед')])
+        self.assertEqual(response.status_code, 200)
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.title, 'Ужин')
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('sync', password='pass12345')
+        self.client.force_login(self.user)
+        self.destination = Destination.objects.create(name='Ереван', country='Армения')
+
+    def push(self, *changes):
+        return self.client.post(reverse('sync_push'), json.dumps({'changes': changes}), content_type='application/json')
+
+    def pull(self, cursor=None, limit=None):
+        params = {key: value for key, value in (('cursor', cursor), ('limit', limit)) if value}
+        response = self.client.get(reverse('sync_pull'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def trip_data(self, **changes):
+        data = {
+            'title': 'Армения',
+            'destination': self.destination.pk,
+            'start_date': '2030-06-01',
+            'end_date': '2030-06-05',
+            'budget': '500',
+        }
+        data.update(changes)
+        return data
+
+    def push_trip_with_children(self) -> dict:
+        response = self.push(
+            {'kind': 'trip', 'client_id': 't', 'data': self.trip_data()},
+            {'kind': 'tag', 'client_id': 'g', 'data': {'name': 'музеи'}},
+            {
+                'kind': 'activity',
+                'client_id': 'a',
+                'data': {'trip': 't', 'title': 'Матенадаран', 'date': '2030-06-02', 'cost': '20', 'tags': ['g']},
+            },
+            {'kind': 'packing_item', 'client_id': 'p', 'data': {'name': 'Зонт', 'category': 'other'}},
+            {'kind': 'packing_link', 'client_id': 'l', 'data': {'trip': 't', 'item': 'p', 'quantity': 1}},
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['ids']
+
+    def test_push_then_pull(self):
+        ids = self.push_trip_with_children()
+        page = self.pull()
+        self.assertFalse(page['has_more'])
+        self.assertEqual([row['id'] for row in page['changes']['trip']], [ids['t']])
+        self.assertEqual(page['changes']['activity'][0]['tags'], [ids['g']])
+        self.assertEqual([row['id'] for row in page['changes']['packing_link']], [ids['l']])
+
+        again = self.pull(page['cursor'])
+        self.assertEqual(again['cursor'], page['cursor'])
+        self.assertFalse(any(again['changes'].values()) or any(again['deleted'].values()))
+
+    def test_pull_pages_through_all_changes(self):
+        self.push(*({'kind': 'tag', 'data': {'name': f'тег {n}'}} for n in range(5)))
+        seen = []
+        cursor = None
+        while True:
+            page = self.pull(cursor, limit=2)
+            seen.extend(row['id'] for row in page['changes']['tag'])
+            cursor = page['cursor']
+            if not page['has_more']:
+                break
+        self.assertEqual(sorted(seen), sorted(Tag.objects.filter(owner=self.user).values_list('id', flat=True)))
+        self.assertEqual(len(seen), 5)
+
+    def test_trip_delete_leaves_tombstones_for_children(self):
+        ids = self.push_trip_with_children()
+        cursor = self.pull()['cursor']
+        self.assertEqual(self.push({'op': 'delete', 'kind': 'trip', 'id': ids['t']}).status_code, 200)
+
+        deleted = self.pull(cursor)['deleted']
+        self.assertEqual(deleted['trip'], [ids['t']])
+        self.assertEqual(deleted['activity'], [ids['a']])
+        self.assertEqual(deleted['packing_link'], [ids['l']])
+
+    def test_tag_delete_resends_its_activities(self):
+        ids = self.push_trip_with_children()
+        cursor = self.pull()['cursor']
+        self.push({'op': 'delete', 'kind': 'tag', 'id': ids['g']})
+
+        page = self.pull(cursor)
+        self.assertEqual(page['deleted']['tag'], [ids['g']])
+        self.assertEqual([(row['id'], row['tags']) for row in page['changes']['activity']], [(ids['a'], [])])
+
+    def test_clearing_a_tag_resends_its_activities(self):
+        ids = self.push_trip_with_children()
+        cursor = self.pull()['cursor']
+        before = trip_version(ids['t'])
+        Tag.objects.get(pk=ids['g']).activities.clear()
+
+        page = self.pull(cursor)
+        self.assertEqual([(row['id'], row['tags']) for row in page['changes']['activity']], [(ids['a'], [])])
+        self.assertNotEqual(trip_version(ids['t']), before)
+
+    def test_only_reference_fields_resolve_client_ids(self):
+        response = self.push(
+            {'kind': 'trip', 'client_id': 't', 'data': self.trip_data()},
+            {
+                'kind': 'activity',
+                'client_id': 'a',
+                'data': {'trip': 't', 'title': 't', 'date': '2030-06-03', 'cost': '0', 'notes': 'a'},
+            },
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        activity = Activity.objects.get(pk=response.json()['ids']['a'])
+        self.assertEqual((activity.trip_id, activity.title, activity.notes), (response.json()['ids']['t'], 't', 'a'))
+
+    def test_packing_item_delete_leaves_tombstones_for_links(self):
+        ids = self.push_trip_with_children()
+        cursor = self.pull()['cursor']
+        PackingItem.objects.get(pk=ids['p']).delete()
+        self.assertEqual(self.pull(cursor)['deleted']['packing_link'], [ids['l']])
+
+    def test_stale_edit_is_rejected_and_batch_rolled_back(self):
+        ids = self.push_trip_with_children()
+        trip = Trip.objects.get(pk=ids['t'])
+        response = self.push(
+            {'kind': 'tag', 'data': {'name': 'новый'}},
+            {'kind': 'trip', 'id': trip.pk, 'base_updated_at': '2000-01-01T00:00:00Z', 'data': self.trip_data(title='X')},
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['index'], 1)
+        self.assertFalse(Tag.objects.filter(name='новый').exists())
+
+    def test_overlapping_trip_is_accepted_unless_client_asks_for_the_check(self):
+        self.push_trip_with_children()
+        overlapping = self.trip_data(title='Снова Армения', start_date='2030-06-04', end_date='2030-06-08')
+        self.assertEqual(self.push({'kind': 'trip', 'data': overlapping}).status_code, 200)
+
+        checked = self.push({'kind': 'trip', 'data': dict(overlapping, allow_overlap=False)})
+        self.assertEqual(checked.status_code, 400)
+        self.assertEqual(Trip.objects.filter(owner=self.user).count(), 2)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('archive', password='pass12345')
+        ExchangeRate.objects.create(currency='EUR', date=date(2020, 1, 1), rate=Decimal('1.1'))
+        self.tag = Tag.objects.create(owner=self.user, name='музеи')
+        self.item = PackingItem.objects.create(owner=self.user, name='Паспорт')
+
+    def make_full_trip(self, **kwargs):
+        trip = make_trip(self.user, currency='EUR', **kwargs)
+        museum = Activity.objects.create(trip=trip, title='Музей', date=trip.start_date, cost=12, currency='EUR')
+        museum.tags.add(self.tag)
+        Activity.objects.create(trip=trip, title='Такси', date=trip.end_date, cost=Decimal('7.35'))
+        TripPackingItem.objects.create(trip=trip, item=self.item, quantity=2, note='копия')
+        return trip
+
+    def summary(self) -> dict:
+        return ArchiveSummary.objects.filter(owner=self.user).values(
+            'trips_total', 'public_total', 'total_budget', 'activities_total', 'total_spent', 'destinations', 'tags'
+        ).first()
+
+    def snapshot(self, trip_id) -> dict:
+        trip = Trip.objects.get(pk=trip_id)
+        return {
+            # created_at is left out: the JSON archive keeps it to the millisecond.
+            'trip': Trip.objects.filter(pk=trip_id).values(
+                'title', 'destination_id', 'start_date', 'end_date', 'budget', 'currency', 'is_public'
+            ).get(),
+            'activities': [
+                (a.pk, a.title, a.date, a.cost, a.currency, [t.pk for t in a.tags.all()])
+                for a in trip.activities.order_by('pk')
+            ],
+            'packing': list(trip.packing_links.values_list('pk', 'item_id', 'quantity', 'is_packed', 'note')),
+        }
+
+    def test_archive_then_restore_round_trip(self):
+        archive_trip(self.make_full_trip(title='Старая', start_date=date(2021, 3, 1), end_date=date(2021, 3, 4)))
+        before = self.summary()
+
+        trip = self.make_full_trip()
+        original = self.snapshot(trip.pk)
+        archived = archive_trip(trip)
+        self.assertFalse(Trip.objects.filter(pk=archived.trip_id).exists())
+        archived_summary = self.summary()
+        self.assertEqual(archived_summary['trips_total'], before['trips_total'] + 1)
+        self.assertEqual(archived_summary['activities_total'], before['activities_total'] + 2)
+        self.assertEqual(archived_summary['total_spent'], before['total_spent'] + Decimal('13.20') + Decimal('7.35'))
+
+        restored = restore_trip(archived)
+        self.assertEqual(self.snapshot(restored.pk), original)
+        self.assertFalse(ArchivedTrip.objects.filter(trip_id=restored.pk).exists())
+        self.assertEqual(self.summary(), before)
+
+    def test_admin_jobs_archive_and_restore_in_batches(self):
+        other = User.objects.create_user('archive2', password='pass12345')
+        trips = [self.make_full_trip(title=f'Поездка {n}') for n in range(3)] + [make_trip(other, title='Чужая')]
+        snapshots = {trip.pk: self.snapshot(trip.pk) for trip in trips}
+
+        enqueue('archive.trips', {'trip_ids': [trip.pk for trip in trips]})
+        self.assertTrue(run_job(claim_job('w')))
+        self.assertFalse(Trip.objects.filter(pk__in=snapshots).exists())
+        self.assertEqual(self.summary()['trips_total'], 3)
+        self.assertEqual(self.summary()['activities_total'], 6)
+        self.assertEqual(ArchiveSummary.objects.get(owner=other).trips_total, 1)
+
+        self.client.force_login(User.objects.create_superuser('admin', password='pass12345'))
+        self.client.post(
+            reverse('admin:planner_archivedtrip_changelist'),
+            {'action': 'restore_action', '_selected_action': list(ArchivedTrip.objects.values_list('pk', flat=True))},
+        )
+        # The admin only queues the restore; the worker does it.
+        self.assertEqual(ArchivedTrip.objects.count(), 4)
+        queued = claim_job('w')
+        self.assertEqual(queued.name, 'archive.restore')
+        self.assertTrue(run_job(queued))
+
+        self.assertFalse(ArchivedTrip.objects.exists())
+        self.assertEqual({pk: self.snapshot(pk) for pk in snapshots}, snapshots)
+        self.assertEqual(self.summary()['trips_total'], 0)
+        self.assertEqual(self.summary()['tags'], {})
+
+    def test_archive_bookkeeping_does_not_grow_with_batch_size(self):
+        # Delete signals still run per trip; the archive rows and the summary
+        # are written once per batch.
+        def archive_queries(count):
+            trips = [self.make_full_trip() for _ in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                archive_batch(trips)
+            return len([q for q in queries if 'planner_archive' in q['sql']])
+
+        archive_trip(self.make_full_trip())  # creates the summary row
+        self.assertEqual(archive_queries(1), archive_queries(4))
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('pages', password='pass12345')
+        self.trip = make_trip(self.user, title='Кутаиси')
+        self.url = reverse('trip_detail', args=[self.trip.pk])
+
+    def test_anonymous_detail_is_served_from_cache(self):
+        self.assertContains(self.client.get(self.url), 'Кутаиси')
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(self.url), 'Кутаиси')
+
+    def test_trip_edit_invalidates_detail_and_list(self):
+        self.client.get(self.url)
+        self.client.get(reverse('trip_list'))
+        self.trip.title = 'Батуми'
+        self.trip.save()
+        self.assertContains(self.client.get(self.url), 'Батуми')
+        self.assertContains(self.client.get(reverse('trip_list')), 'Батуми')
+
+    def test_activity_change_invalidates_detail(self):
+        self.client.get(self.url)
+        activity = Activity.objects.create(trip=self.trip, title='Пещера Прометея', date=self.trip.start_date, cost=15)
+        self.assertContains(self.client.get(self.url), 'Пещера Прометея')
+        activity.delete()
+        self.assertNotContains(self.client.get(self.url), 'Пещера Прометея')
+
+    def test_new_exchange_rate_changes_detail_key(self):
+        request = self.client.get(self.url).wsgi_request
+        before = trip_detail_page_key(request, self.trip.pk)
+        ExchangeRate.objects.create(currency='EUR', date=date(2030, 1, 1), rate=Decimal('1.08'))
+        self.assertNotEqual(trip_detail_page_key(request, self.trip.pk), before)
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.client.get(self.url)
+        # update() sends no signals, so the anonymous page stays stale.
+        Trip.objects.filter(pk=self.trip.pk).update(title='Гелати')
+        self.assertContains(self.client.get(self.url), 'Кутаиси')
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(self.url), 'Гелати')
+
+
+class CalendarFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ical', password='pass12345')
+        self.trip = make_trip(self.user)
+        self.activity = Activity.objects.create(trip=self.trip, title='Канатная дорога', date=date(2030, 5, 2), cost=3)
+        self.url = reverse('calendar_feed', args=[get_feed(self.user).token])
+
+    def fetch(self, etag=''):
+        response = self.client.get(self.url, headers={'If-None-Match': etag} if etag else {})
+        body = b''.join(response.streaming_content).decode() if response.status_code == 200 else ''
+        return response, body
+
+    def test_unchanged_feed_is_not_modified(self):
+        response, body = self.fetch()
+        self.assertIn('SUMMARY:Канатная дорога', body)
+        again, _ = self.fetch(response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_activity_edit_changes_etag_and_block(self):
+        response, _ = self.fetch()
+        self.activity.title = 'Фуникулёр'
+        self.activity.save()
+        changed, body = self.fetch(response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        self.assertIn('SUMMARY:Фуникулёр', body)
+        self.assertNotIn('Канатная дорога', body)
+
+    def test_deleted_trip_leaves_the_feed(self):
+        self.fetch()
+        self.trip.delete()
+        _, body = self.fetch()
+        self.assertNotIn('VEVENT', body)
+
+
+calls = []
+
+
+@job('test.record')
+def record_call(value=None):
+    calls.append(value)
+
+
+@job('test.fail')
+def always_fail():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_dedupe_key_reuses_the_queued_job(self):
+        first = enqueue('test.record', {'value': 1}, dedupe_key='same')
+        second = enqueue('test.record', {'value': 2}, dedupe_key='same')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.filter(dedupe_key='same').count(), 1)
+
+    def test_claim_takes_due_jobs_once(self):
+        due = enqueue('test.record', {'value': 1})
+        enqueue('test.record', {'value': 2}, delay=60)
+        claimed = claim_job('w1')
+        self.assertEqual(claimed.pk, due.pk)
+        self.assertEqual((claimed.status, claimed.attempts, claimed.locked_by), (Job.STATUS_RUNNING, 1, 'w1'))
+        self.assertIsNone(claim_job('w2'))
+
+        self.assertTrue(run_job(claimed))
+        self.assertEqual(calls, [1])
+        self.assertEqual(Job.objects.get(pk=due.pk).status, Job.STATUS_DONE)
+
+    def test_failed_job_is_retried_with_backoff_then_given_up(self):
+        failing = enqueue('test.fail', max_attempts=2)
+        self.assertFalse(run_job(claim_job('w')))
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, Job.STATUS_QUEUED)
+        self.assertGreater(failing.run_at, timezone.now())
+        self.assertIn('boom', failing.last_error)
+        self.assertIsNone(claim_job('w'))
+
+        Job.objects.filter(pk=failing.pk).update(run_at=timezone.now())
+        self.assertFalse(run_job(claim_job('w')))
+        self.assertEqual(Job.objects.get(pk=failing.pk).status, Job.STATUS_FAILED)
+
+    @override_settings(PLANNER_JOBS_EAGER=True)
+    def test_eager_mode_runs_only_the_enqueued_job(self):
+        other = enqueue('test.record', {'value': 'other'}, eager=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('test.record', {'value': 'mine'})
+            enqueue('test.record', {'value': 'later'}, delay=60)
+        self.assertEqual(calls, ['mine'])
+        self.assertEqual(Job.objects.get(pk=other.pk).status, Job.STATUS_QUEUED)
+
+    def test_jobs_are_not_run_inline_by_default(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('test.record', {'value': 1})
+        self.assertEqual(calls, [])
+
+    def test_prune_removes_old_finished_jobs(self):
+        old = timezone.now() - timedelta(days=30)
+        for status in (Job.STATUS_DONE, Job.STATUS_FAILED):
+            Job.objects.create(name='test.record', status=status, run_at=old, finished_at=old)
+        recent = Job.objects.create(name='test.record', status=Job.STATUS_DONE, run_at=old, finished_at=timezone.now())
+        self.assertEqual(prune_jobs(7), 2)
+        self.assertEqual(list(Job.objects.values_list('pk', flat=True)), [recent.pk])
+
+
+class ClimateTests(TestCase):
+    def test_outside_forecast_window(self):
+        today = date(2030, 5, 1)
+        self.assertFalse(outside_forecast(date(2030, 5, 3), date(2030, 5, 10), today))
+        self.assertTrue(outside_forecast(date(2030, 5, 8), date(2030, 5, 10), today))
+        self.assertTrue(outside_forecast(date(2030, 4, 1), date(2030, 4, 30), today))
+
+    def test_normals_average_each_calendar_day(self):
+        normals = climate_normals(
+            {
+                'time': ['2020-07-01', '2021-07-01', '2020-07-02', '2021-07-02'],
+                'temperature_2m_max': [30, 32, 28, None],
+                'temperature_2m_min': [20, 22, 18, 19],
+                'precipitation_sum': [0, 5, 2, None],
+            }
+        )
+        self.assertEqual(normals[(7, 1)]['temperature_max'], 31.0)
+        self.assertEqual(normals[(7, 1)]['wet_days_pct'], 50.0)
+        self.assertEqual(normals[(7, 2)]['temperature_max'], 28.0)
+        self.assertEqual(normals[(7, 2)]['years'], 1)
+
+    @override_settings(PLANNER_JOBS_EAGER=True)
+    def test_missing_normals_are_left_to_the_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = get_climate(41.7, 44.8, date(2031, 7, 1), date(2031, 7, 3))
+        self.assertFalse(result.ok)
+        self.assertEqual(Job.objects.get(name='climate.fetch').status, Job.STATUS_QUEUED)
+
+
+class DestinationAutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_search_by_name_or_country_prefix(self):
+        tbilisi = Destination.objects.create(name='Тбилиси', country='Грузия')
+        Destination.objects.create(name='Батуми', country='Грузия')
+        index = get_destination_index()
+        self.assertEqual(index.search('тби'), [{'id': tbilisi.pk, 'label': 'Тбилиси, Грузия'}])
+        self.assertEqual(len(index.search('груз')), 2)
+        self.assertEqual(index.label(tbilisi.pk), 'Тбилиси, Грузия')
+
+    def test_index_is_reused_until_a_destination_changes(self):
+        destination = Destination.objects.create(name='Ереван', country='Армения')
+        get_destination_index()
+        with self.assertNumQueries(0):
+            get_destination_index().search('ере')
+        destination.name = 'Гюмри'
+        destination.save()
+        self.assertEqual(get_destination_index().search('гюм')[0]['id'], destination.pk)
+
+    def test_trip_form_destination_enabled_once_destinations_exist(self):
+        user = User.objects.create_user('form', password='pass12345')
+        self.assertTrue(TripForm(owner=user).fields['destination'].disabled)
+        Destination.objects.create(name='Ереван')
+        self.assertFalse(TripForm(owner=user).fields['destination'].disabled)
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class TripOverlapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('overlap', password='pass12345')
+        self.trip = make_trip(self.user, title='Май', start_date=date(2030, 5, 1), end_date=date(2030, 5, 7))
+
+    def form(self, instance=None, **changes):
+        data = {
+            'title': 'Новая',
+            'destination': self.trip.destination_id,
+            'start_date': '2030-05-05',
+            'end_date': '2030-05-10',
+            'budget': '100',
+            'currency': 'USD',
+        }
+        data.update(changes)
+        return TripForm(data, instance=instance, owner=self.user)
+
+    def test_overlapping_trips_range(self):
+        make_trip(self.user, title='Июнь', start_date=date(2030, 6, 1), end_date=date(2030, 6, 3))
+        make_trip(User.objects.create_user('other'), start_date=date(2030, 5, 2), end_date=date(2030, 5, 3))
+        found = overlapping_trips(self.user.pk, date(2030, 5, 7), date(2030, 6, 1))
+        self.assertEqual([t.title for t in found], ['Май', 'Июнь'])
+        self.assertFalse(overlapping_trips(self.user.pk, date(2030, 5, 8), date(2030, 5, 31)).exists())
+
+    def test_overlap_is_rejected_unless_allowed(self):
+        form = self.form()
+        self.assertFalse(form.is_valid())
+        self.assertIn('Май', form.non_field_errors()[0])
+        self.assertTrue(self.form(allow_overlap='on').is_valid())
+        self.assertTrue(self.form(start_date='2030-05-08').is_valid())
+
+    def test_editing_other_fields_of_an_overlapping_trip_is_allowed(self):
+        other = make_trip(self.user, title='Внутри', start_date=date(2030, 5, 3), end_date=date(2030, 5, 4))
+        form = self.form(instance=other, title='Внутри', start_date='2030-05-03', end_date='2030-05-04', budget='5')
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_clone_defaults_to_the_day_after_and_checks_overlaps(self):
+        self.client.force_login(self.user)
+        url = reverse('trip_clone', args=[self.trip.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.context['form'].initial['start_date'], date(2030, 5, 8))
+
+        form = TripCloneForm({'title': 'Копия', 'start_date': '2030-05-04'}, trip=self.trip)
+        self.assertFalse(form.is_valid())
+        allowed = TripCloneForm({'title': 'Копия', 'start_date': '2030-05-04', 'allow_overlap': 'on'}, trip=self.trip)
+        self.assertTrue(allowed.is_valid())
+
+        self.client.post(url, {'title': 'Копия', 'start_date': '2030-05-04'})
+        self.assertFalse(Trip.objects.filter(title='Копия').exists())
+
+    def test_timeline_marks_overlaps_and_gaps(self):
+        inside = make_trip(self.user, title='Внутри', start_date=date(2030, 5, 3), end_date=date(2030, 5, 4))
+        make_trip(self.user, title='Потом', start_date=date(2030, 5, 11), end_date=date(2030, 5, 12))
+        entries = build_timeline(self.user)
+        self.assertEqual([e['kind'] for e in entries], ['trip', 'trip', 'gap', 'trip'])
+        self.assertEqual(entries[0]['overlaps'], [inside])
+        self.assertEqual(entries[1]['overlaps'], [self.trip])
+        gap = entries[2]
+        self.assertEqual((gap['start'], gap['end'], gap['days']), (date(2030, 5, 8), date(2030, 5, 10), 3))
+        self.assertEqual([e['trip'].title for e in build_timeline(self.user, since=date(2030, 5, 10))], ['Потом'])
+
+
+class DestinationFacetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('facets', password='pass12345')
+        self.other = User.objects.create_user('facets2', password='pass12345')
+
+    def counts(self, user):
+        return {d.name: d.trips_count for d in destination_facets_for_user(user)}
+
+    def test_counts_follow_create_delete_and_visibility(self):
+        mine = make_trip(self.user, is_public=False)
+        make_trip(self.user)
+        make_trip(self.other, is_public=False)
+        self.assertEqual(self.counts(self.user), {'Тбилиси': 2})
+        self.assertEqual(self.counts(self.other), {'Тбилиси': 2})
+        self.assertEqual(self.counts(AnonymousUser()), {'Тбилиси': 1})
+
+        mine.is_public = True
+        mine.save()
+        self.assertEqual(self.counts(AnonymousUser()), {'Тбилиси': 2})
+        mine.delete()
+        self.assertEqual(self.counts(self.user), {'Тбилиси': 1})
+
+    def test_drifted_count_does_not_go_negative(self):
+        trip = make_trip(self.user, is_public=False)
+        DestinationTripCount.objects.update(trips_count=0)
+        trip.delete()
+        self.assertEqual(DestinationTripCount.objects.get().trips_count, 0)
+        self.assertEqual(self.counts(self.user), {})
+
+
+class CloneTripTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('clone', password='pass12345')
+        self.tag = Tag.objects.create(owner=self.user, name='еда')
+        self.item = PackingItem.objects.create(owner=self.user, name='Зарядка')
+
+    def make_full_trip(self, activities):
+        trip = make_trip(self.user)
+        for n in range(activities):
+            activity = Activity.objects.create(trip=trip, title=f'Ужин {n}', date=date(2030, 5, 2 + n), cost=20)
+            activity.tags.add(self.tag)
+        TripPackingItem.objects.create(trip=trip, item=self.item, quantity=2, is_packed=True)
+        return trip
+
+    def test_clone_shifts_dates_and_copies_children(self):
+        trip = self.make_full_trip(2)
+        clone = clone_trip(trip, title='Снова Грузия', start_date=date(2031, 5, 11))
+
+        self.assertEqual(clone.title, 'Снова Грузия')
+        self.assertEqual((clone.start_date, clone.end_date), (date(2031, 5, 11), date(2031, 5, 17)))
+        self.assertEqual(
+            list(clone.activities.order_by('date').values_list('title', 'date')),
+            [('Ужин 0', date(2031, 5, 12)), ('Ужин 1', date(2031, 5, 13))],
+        )
+        self.assertTrue(all(a.tags.get() == self.tag for a in clone.activities.all()))
+        # Packing state starts over on the copy.
+        self.assertEqual(
+            list(clone.packing_links.values_list('item_id', 'quantity', 'is_packed')), [(self.item.pk, 2, False)]
+        )
+        self.assertEqual(trip.activities.count(), 2)
+
+    def test_clone_queries_do_not_grow_with_activities(self):
+        def clone_queries(activities):
+            trip = self.make_full_trip(activities)
+            with CaptureQueriesContext(connection) as queries:
+                clone_trip(trip)
+            return len(queries)
+
+        self.assertEqual(clone_queries(1), clone_queries(5))
+
+
+class CostIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('index', password='pass12345')
+
+    def test_daily_percentiles_and_tag_mix_over_public_trips(self):
+        food = Tag.objects.create(owner=self.user, name='Еда')
+        for total in (70, 140, 210):
+            trip = make_trip(self.user)
+            Activity.objects.create(trip=trip, title='Всё', date=trip.start_date, cost=total)
+        lunch = Activity.objects.create(trip=make_trip(self.user), title='Обед', date=date(2030, 5, 1), cost=140)
+        lunch.tags.add(food)
+        make_trip(self.user)  # nothing spent yet
+        hidden = make_trip(self.user, is_public=False)
+        Activity.objects.create(trip=hidden, title='Тайное', date=hidden.start_date, cost=7000)
+
+        summary = compute_cost_index()[hidden.destination_id]
+        self.assertEqual(summary['trips_count'], 4)
+        self.assertEqual(
+            (summary['daily_p25'], summary['daily_median'], summary['daily_p75']),
+            (Decimal('17.5'), Decimal('20.0'), Decimal('22.5')),
+        )
+        self.assertEqual(summary['tag_mix'], {'Без тега': 75.0, 'еда': 25.0})
+
+
+class RouteOrderTests(SimpleTestCase):
+    def line(self, *positions):
+        import numpy as np
+
+        points = np.array(positions, dtype=float)
+        return abs(points[:, None] - points[None, :])
+
+    def test_two_opt_uncrosses_a_path_and_keeps_the_start(self):
+        import numpy as np
+
+        dist = self.line(0, 1, 2, 3, 4)
+        self.assertEqual(list(_two_opt(np.array([0, 3, 1, 4, 2]), dist)), [0, 1, 2, 3, 4])
+        self.assertEqual(order_stops(self.line(0, 3, -1, 1, -2)), [0, 2, 4, 3, 1])
+
+    def test_short_lists_keep_their_order(self):
+        self.assertEqual(order_stops(self.line(0, 5)), [0, 1])
+
+    def test_haversine_matrix(self):
+        # Tbilisi to Batumi, about 265 km in a straight line.
+        dist = haversine_matrix([(41.7151, 44.8271), (41.6168, 41.6367)])
+        self.assertEqual(dist[0, 0], 0)
+        self.assertAlmostEqual(dist[0, 1], 265, delta=1)
+        self.assertEqual(dist[0, 1], dist[1, 0])
+
+
+class CurrencyTests(TestCase):
+    def setUp(self):
+        ExchangeRate.objects.create(currency='EUR', date=date(2020, 1, 1), rate=Decimal('1.1'))
+        ExchangeRate.objects.create(currency='EUR', date=date(2020, 6, 1), rate=Decimal('1.2'))
+        ExchangeRate.objects.create(currency='GEL', date=date(2020, 1, 1), rate=Decimal('0.4'))
+
+    def test_convert_amount_uses_the_rate_of_the_day(self):
+        self.assertEqual(convert_amount(10, 'EUR', date(2020, 3, 1)), Decimal('11.00'))
+        self.assertEqual(convert_amount(10, 'EUR', date(2020, 6, 1)), Decimal('12.00'))
+        # Days before the first rate take the earliest one.
+        self.assertEqual(convert_amount(10, 'EUR', date(2019, 1, 1)), Decimal('11.00'))
+        self.assertEqual(convert_amount(24, 'USD', date(2020, 7, 1), 'EUR'), Decimal('20.00'))
+        self.assertEqual(convert_amount(10, 'GEL', date(2020, 7, 1), 'EUR'), Decimal('3.33'))
+        # Currencies without rates count as the base currency.
+        self.assertEqual(convert_amount(10, 'JPY', date(2020, 7, 1)), Decimal('10.00'))
+
+    def test_grouped_totals_converts_per_currency_and_day(self):
+        user = User.objects.create_user('money', password='pass12345')
+        first, second = make_trip(user), make_trip(user)
+        Activity.objects.create(trip=first, title='Обед', date=date(2020, 3, 1), cost=10, currency='EUR')
+        Activity.objects.create(trip=first, title='Ужин', date=date(2020, 7, 1), cost=10, currency='EUR')
+        Activity.objects.create(trip=first, title='Такси', date=date(2020, 7, 1), cost=50, currency='GEL')
+        Activity.objects.create(trip=second, title='Музей', date=date(2020, 7, 1), cost=5)
+
+        self.assertEqual(
+            grouped_totals(Activity.objects.all(), 'cost', keys=('trip_id',)),
+            {(first.pk,): (Decimal('43.00'), 3), (second.pk,): (Decimal('5.00'), 1)},
+        )
+        self.assertEqual(
+            grouped_totals(Activity.objects.filter(trip=second), 'cost', target='EUR'),
+            {(): (Decimal('4.17'), 1)},
+        )
+        self.assertEqual(grouped_totals(Activity.objects.none(), 'cost'), {})
+
+
+class AccountExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('export', password='pass12345')
+        self.client.force_login(self.user)
+
+    def read_export(self) -> zipfile.ZipFile:
+        response = self.client.get(reverse('account_export'))
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertIn('attachment; filename="tripplanner-export-', response['Content-Disposition'])
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def csv_rows(self, zf, name) -> list[list[str]]:
+        return list(csv.reader(io.StringIO(zf.read(name).decode())))
+
+    def test_zip_holds_only_the_users_data(self):
+        trip = make_trip(self.user, title='Батуми')
+        tag = Tag.objects.create(owner=self.user, name='море')
+        activity = Activity.objects.create(trip=trip, title='Пляж', date=date(2030, 5, 2), cost=0)
+        activity.tags.add(tag)
+        item = PackingItem.objects.create(owner=self.user, name='Крем', category='Гигиена')
+        TripPackingItem.objects.create(trip=trip, item=item, quantity=1)
+        archive_trip(make_trip(self.user, title='Давняя', start_date=date(2019, 1, 1), end_date=date(2019, 1, 3)))
+        make_trip(User.objects.create_user('stranger', password='pass12345'), title='Чужая')
+
+        zf = self.read_export()
+        self.assertEqual(
+            zf.namelist(),
+            ['trips.csv', 'activities.csv', 'packing_items.csv', 'packing_links.csv', 'archived_trips.jsonl'],
+        )
+        trips = self.csv_rows(zf, 'trips.csv')
+        self.assertEqual(trips[0][:3], ['id', 'title', 'destination'])
+        self.assertEqual([row[1] for row in trips[1:]], ['Батуми'])
+        activities = self.csv_rows(zf, 'activities.csv')
+        self.assertEqual((activities[1][3], activities[1][-1]), ('Пляж', 'море'))
+        self.assertEqual(self.csv_rows(zf, 'packing_links.csv')[1][3], 'Крем')
+        archived = [json.loads(line) for line in zf.read('archived_trips.jsonl').splitlines()]
+        self.assertEqual([a['trip']['title'] for a in archived], ['Давняя'])
+
+    def test_empty_account_exports_headers_only(self):
+        zf = self.read_export()
+        self.assertEqual(len(self.csv_rows(zf, 'trips.csv')), 1)
+        self.assertEqual(zf.read('archived_trips.jsonl'), b'')
+
+
+class TripChartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('chart', password='pass12345')
+        self.trip = make_trip(self.user)
+        self.url = reverse('trip_chart_api', args=[self.trip.pk])
+        Activity.objects.create(trip=self.trip, title='Музей', date=date(2030, 5, 2), cost=10)
+
+    def test_etag_answers_304_until_the_trip_changes(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['totals'], [10.0])
+        etag = first['ETag']
+
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], etag)
+
+        Activity.objects.create(trip=self.trip, title='Обед', date=date(2030, 5, 2), cost=5)
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(changed.json()['totals'], [15.0])
+
+    def test_long_trips_are_bucketed_coarser(self):
+        trip = make_trip(self.user, start_date=date(2030, 1, 1), end_date=date(2030, 6, 30))
+        for n in range(90):
+            Activity.objects.create(trip=trip, title='День', date=date(2030, 1, 1) + timedelta(days=n), cost=1)
+        data = self.client.get(reverse('trip_chart_api', args=[trip.pk])).json()
+        self.assertEqual(data['bucket'], 'week')
+        self.assertEqual(sum(data['totals']), 90.0)
+        self.assertEqual(
+            self.client.get(reverse('trip_chart_api', args=[trip.pk]), {'bucket': 'month'}).json()['labels'],
+            ['2030-01', '2030-02', '2030-03'],
+        )
+
+    def test_private_trip_is_hidden_from_others(self):
+        private = make_trip(self.user, is_public=False)
+        self.client.force_login(User.objects.create_user('other', password='pass12345'))
+        self.assertEqual(self.client.get(reverse('trip_chart_api', args=[private.pk])).status_code, 404)
+
+
+class PackingSuggestionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('packer', password='pass12345')
+        self.items = {
+            name: PackingItem.objects.create(owner=self.user, name=name)
+            for name in ('Паспорт', 'Зарядка', 'Крем', 'Зонт')
+        }
+
+    def pack(self, *names, **kwargs):
+        trip = make_trip(self.user, **kwargs)
+        for name in names:
+            TripPackingItem.objects.create(trip=trip, item=self.items[name])
+        return trip
+
+    def counts(self):
+        return set(PackingCooccurrence.objects.values_list('item_id', 'other_id', 'trips_count'))
+
+    def test_suggestions_rank_by_co_occurrence(self):
+        for _ in range(3):
+            self.pack('Паспорт', 'Зарядка')
+        self.pack('Паспорт', 'Крем')
+        self.pack('Зонт')
+        self.pack('Зонт')
+
+        new = self.pack('Паспорт')
+        self.assertEqual([i.name for i in suggest_packing_items(new)], ['Зарядка', 'Крем'])
+        self.assertEqual(
+            [(i.name, i.score) for i in suggest_packing_items(make_trip(self.user))],
+            [('Паспорт', 5), ('Зарядка', 3), ('Зонт', 2), ('Крем', 1)],
+        )
+
+    def test_incremental_counts_match_a_rebuild(self):
+        trip = self.pack('Паспорт', 'Зарядка', 'Крем')
+        self.pack('Паспорт', 'Зонт')
+        trip.packing_links.get(item=self.items['Крем']).delete()
+        self.pack('Зарядка', 'Зонт').delete()
+
+        incremental = self.counts()
+        rebuild_packing_cooccurrence()
+        self.assertEqual(self.counts(), incremental)
+
+
+class SpendProjectionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('burn', password='pass12345')
+        self.trip = make_trip(self.user, start_date=date(2030, 5, 1), end_date=date(2030, 5, 10), budget=800)
+        self.by_day = [{'date': date(2030, 5, day), 'total': Decimal('100')} for day in range(1, 5)]
+
+    def test_trend_projection_flags_an_overrun(self):
+        result = spend_projection(self.trip, self.by_day, today=date(2030, 5, 4))
+        self.assertEqual(result['method'], 'trend')
+        self.assertEqual((result['spent'], result['burn_rate'], result['projected']), (400, 100, 1000))
+        self.assertEqual((result['low'], result['high']), (1000, 1000))
+        self.assertEqual(result['overrun'], 200)
+
+    def test_only_trips_in_progress_are_projected(self):
+        self.assertIsNone(spend_projection(self.trip, self.by_day, today=date(2030, 4, 30)))
+        self.assertIsNone(spend_projection(self.trip, self.by_day, today=date(2030, 5, 11)))
+
+    def test_finished_trips_of_the_owner_shape_the_projection(self):
+        # Each past trip spent half of its total in the first 10% of the days.
+        for year in (2025, 2026, 2027):
+            past = make_trip(self.user, start_date=date(year, 5, 1), end_date=date(year, 5, 10))
+            Activity.objects.create(trip=past, title='Отель', date=past.start_date, cost=100)
+            Activity.objects.create(trip=past, title='Ужин', date=past.end_date, cost=100)
+
+        result = spend_projection(self.trip, self.by_day, today=date(2030, 5, 4))
+        self.assertEqual((result['method'], result['projected'], result['overrun']), ('history', 800, None))
+
+
+class SpendingRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('rollup', password='pass12345')
+        self.tag = Tag.objects.create(owner=self.user, name='еда')
+
+    def rows(self):
+        return set(
+            SpendingRollup.objects.values_list(
+                'owner_id', 'period', 'period_start', 'tag_id', 'total', 'activities_count', 'archived_total'
+            )
+        )
+
+    def test_series_follow_activity_changes_and_archive(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            trip = make_trip(self.user, start_date=date(2030, 1, 30), end_date=date(2030, 2, 2))
+            lunch = Activity.objects.create(trip=trip, title='Обед', date=date(2030, 1, 31), cost=10)
+            lunch.tags.add(self.tag)
+            Activity.objects.create(trip=trip, title='Музей', date=date(2030, 2, 1), cost=25)
+        month = SpendingRollup.PERIOD_MONTH
+        self.assertEqual(spending_series(self.user.pk, month)['labels'], ['2030-01', '2030-02'])
+        self.assertEqual(spending_series(self.user.pk, month)['totals'], [10.0, 25.0])
+        self.assertEqual(spending_series(self.user.pk, month, self.tag.pk)['totals'], [10.0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lunch.cost = 15
+            lunch.save()
+        incremental = self.rows()
+        backfill_rollups([self.user.pk])
+        self.assertEqual(self.rows(), incremental)
+
+        # Archived trips keep counting in the series.
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_trip(trip)
+        self.assertEqual(spending_series(self.user.pk, month)['totals'], [15.0, 25.0])
+        backfill_rollups([self.user.pk])
+        self.assertEqual(spending_series(self.user.pk, month)['totals'], [15.0, 25.0])
@@ -0,0 +1,65 @@
+import heapq
+from datetime import date, timedelta
+
+from django.db.models import Count, Q
+
+from .models import Trip
+
+
+def overlapping_trips(owner_id: int, start: date, end: date):
+    # One range of the (owner, end_date, start_date) index: only trips ending
+    # on or after `start` are visited, and their start_date is checked from
+    # the same index entries. New trips are usually the latest ones, so the
+    # range holds a handful of upcoming trips rather than the whole history.
+    return Trip.objects.filter(owner_id=owner_id, end_date__gte=start, start_date__lte=end).order_by(
+        'start_date', 'pk'
+    )
+
+
+def build_timeline(owner, since: date | None = None) -> list[dict]:
+    """Trips by start date with overlapping trips, packing readiness and the gaps between them."""
+    trips = (
+        Trip.objects.filter(owner=owner)
+        .select_related('destination')
+        .annotate(
+            packing_total=Count('packing_links'),
+            packing_done=Count('packing_links', filter=Q(packing_links__is_packed=True)),
+        )
+        .order_by('start_date', 'end_date', 'pk')
+    )
+    if since is not None:
+        trips = trips.filter(end_date__gte=since)
+
+    entries = []
+    overlaps = {}
+    # Sweep by start date; `active` is a heap of (end_date, index) of trips
+    # that have not ended yet, so each trip meets only the ones it overlaps.
+    active = []
+    covered_until = None
+    for trip in trips:
+        while active and active[0][0] < trip.start_date:
+            heapq.heappop(active)
+        if covered_until is not None and trip.start_date > covered_until + timedelta(days=1):
+            entries.append(
+                {
+                    'kind': 'gap',
+                    'start': covered_until + timedelta(days=1),
+                    'end': trip.start_date - timedelta(days=1),
+                    'days': (trip.start_date - covered_until).days - 1,
+                }
+            )
+        entry = {
+            'kind': 'trip',
+            'trip': trip,
+            'days': (trip.end_date - trip.start_date).days + 1,
+            'overlaps': overlaps.setdefault(trip.pk, []),
+            'packed_pct': round(trip.packing_done / trip.packing_total * 100) if trip.packing_total else None,
+        }
+        for _, index in active:
+            other = entries[index]['trip']
+            entry['overlaps'].append(other)
+            overlaps[other.pk].append(trip)
+        heapq.heappush(active, (trip.end_date, len(entries)))
+        entries.append(entry)
+        covered_until = max(covered_until or trip.end_date, trip.end_date)
+    return entries
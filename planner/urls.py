@@ -5,13 +5,25 @@ from . import views
 urlpatterns = [
     path('', views.trip_list, name='trip_list'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('api/dashboard/spending/', views.dashboard_spending_api, name='dashboard_spending_api'),
+    path('export/', views.account_export, name='account_export'),
+    path('timeline/', views.timeline, name='timeline'),
+    path('calendar/', views.calendar_feeds, name='calendar_feeds'),
+    path('calendar/<int:pk>/reset/', views.calendar_feed_reset, name='calendar_feed_reset'),
+    path('calendar/<str:token>.ics', views.calendar_feed, name='calendar_feed'),
 
     path('trips/create/', views.trip_create, name='trip_create'),
     path('trips/<int:pk>/', views.trip_detail, name='trip_detail'),
     path('trips/<int:pk>/edit/', views.trip_edit, name='trip_edit'),
     path('trips/<int:pk>/delete/', views.trip_delete, name='trip_delete'),
+    path('trips/<int:pk>/clone/', views.trip_clone, name='trip_clone'),
+    path('trips/<int:pk>/calendar/', views.trip_calendar_feed, name='trip_calendar_feed'),
+    path('archive/<int:pk>/restore/', views.archived_trip_restore, name='archived_trip_restore'),
+    path('trips/<int:pk>/route/', views.trip_route, name='trip_route'),
+    path('api/trips/<int:pk>/chart/', views.trip_chart_api, name='trip_chart_api'),
 
     path('trips/<int:trip_pk>/activities/add/', views.activity_create, name='activity_create'),
+    path('trips/<int:trip_pk>/activities/bulk/', views.activity_bulk_edit, name='activity_bulk_edit'),
     path('activities/<int:pk>/edit/', views.activity_edit, name='activity_edit'),
     path('activities/<int:pk>/delete/', views.activity_delete, name='activity_delete'),
 
@@ -20,6 +32,9 @@ urlpatterns = [
 
     path('trips/<int:trip_pk>/packing/add/', views.trip_packing_add, name='trip_packing_add'),
     path('packing/<int:pk>/toggle/', views.trip_packing_toggle, name='trip_packing_toggle'),
+    path('api/destinations/', views.destination_autocomplete, name='destination_autocomplete'),
+    path('api/sync/', views.sync_pull, name='sync_pull'),
+    path('api/sync/push/', views.sync_push, name='sync_push'),
     path('api/packing/<int:pk>/toggle/', views.trip_packing_toggle_api, name='trip_packing_toggle_api'),
     path('packing/<int:pk>/remove/', views.trip_packing_remove, name='trip_packing_remove'),
 ]
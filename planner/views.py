@@ -1,36 +1,81 @@
 import json
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import urlencode
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-from django.db.models import Avg, Count, Q, Sum
-from django.http import Http404, JsonResponse
+from django.db.models import Count, Q
+from django.http import Http404, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.views.decorators.http import require_POST
 
-from .forms import ActivityForm, PackingItemForm, TripForm, TripPackingItemForm
-from .models import Activity, Destination, PackingItem, Trip, TripPackingItem
+from .activity_grid import save_activity_grid
+from .archive import merge_archive_into_dashboard, restore_trip
+from .analytics import compare_with_cost_index, spend_projection
+from .autocomplete import get_destination_index
+from .caching import (
+    cache_anonymous_page,
+    normalize_list_params,
+    trip_detail_page_key,
+    trip_list_page_key,
+)
+from .charts import trip_chart_data, trip_chart_etag
+from .climate import get_climate, outside_forecast
+from .cloning import clone_trip
+from .currency import grouped_totals, rate_table
+from .export import export_filename, stream_account_export
+from .facets import destination_facets_for_user
+from .ical import feed_etag, feed_trip_ids, get_feed, new_token, stream_feed
+from .forms import (
+    ActivityForm,
+    ActivityGridFormSet,
+    PackingItemForm,
+    TripCloneForm,
+    TripForm,
+    TripPackingItemForm,
+)
+from .models import (
+    BASE_CURRENCY,
+    Activity,
+    ArchivedTrip,
+    CalendarFeed,
+    Destination,
+    PackingItem,
+    SpendingRollup,
+    Trip,
+    TripPackingItem,
+)
+from .packing import suggest_packing_items
+from .rollups import spending_series
+from .routes import plan_trip_days
 from .services import get_forecast
+from .sync import SYNC_PAGE_SIZE, SyncError, apply_push, changes_since, decode_cursor
+from .timeline import build_timeline
 
 
 def _trip_queryset_for_user(user):
     if user.is_authenticated:
-        return Trip.objects.select_related('destination', 'owner').filter(
+        return Trip.objects.select_related('destination').filter(
             Q(is_public=True) | Q(owner=user)
         )
-    return Trip.objects.select_related('destination', 'owner').filter(is_public=True)
+    return Trip.objects.select_related('destination').filter(is_public=True)
 
 
+@cache_anonymous_page(trip_list_page_key)
 def trip_list(request):
     qs = _trip_queryset_for_user(request.user)
-    q = (request.GET.get('q') or '').strip()
-    sort = (request.GET.get('sort') or 'new').strip()
-    dest_raw = (request.GET.get('dest') or '').strip()
+    params = normalize_list_params(request.GET)
+    q = params['q']
+    sort = params['sort']
 
     dest_id = None
-    if dest_raw.isdigit():
-        dest_id = int(dest_raw)
+    if params['dest']:
+        dest_id = int(params['dest'])
 
     if q:
         qs = qs.filter(
@@ -42,28 +87,22 @@ def trip_list(request):
     if dest_id:
         qs = qs.filter(destination_id=dest_id)
 
-    if sort == 'new':
-        qs = qs.order_by('-created_at')
-    elif sort == 'budget':
+    if sort == 'budget':
         qs = qs.order_by('-budget', '-created_at')
     elif sort == 'start':
         qs = qs.order_by('start_date', '-created_at')
     else:
-        sort = 'new'
         qs = qs.order_by('-created_at')
 
-    destinations = (
-        Destination.objects.filter(trips__in=qs).distinct().order_by('country', 'name')
-    )
-
-    has_destinations = Destination.objects.exists()
+    destinations = destination_facets_for_user(request.user)
+    has_destinations = bool(destinations) or Destination.objects.exists()
 
     paginator = Paginator(qs, 10)
-    page_obj = paginator.get_page(request.GET.get('page') or 1)
+    page_obj = paginator.get_page(params['page'])
 
-    params = request.GET.copy()
-    params.pop('page', None)
-    qs_params = params.urlencode()
+    # Built from the normalized params only, so a cached page never carries
+    # query string noise from the request that populated the cache.
+    qs_params = urlencode({k: v for k, v in params.items() if k != 'page' and v})
 
     context = {
         'trips': page_obj,
@@ -78,6 +117,46 @@ def trip_list(request):
     return render(request, 'planner/trip_list.html', context)
 
 
+@login_required
+def destination_autocomplete(request):
+    q = request.GET.get('q') or ''
+    try:
+        limit = min(max(int(request.GET.get('limit') or 10), 1), 50)
+    except ValueError:
+        limit = 10
+    return JsonResponse({'results': get_destination_index().search(q, limit)})
+
+
+@login_required
+def sync_pull(request):
+    try:
+        cursor = decode_cursor(request.GET.get('cursor'))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit') or SYNC_PAGE_SIZE), 1), SYNC_PAGE_SIZE)
+    except ValueError:
+        limit = SYNC_PAGE_SIZE
+    return JsonResponse(changes_since(request.user, cursor, limit))
+
+
+@require_POST
+@login_required
+def sync_push(request):
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Некорректный JSON.'}, status=400)
+    changes = payload.get('changes') if isinstance(payload, dict) else None
+    if not isinstance(changes, list):
+        return JsonResponse({'error': 'Ожидается список changes.'}, status=400)
+    try:
+        ids = apply_push(request.user, changes)
+    except SyncError as exc:
+        return JsonResponse({'index': exc.index, 'errors': exc.errors}, status=exc.status)
+    return JsonResponse({'ids': ids})
+
+
 @login_required
 def dashboard(request):
     trips = Trip.objects.filter(owner=request.user).select_related('destination')
@@ -85,26 +164,34 @@ def dashboard(request):
         trips_total=Count('id'),
         public_total=Count('id', filter=Q(is_public=True)),
         private_total=Count('id', filter=Q(is_public=False)),
-        total_budget=Sum('budget'),
-        avg_budget=Avg('budget'),
     )
+    # Money is summed in BASE_CURRENCY: budgets at the rate of the trip start,
+    # costs at the rate of the activity date.
+    budgets = grouped_totals(trips, 'budget', keys=('destination_id',), date_field='start_date')
+    trip_stats['total_budget'] = sum((total for total, _ in budgets.values()), Decimal('0'))
+    trip_stats['avg_budget'] = trip_stats['total_budget'] / trip_stats['trips_total'] if trip_stats['trips_total'] else None
 
     activities = Activity.objects.filter(trip__owner=request.user)
-    activity_stats = activities.aggregate(
-        total_spent=Sum('cost'),
-        avg_activity_cost=Avg('cost'),
-    )
-
-    top_destinations = (
-        trips.values('destination__name', 'destination__country')
-        .annotate(trips_count=Count('id'), budget_sum=Sum('budget'))
-        .order_by('-trips_count', '-budget_sum')[:5]
-    )
+    spent, activities_total = grouped_totals(activities, 'cost').get((), (Decimal('0'), 0))
+    activity_stats = {
+        'activities_total': activities_total,
+        'total_spent': spent,
+        'avg_activity_cost': spent / activities_total if activities_total else None,
+    }
 
-    top_tags = (
-        activities.values('tags__name')
-        .annotate(total=Sum('cost'), uses=Count('id'))
-        .order_by('-total')[:5]
+    # Not sliced here: archived trips may still change the top 5.
+    destinations = [
+        {**row, 'budget_sum': budgets[(row['destination_id'],)][0]}
+        for row in trips.values('destination_id', 'destination__name', 'destination__country').annotate(
+            trips_count=Count('id')
+        )
+    ]
+    tags = [
+        {'tags__name': name, 'total': total, 'uses': uses}
+        for (name,), (total, uses) in grouped_totals(activities, 'cost', keys=('tags__name',)).items()
+    ]
+    top_destinations, top_tags = merge_archive_into_dashboard(
+        request.user.id, trip_stats, activity_stats, destinations, tags
     )
 
     context = {
@@ -112,37 +199,125 @@ def dashboard(request):
         'activity_stats': activity_stats,
         'top_destinations': top_destinations,
         'top_tags': top_tags,
+        'tags': request.user.tags.all(),
+        'archived_trips': request.user.archived_trips.select_related('destination')[:20],
+        'currency': BASE_CURRENCY,
     }
     return render(request, 'planner/dashboard.html', context)
 
 
-def trip_detail(request, pk: int):
-    trip = get_object_or_404(_trip_queryset_for_user(request.user), pk=pk)
-
-    activities = trip.activities.prefetch_related('tags').all()
+@login_required
+def account_export(request):
+    response = StreamingHttpResponse(stream_account_export(request.user), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(request.user)}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+def calendar_feed(request, token: str):
+    feed = get_object_or_404(CalendarFeed.objects.select_related('owner', 'trip'), token=token)
+    trip_ids = feed_trip_ids(feed)
+    etag = feed_etag(feed, trip_ids)
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        name = feed.trip.title if feed.trip else f'TripPlanner · {feed.owner.get_username()}'
+        response = StreamingHttpResponse(
+            stream_feed(feed, trip_ids, name), content_type='text/calendar; charset=utf-8'
+        )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
-    total_cost = activities.aggregate(total=Sum('cost'))['total'] or 0
-    remaining = (trip.budget or 0) - total_cost
 
-    by_day = list(
-        activities.values('date').annotate(total=Sum('cost')).order_by('date')
+@login_required
+def timeline(request):
+    show_all = request.GET.get('scope') == 'all'
+    entries = build_timeline(request.user, None if show_all else timezone.localdate())
+    trips = [e for e in entries if e['kind'] == 'trip']
+    return render(
+        request,
+        'planner/timeline.html',
+        {
+            'entries': entries,
+            'show_all': show_all,
+            'trips_count': len(trips),
+            'overlaps_count': sum(1 for e in trips if e['overlaps']),
+        },
     )
 
-    by_tag = list(
-        activities.values('tags__name').annotate(total=Sum('cost')).order_by('-total')
-    )
 
-    chart_days = [str(x['date']) for x in by_day]
-    chart_day_totals = [float(x['total'] or 0) for x in by_day]
+@login_required
+def calendar_feeds(request):
+    get_feed(request.user)
+    feeds = request.user.calendar_feeds.select_related('trip').order_by('trip__start_date')
+    rows = []
+    for feed in feeds:
+        url = request.build_absolute_uri(reverse('calendar_feed', args=[feed.token]))
+        rows.append({'feed': feed, 'url': url, 'webcal': url.replace('https://', 'webcal://').replace('http://', 'webcal://')})
+    return render(request, 'planner/calendar_feeds.html', {'rows': rows})
+
+
+@require_POST
+@login_required
+def trip_calendar_feed(request, pk: int):
+    trip = get_object_or_404(Trip, pk=pk, owner=request.user)
+    get_feed(request.user, trip)
+    return redirect('calendar_feeds')
+
+
+@require_POST
+@login_required
+def calendar_feed_reset(request, pk: int):
+    feed = get_object_or_404(CalendarFeed, pk=pk, owner=request.user)
+    feed.token = new_token()
+    feed.save(update_fields=['token'])
+    messages.success(request, 'Ссылка обновлена, старая больше не работает.')
+    return redirect('calendar_feeds')
+
+
+@require_POST
+@login_required
+def archived_trip_restore(request, pk: int):
+    archived = get_object_or_404(ArchivedTrip, pk=pk, owner=request.user)
+    trip = restore_trip(archived)
+    messages.success(request, 'Поездка восстановлена из архива.')
+    return redirect('trip_detail', pk=trip.pk)
+
+
+@login_required
+def dashboard_spending_api(request):
+    period = request.GET.get('period') or SpendingRollup.PERIOD_MONTH
+    if period not in (SpendingRollup.PERIOD_MONTH, SpendingRollup.PERIOD_WEEK):
+        period = SpendingRollup.PERIOD_MONTH
+    tag_raw = (request.GET.get('tag') or '').strip()
+    tag_id = int(tag_raw) if tag_raw.isdigit() else None
+    return JsonResponse(spending_series(request.user.id, period, tag_id))
+
 
-    chart_tags = [x['tags__name'] or 'Без тега' for x in by_tag]
-    chart_tag_totals = [float(x['total'] or 0) for x in by_tag]
+@cache_anonymous_page(trip_detail_page_key)
+def trip_detail(request, pk: int):
+    trip = get_object_or_404(_trip_queryset_for_user(request.user), pk=pk)
+
+    activities = trip.activities.prefetch_related('tags').all()
+
+    # Totals are in the trip currency.
+    by_day = [
+        {'date': day, 'total': total}
+        for (day,), (total, _) in sorted(
+            grouped_totals(activities, 'cost', keys=('date',), target=trip.currency).items()
+        )
+    ]
+    total_cost = sum((row['total'] for row in by_day), Decimal('0'))
+    remaining = (trip.budget or 0) - total_cost
 
     forecast = None
     if trip.destination.latitude is not None and trip.destination.longitude is not None:
-        forecast = get_forecast(
-            float(trip.destination.latitude), float(trip.destination.longitude)
-        )
+        latitude, longitude = float(trip.destination.latitude), float(trip.destination.longitude)
+        if outside_forecast(trip.start_date, trip.end_date):
+            forecast = get_climate(latitude, longitude, trip.start_date, trip.end_date, trip.destination_id)
+        else:
+            forecast = get_forecast(latitude, longitude, trip.destination_id)
 
     weather_rows = []
     if forecast and forecast.ok:
@@ -151,7 +326,7 @@ def trip_detail(request, pk: int):
         tmax = daily.get('temperature_2m_max') or []
         tmin = daily.get('temperature_2m_min') or []
         pop = daily.get('precipitation_probability_max') or []
-        n = min(len(times), len(tmax), len(tmin), len(pop), 7)
+        n = min(len(times), len(tmax), len(tmin), len(pop))
         for i in range(n):
             weather_rows.append(
                 {
@@ -170,7 +345,12 @@ def trip_detail(request, pk: int):
     if total_packing:
         packed_pct = round((packed_count / total_packing) * 100, 1)
 
-    most_expensive_activity = activities.order_by('-cost', '-date').first()
+    most_expensive_activity = None
+    if activities:
+        costs = rate_table().convert(
+            [a.cost for a in activities], [a.currency for a in activities], [a.date for a in activities], trip.currency
+        )
+        most_expensive_activity = activities[int(costs.argmax())]
 
     most_expensive_day = None
     if by_day:
@@ -180,12 +360,18 @@ def trip_detail(request, pk: int):
     if trip.budget and float(trip.budget) > 0:
         budget_pct = round((float(total_cost) / float(trip.budget)) * 100, 1)
 
+    cost_comparison = compare_with_cost_index(trip, total_cost)
+    projection = spend_projection(trip, by_day)
+
     context = {
         'trip': trip,
         'activities': activities,
         'total_cost': total_cost,
         'remaining': remaining,
         'budget_pct': budget_pct,
+        'cost_comparison': cost_comparison,
+        'base_currency': BASE_CURRENCY,
+        'projection': projection,
         'most_expensive_activity': most_expensive_activity,
         'most_expensive_day': most_expensive_day,
         'forecast': forecast,
@@ -194,18 +380,41 @@ def trip_detail(request, pk: int):
         'packed_count': packed_count,
         'total_packing': total_packing,
         'packed_pct': packed_pct,
-        'chart_days_json': json.dumps(chart_days),
-        'chart_day_totals_json': json.dumps(chart_day_totals),
-        'chart_tags_json': json.dumps(chart_tags),
-        'chart_tag_totals_json': json.dumps(chart_tag_totals),
     }
     return render(request, 'planner/trip_detail.html', context)
 
 
+def trip_route(request, pk: int):
+    trip = get_object_or_404(_trip_queryset_for_user(request.user), pk=pk)
+    try:
+        day = parse_date(request.GET.get('date') or '')
+    except ValueError:
+        day = None
+    days = trip.activities.order_by('date').values_list('date', flat=True).distinct()
+    return render(
+        request,
+        'planner/trip_route.html',
+        {'trip': trip, 'day': day, 'days': days, 'plans': plan_trip_days(trip, day)},
+    )
+
+
+def trip_chart_api(request, pk: int):
+    trip = get_object_or_404(_trip_queryset_for_user(request.user), pk=pk)
+    bucket = request.GET.get('bucket') or 'auto'
+    etag = trip_chart_etag(trip, bucket)
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(trip_chart_data(trip, bucket))
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @login_required
 def trip_create(request):
     if request.method == 'POST':
-        form = TripForm(request.POST)
+        form = TripForm(request.POST, owner=request.user)
         if form.is_valid():
             trip = form.save(commit=False)
             trip.owner = request.user
@@ -213,7 +422,7 @@ def trip_create(request):
             messages.success(request, 'Поездка создана.')
             return redirect('trip_detail', pk=trip.pk)
     else:
-        form = TripForm()
+        form = TripForm(owner=request.user)
     return render(request, 'planner/form.html', {'title': 'Новая поездка', 'form': form})
 
 
@@ -221,13 +430,13 @@ def trip_create(request):
 def trip_edit(request, pk: int):
     trip = get_object_or_404(Trip, pk=pk, owner=request.user)
     if request.method == 'POST':
-        form = TripForm(request.POST, instance=trip)
+        form = TripForm(request.POST, instance=trip, owner=request.user)
         if form.is_valid():
             form.save()
             messages.success(request, 'Поездка обновлена.')
             return redirect('trip_detail', pk=trip.pk)
     else:
-        form = TripForm(instance=trip)
+        form = TripForm(instance=trip, owner=request.user)
     return render(
         request,
         'planner/form.html',
@@ -235,6 +444,34 @@ def trip_edit(request, pk: int):
     )
 
 
+@login_required
+def trip_clone(request, pk: int):
+    trip = get_object_or_404(Trip, pk=pk, owner=request.user)
+    if request.method == 'POST':
+        form = TripCloneForm(request.POST, trip=trip)
+        if form.is_valid():
+            clone = clone_trip(
+                trip,
+                title=form.cleaned_data['title'],
+                start_date=form.cleaned_data['start_date'],
+            )
+            messages.success(request, 'Поездка скопирована.')
+            return redirect('trip_detail', pk=clone.pk)
+    else:
+        form = TripCloneForm(
+            initial={'title': f'{trip.title} (копия)', 'start_date': trip.end_date + timedelta(days=1)}, trip=trip
+        )
+    return render(
+        request,
+        'planner/form.html',
+        {
+            'title': 'Копировать поездку',
+            'form': form,
+            'back_url': reverse('trip_detail', args=[trip.pk]),
+        },
+    )
+
+
 @login_required
 def trip_delete(request, pk: int):
     trip = get_object_or_404(Trip, pk=pk, owner=request.user)
@@ -270,10 +507,38 @@ def activity_create(request, trip_pk: int):
     )
 
 
+@login_required
+def activity_bulk_edit(request, trip_pk: int):
+    trip = get_object_or_404(Trip, pk=trip_pk, owner=request.user)
+    activities = trip.activities.prefetch_related('tags').order_by('date', 'pk')
+    try:
+        day = parse_date(request.GET.get('date') or '')
+    except ValueError:
+        day = None
+    if day:
+        activities = activities.filter(date=day)
+
+    if request.method == 'POST':
+        formset = ActivityGridFormSet(request.POST, queryset=activities, trip=trip, owner=request.user)
+        if formset.is_valid():
+            count = save_activity_grid(trip, formset.forms)
+            messages.success(request, f'Сохранено активностей: {count}.')
+            return redirect('trip_detail', pk=trip.pk)
+    else:
+        formset = ActivityGridFormSet(queryset=activities, trip=trip, owner=request.user)
+
+    days = trip.activities.order_by('date').values_list('date', flat=True).distinct()
+    return render(
+        request,
+        'planner/activity_bulk_edit.html',
+        {'trip': trip, 'formset': formset, 'day': day, 'days': days},
+    )
+
+
 @login_required
 def activity_edit(request, pk: int):
     activity = get_object_or_404(Activity.objects.select_related('trip'), pk=pk)
-    if activity.trip.owner != request.user:
+    if activity.trip.owner_id != request.user.id:
         raise Http404
     trip = activity.trip
     if request.method == 'POST':
@@ -298,7 +563,7 @@ def activity_edit(request, pk: int):
 @login_required
 def activity_delete(request, pk: int):
     activity = get_object_or_404(Activity.objects.select_related('trip'), pk=pk)
-    if activity.trip.owner != request.user:
+    if activity.trip.owner_id != request.user.id:
         raise Http404
     trip = activity.trip
     if request.method == 'POST':
@@ -349,13 +614,20 @@ def trip_packing_add(request, trip_pk: int):
             messages.success(request, 'Добавлено в список вещей.')
             return redirect('trip_detail', pk=trip.pk)
     else:
-        form = TripPackingItemForm(owner=request.user)
+        initial = {}
+        if (request.GET.get('item') or '').isdigit():
+            initial['item'] = int(request.GET['item'])
+        form = TripPackingItemForm(owner=request.user, initial=initial)
+    include_public = request.GET.get('public') == '1'
     return render(
         request,
-        'planner/form.html',
+        'planner/trip_packing_add.html',
         {
             'title': 'Добавить в список вещей',
             'form': form,
+            'trip': trip,
+            'suggestions': suggest_packing_items(trip, include_public=include_public),
+            'include_public': include_public,
             'back_url': reverse('trip_detail', args=[trip.pk]),
         },
     )
@@ -364,7 +636,7 @@ def trip_packing_add(request, trip_pk: int):
 @login_required
 def trip_packing_toggle(request, pk: int):
     link = get_object_or_404(TripPackingItem.objects.select_related('trip'), pk=pk)
-    if link.trip.owner != request.user:
+    if link.trip.owner_id != request.user.id:
         raise Http404
     link.is_packed = not link.is_packed
     link.save(update_fields=['is_packed'])
@@ -375,7 +647,7 @@ def trip_packing_toggle(request, pk: int):
 @login_required
 def trip_packing_toggle_api(request, pk: int):
     link = get_object_or_404(TripPackingItem.objects.select_related('trip'), pk=pk)
-    if link.trip.owner != request.user:
+    if link.trip.owner_id != request.user.id:
         raise Http404
     link.is_packed = not link.is_packed
     link.save(update_fields=['is_packed'])
@@ -394,7 +666,7 @@ def trip_packing_toggle_api(request, pk: int):
 @login_required
 def trip_packing_remove(request, pk: int):
     link = get_object_or_404(TripPackingItem.objects.select_related('trip'), pk=pk)
-    if link.trip.owner != request.user:
+    if link.trip.owner_id != request.user.id:
         raise Http404
     trip_pk = link.trip.pk
     link.delete()